@@ -0,0 +1,291 @@
+"""Query result cache invalidated by ingest write ranges.
+
+Entries are keyed on (query kind, point set, start, end, resolution) and
+evicted LRU once the estimated size exceeds ``max_bytes``. Ingest records, per
+point and per committed upload, the time range it wrote in ``point_dirty_log``
+(the point's "dirty since" watermark for that write). ``DirtyLogPoller`` tails
+that log and drops only the entries whose point set and range overlap a write,
+so historical ranges stay cached and cache hits never touch the database.
+"""
+import logging
+import sys
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, Hashable, Iterable, List, Optional, Set, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.engine import Connection, Engine
+
+log = logging.getLogger(__name__)
+
+CacheKey = Tuple[Hashable, Tuple[uuid.UUID, ...], datetime, datetime, Hashable]
+
+
+def estimate_size(value: Any) -> int:
+    """Rough deep size of a result: list of row tuples, extrapolated from the first row."""
+    size = sys.getsizeof(value)
+    if isinstance(value, (list, tuple)) and value:
+        first = value[0]
+        row = sys.getsizeof(first)
+        if isinstance(first, (list, tuple)):
+            row += sum(sys.getsizeof(x) for x in first)
+        size += row * len(value)
+    return size
+
+
+class _Everything(dict):
+    """``_invalidated_at`` after a full clear: unknown points report the clear's generation."""
+
+    def __init__(self, generation: int):
+        super().__init__()
+        self.generation = generation
+
+    def get(self, key, default=None):
+        return super().get(key, self.generation)
+
+
+@dataclass
+class _Entry:
+    points: Tuple[uuid.UUID, ...]
+    start: datetime
+    end: datetime
+    value: Any
+    size: int
+
+
+class ResultCache:
+    def __init__(self, max_bytes: int = 256 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[CacheKey, _Entry]" = OrderedDict()
+        self._by_point: Dict[uuid.UUID, Set[CacheKey]] = {}
+        self._bytes = 0
+        self._lock = threading.Lock()
+        # Invalidation counter, and its value at each point's latest invalidation
+        self._generation = 0
+        self._invalidated_at: Dict[uuid.UUID, int] = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def make_key(kind: Hashable, point_ids: Iterable[uuid.UUID], start: datetime, end: datetime, resolution: Hashable) -> CacheKey:
+        return (kind, tuple(sorted(set(point_ids))), start, end, resolution)
+
+    def get(self, key: CacheKey) -> Tuple[bool, Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return False, None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return True, entry.value
+
+    def put(self, key: CacheKey, value: Any, generation: Optional[int] = None) -> None:
+        """Store ``value``; with ``generation`` (from ``generation()`` before loading) the value is
+        dropped if any of its points was invalidated while it was being loaded."""
+        size = estimate_size(value)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if generation is not None and any(self._invalidated_at.get(pid, 0) > generation for pid in key[1]):
+                return
+            if key in self._entries:
+                self._remove(key)
+            entry = _Entry(points=key[1], start=key[2], end=key[3], value=value, size=size)
+            self._entries[key] = entry
+            self._bytes += size
+            for pid in entry.points:
+                self._by_point.setdefault(pid, set()).add(key)
+            while self._bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def get_or_load(self, key: CacheKey, loader: Callable[[], Any]) -> Any:
+        hit, value = self.get(key)
+        if hit:
+            return value
+        generation = self.generation()
+        value = loader()
+        self.put(key, value, generation)
+        return value
+
+    def generation(self) -> int:
+        with self._lock:
+            return self._generation
+
+    def invalidate(self, point_id: uuid.UUID, dirty_from: datetime, dirty_to: datetime) -> int:
+        """Drop entries for ``point_id`` whose [start, end) overlaps [dirty_from, dirty_to]."""
+        with self._lock:
+            self._generation += 1
+            self._invalidated_at[point_id] = self._generation
+            keys = [
+                k for k in self._by_point.get(point_id, ())
+                if self._entries[k].start <= dirty_to and self._entries[k].end > dirty_from
+            ]
+            for k in keys:
+                self._remove(k)
+            self.invalidations += len(keys)
+            return len(keys)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._generation += 1
+            # Every point counts as invalidated now; loads that started earlier are not stored
+            self._invalidated_at = _Everything(self._generation)
+            self.invalidations += len(self._entries)
+            self._entries.clear()
+            self._by_point.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
+
+    def _remove(self, key: CacheKey) -> None:
+        entry = self._entries.pop(key)
+        self._bytes -= entry.size
+        for pid in entry.points:
+            keys = self._by_point.get(pid)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._by_point[pid]
+
+
+_LOG_TAIL_SQL = text(
+    "SELECT id, point_id, dirty_from, dirty_to FROM point_dirty_log WHERE id > :last ORDER BY id LIMIT :limit"
+)
+_LOG_HOLES_SQL = text(
+    """
+    SELECT l.id, l.point_id, l.dirty_from, l.dirty_to
+      FROM unnest(CAST(:los AS bigint[]), CAST(:his AS bigint[])) AS h(lo, hi)
+      JOIN point_dirty_log l ON l.id BETWEEN h.lo AND h.hi
+    """
+)
+_LOG_BOUNDS_SQL = text("SELECT COALESCE(min(id), 0), COALESCE(max(id), 0) FROM point_dirty_log")
+_LOG_PRUNE_SQL = text("DELETE FROM point_dirty_log WHERE written_at < now() - make_interval(secs => :seconds)")
+
+
+def prune_dirty_log(conn: Connection, keep: timedelta = timedelta(hours=1)) -> int:
+    """Delete log rows older than ``keep``; pollers that fall further behind clear their cache.
+
+    ``init_db.py`` schedules the same delete as a TimescaleDB job on every shard,
+    so the log stays bounded whether or not any reader is running.
+    """
+    deleted = conn.execute(_LOG_PRUNE_SQL, {"seconds": keep.total_seconds()}).rowcount
+    conn.commit()
+    return deleted
+
+
+class DirtyLogPoller:
+    """Applies new ``point_dirty_log`` rows to a ``ResultCache``.
+
+    Call ``poll`` periodically or ``start`` a background thread. Ids commit out
+    of order and rolled-back uploads never fill theirs, so id ranges skipped by
+    the tail are kept as holes: each poll reads rows past the highest id seen
+    plus rows that have since landed in a hole, applies every row once, and
+    gives a hole up after ``gap_timeout_s``. ``last_id`` is the id below which
+    nothing is pending; if rows past it were pruned unseen, the whole cache is
+    cleared.
+    """
+
+    def __init__(
+        self,
+        engine: Engine,
+        cache: ResultCache,
+        interval_s: float = 2.0,
+        batch: int = 10000,
+        gap_timeout_s: float = 30.0,
+        prune_keep: Optional[timedelta] = None,
+    ):
+        self.engine = engine
+        self.cache = cache
+        self.interval_s = interval_s
+        self.batch = batch
+        self.gap_timeout_s = gap_timeout_s
+        self.prune_keep = prune_keep
+        self.last_id: Optional[int] = None
+        self._high = 0  # highest id read by the tail
+        self._holes: List[Tuple[int, int, float]] = []  # (first id, last id, skipped at)
+        self._filled: Set[int] = set()  # ids applied from inside holes
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def poll(self) -> int:
+        invalidated = 0
+        with self.engine.connect() as conn:
+            low, high = conn.execute(_LOG_BOUNDS_SQL).one()
+            if self.last_id is None or (low > self.last_id + 1 and high > self.last_id):
+                # First poll, or missed rows were pruned: nothing cached can be trusted
+                self.cache.clear()
+                self.last_id = self._high = high
+                self._holes, self._filled = [], set()
+                return 0
+            now = time.monotonic()
+            if self._holes:
+                los, his, _ = zip(*self._holes)
+                for row in conn.execute(_LOG_HOLES_SQL, {"los": list(los), "his": list(his)}):
+                    if row.id not in self._filled:
+                        self._filled.add(row.id)
+                        invalidated += self.cache.invalidate(row.point_id, row.dirty_from, row.dirty_to)
+            while True:
+                rows = conn.execute(_LOG_TAIL_SQL, {"last": self._high, "limit": self.batch}).all()
+                for row in rows:
+                    invalidated += self.cache.invalidate(row.point_id, row.dirty_from, row.dirty_to)
+                    if row.id > self._high + 1:
+                        self._holes.append((self._high + 1, row.id - 1, now))
+                    self._high = row.id
+                if len(rows) < self.batch:
+                    break
+        self._expire_holes(now)
+        return invalidated
+
+    def _expire_holes(self, now: float) -> None:
+        # Drop holes that timed out or have been filled completely
+        self._holes = [
+            (lo, hi, seen_at) for lo, hi, seen_at in self._holes
+            if now - seen_at < self.gap_timeout_s and sum(lo <= i <= hi for i in self._filled) < hi - lo + 1
+        ]
+        if self._holes:
+            self.last_id = self._holes[0][0] - 1
+            self._filled = {i for i in self._filled if i > self.last_id}
+        else:
+            self.last_id = self._high
+            self._filled.clear()
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self._run, name="dirty-log-poller", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _run(self) -> None:
+        last_prune = time.monotonic()
+        while not self._stop.wait(self.interval_s):
+            try:
+                self.poll()
+                if self.prune_keep is not None and time.monotonic() - last_prune >= 60:
+                    with self.engine.connect() as conn:
+                        prune_dirty_log(conn, self.prune_keep)
+                    last_prune = time.monotonic()
+            except Exception:
+                log.exception("dirty log poll failed")
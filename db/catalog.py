@@ -0,0 +1,220 @@
+"""Bulk point catalog sync from BACnet discovery.
+
+A rediscovered device reports thousands of point definitions. ``sync_site_points``
+hashes each definition, reads the site's current hashes in one query, and
+upserts only new, changed or previously deactivated points in one statement
+that also appends a ``point_metadata_history`` row for each new or changed one.
+"""
+import hashlib
+import json
+import uuid
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from decimal import Decimal
+from typing import Any, Dict, Iterable, List, Optional, Tuple, Union
+
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+
+
+@dataclass
+class DiscoveredPoint:
+    name: str  # Object_Name
+    object_type: str
+    object_instance: int
+    unit: str
+    description: Optional[str] = None
+    cov_increment: Optional[Union[Decimal, float, str]] = None
+    tags: Dict[str, Any] = field(default_factory=dict)
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "DiscoveredPoint":
+        return cls(
+            name=data["name"],
+            object_type=data["object_type"],
+            object_instance=int(data["object_instance"]),
+            unit=data["unit"],
+            description=data.get("description"),
+            cov_increment=data.get("cov_increment"),
+            tags=data.get("tags") or {},
+        )
+
+    @property
+    def key(self) -> Tuple[str, int]:
+        return self.object_type, self.object_instance
+
+
+def _cov_text(value) -> Optional[str]:
+    # Normalized like Numeric(14, 6) so 0.5, "0.50" and Decimal("0.500000") hash alike
+    return None if value is None else format(Decimal(str(value)).quantize(Decimal("0.000001")), "f")
+
+
+def compute_meta_hash(point: DiscoveredPoint) -> str:
+    """SHA-256 over a canonical JSON encoding of the point definition."""
+    canonical = json.dumps(
+        [
+            point.name,
+            point.object_type,
+            point.object_instance,
+            point.description,
+            _cov_text(point.cov_increment),
+            point.unit,
+            point.tags,
+        ],
+        sort_keys=True,
+        separators=(",", ":"),
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+_EXISTING_SQL = text(
+    "SELECT object_type, object_instance, meta_hash, active FROM points WHERE site_id = CAST(:site_id AS uuid)"
+)
+
+_UPSERT_SQL = text(
+    """
+    WITH incoming AS (
+        SELECT *
+          FROM unnest(
+              CAST(:names AS text[]),
+              CAST(:object_types AS text[]),
+              CAST(:object_instances AS integer[]),
+              CAST(:descriptions AS text[]),
+              CAST(:cov_increments AS numeric[]),
+              CAST(:units AS text[]),
+              CAST(:tags AS jsonb[]),
+              CAST(:hashes AS text[])
+          ) AS i(name, object_type, object_instance, description, cov_increment, unit, tags, meta_hash)
+    ),
+    previous AS (
+        -- Read from the statement snapshot, i.e. before the upsert below
+        SELECT p.object_type, p.object_instance, p.meta_hash
+          FROM points p
+          JOIN incoming i USING (object_type, object_instance)
+         WHERE p.site_id = CAST(:site_id AS uuid)
+    ),
+    upserted AS (
+        INSERT INTO points (
+            id, site_id, name, object_type, object_instance, description, cov_increment,
+            unit, tags, active, meta_hash
+        )
+        SELECT gen_random_uuid(), CAST(:site_id AS uuid), name, object_type, object_instance, description,
+               cov_increment, unit, tags, true, meta_hash
+          FROM incoming
+        ON CONFLICT (site_id, object_type, object_instance) DO UPDATE
+           SET name = EXCLUDED.name,
+               description = EXCLUDED.description,
+               cov_increment = EXCLUDED.cov_increment,
+               unit = EXCLUDED.unit,
+               tags = EXCLUDED.tags,
+               active = true,
+               meta_hash = EXCLUDED.meta_hash
+         WHERE points.meta_hash IS DISTINCT FROM EXCLUDED.meta_hash OR NOT points.active
+        RETURNING id, object_type, object_instance, unit, tags, meta_hash, (xmax = 0) AS inserted
+    ),
+    changed AS (
+        -- Reactivating a point with an unchanged definition adds no history
+        SELECT u.*
+          FROM upserted u
+          LEFT JOIN previous pr USING (object_type, object_instance)
+         WHERE pr.meta_hash IS DISTINCT FROM u.meta_hash
+    ),
+    history AS (
+        INSERT INTO point_metadata_history (id, point_id, effective_from, unit, tags, meta_hash)
+        SELECT gen_random_uuid(), id, :effective_from, unit, tags, meta_hash
+          FROM changed
+    )
+    SELECT (SELECT count(*) FROM changed WHERE inserted) AS inserted,
+           (SELECT count(*) FROM changed WHERE NOT inserted) AS updated,
+           (SELECT count(*) FROM upserted) - (SELECT count(*) FROM changed) AS reactivated
+    """
+)
+
+_DEACTIVATE_SQL = text(
+    """
+    UPDATE points
+       SET active = false
+     WHERE site_id = CAST(:site_id AS uuid)
+       AND active
+       AND NOT ((object_type, object_instance) IN (
+           SELECT * FROM unnest(CAST(:object_types AS text[]), CAST(:object_instances AS integer[]))
+       ))
+    """
+)
+
+
+@dataclass
+class CatalogSyncResult:
+    discovered: int = 0
+    inserted: int = 0
+    updated: int = 0
+    reactivated: int = 0  # inactive points rediscovered with an unchanged definition
+    unchanged: int = 0
+    deactivated: int = 0
+
+
+def sync_site_points(
+    conn: Connection,
+    site_id: uuid.UUID,
+    discovered: Iterable[Union[DiscoveredPoint, Dict[str, Any]]],
+    effective_from: Optional[datetime] = None,
+    deactivate_missing: bool = False,
+) -> CatalogSyncResult:
+    """Upsert a site's discovered points; history rows are added only for new or changed hashes.
+
+    Runs in the caller's transaction; commit afterwards. With
+    ``deactivate_missing`` points of the site absent from this discovery are
+    marked inactive (their history and measurements are kept); a later
+    discovery that reports them again reactivates them.
+    """
+    points: Dict[Tuple[str, int], DiscoveredPoint] = {}
+    for p in discovered:
+        p = p if isinstance(p, DiscoveredPoint) else DiscoveredPoint.from_dict(p)
+        points[p.key] = p  # a repeated identity keeps the last definition
+
+    existing = {
+        (r.object_type, r.object_instance): (r.meta_hash, r.active)
+        for r in conn.execute(_EXISTING_SQL, {"site_id": str(site_id)})
+    }
+
+    changed: List[Tuple[DiscoveredPoint, str]] = []
+    for key, p in points.items():
+        meta_hash = compute_meta_hash(p)
+        if existing.get(key) != (meta_hash, True):
+            changed.append((p, meta_hash))
+
+    result = CatalogSyncResult(discovered=len(points), unchanged=len(points) - len(changed))
+    if changed:
+        row = conn.execute(
+            _UPSERT_SQL,
+            {
+                "site_id": str(site_id),
+                "effective_from": effective_from or datetime.now(timezone.utc),
+                "names": [p.name for p, _ in changed],
+                "object_types": [p.object_type for p, _ in changed],
+                "object_instances": [p.object_instance for p, _ in changed],
+                "descriptions": [p.description for p, _ in changed],
+                "cov_increments": [_cov_text(p.cov_increment) for p, _ in changed],
+                "units": [p.unit for p, _ in changed],
+                "tags": [json.dumps(p.tags, sort_keys=True) for p, _ in changed],
+                "hashes": [h for _, h in changed],
+            },
+        ).one()
+        result.inserted = row.inserted
+        result.updated = row.updated
+        result.reactivated = row.reactivated
+        # A concurrent sync may have applied the same hash in between
+        result.unchanged = len(points) - result.inserted - result.updated - result.reactivated
+
+    if deactivate_missing:
+        keys = list(points)
+        result.deactivated = conn.execute(
+            _DEACTIVATE_SQL,
+            {
+                "site_id": str(site_id),
+                "object_types": [k[0] for k in keys],
+                "object_instances": [k[1] for k in keys],
+            },
+        ).rowcount
+    return result
@@ -0,0 +1,349 @@
+"""Incremental data-gap detection and fleet staleness summary.
+
+Each point keeps a watermark in ``point_gap_watermarks``: the newest
+measurement already scanned. A run only reads rows newer than the watermark
+through ``ix_measurements_point_time`` (one index range scan per point), finds
+spacings larger than the expected poll interval with ``lag()``, records them in
+``measurement_gaps`` and advances the watermark.
+
+Points are not linked to devices, so the expected interval of a point is the
+slowest ``DeviceState.poll_interval_s`` among the devices at its site.
+"""
+import os
+import uuid
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterable, List, Optional, Sequence
+
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+
+DEFAULT_INTERVAL_S = int(os.getenv("GAP_DEFAULT_INTERVAL_S", "60"))
+# A spacing counts as a gap once it exceeds this many expected intervals
+GAP_FACTOR = float(os.getenv("GAP_FACTOR", "3"))
+# First scan of a point without a watermark looks back this far
+INITIAL_LOOKBACK = timedelta(days=int(os.getenv("GAP_INITIAL_LOOKBACK_DAYS", "1")))
+
+
+_SITE_INTERVALS_CTE = """
+    site_intervals AS (
+        SELECT d.site_id, max(ds.poll_interval_s) AS interval_s
+          FROM devices d
+          JOIN device_state ds ON ds.id = d.id
+         GROUP BY d.site_id
+    )
+"""
+
+_DETECT_SQL = text(
+    "WITH"
+    + _SITE_INTERVALS_CTE
+    + """,
+    targets AS (
+        SELECT p.id AS point_id,
+               COALESCE(w.watermark_ts, CAST(:floor AS timestamptz)) AS since,
+               COALESCE(w.watermark_ts, seed.ts) AS prev_watermark,
+               seed.ts AS seed_ts,
+               COALESCE(si.interval_s, :default_interval) AS interval_s
+          FROM unnest(CAST(:point_ids AS uuid[])) AS t(id)
+          JOIN points p ON p.id = t.id
+          LEFT JOIN point_gap_watermarks w ON w.point_id = p.id
+          LEFT JOIN site_intervals si ON si.site_id = p.site_id
+          -- First scan: the newest reading before the lookback, one backward index probe
+          LEFT JOIN LATERAL (
+              SELECT measurement_timestamp AS ts
+                FROM measurements
+               WHERE point_id = p.id
+                 AND measurement_timestamp <= CAST(:floor AS timestamptz)
+                 AND w.watermark_ts IS NULL
+               ORDER BY measurement_timestamp DESC
+               LIMIT 1
+          ) seed ON true
+    ),
+    fresh AS (
+        SELECT t.point_id,
+               t.interval_s,
+               m.measurement_timestamp AS ts,
+               lag(m.measurement_timestamp, 1, t.prev_watermark)
+                   OVER (PARTITION BY t.point_id ORDER BY m.measurement_timestamp) AS prev_ts
+          FROM targets t
+          JOIN LATERAL (
+              SELECT measurement_timestamp
+                FROM measurements
+               WHERE point_id = t.point_id
+                 AND measurement_timestamp > t.since
+                 AND measurement_timestamp <= :upper
+          ) m ON true
+    ),
+    gaps AS (
+        INSERT INTO measurement_gaps (id, point_id, gap_start, gap_end, expected_interval_s)
+        SELECT gen_random_uuid(), point_id, prev_ts, ts, interval_s
+          FROM fresh
+         WHERE prev_ts IS NOT NULL
+           AND ts - prev_ts > make_interval(secs => interval_s * :factor)
+        ON CONFLICT (point_id, gap_start) DO NOTHING
+        RETURNING 1
+    ),
+    advanced AS (
+        INSERT INTO point_gap_watermarks (point_id, watermark_ts, updated_at)
+        SELECT point_id, max(ts), now()
+          FROM (
+              SELECT point_id, ts FROM fresh
+              UNION ALL
+              SELECT point_id, seed_ts FROM targets WHERE seed_ts IS NOT NULL
+          ) seen
+         GROUP BY point_id
+        ON CONFLICT (point_id) DO UPDATE
+           SET watermark_ts = GREATEST(point_gap_watermarks.watermark_ts, EXCLUDED.watermark_ts),
+               updated_at = now()
+        RETURNING 1
+    )
+    SELECT (SELECT count(*) FROM gaps) AS gaps, (SELECT count(*) FROM advanced) AS advanced
+    """
+)
+
+
+_REFILLED_SQL = text(
+    """
+    SELECT CAST(g.point_id AS text) AS point_id, g.gap_start, g.gap_end
+      FROM measurement_gaps g
+     WHERE g.point_id = ANY(CAST(:point_ids AS uuid[]))
+       AND g.gap_end > CAST(:since AS timestamptz)
+       AND EXISTS (
+           SELECT 1 FROM measurements m
+            WHERE m.point_id = g.point_id
+              AND m.measurement_timestamp > g.gap_start
+              AND m.measurement_timestamp < g.gap_end
+       )
+    """
+)
+
+
+@dataclass
+class GapRunStats:
+    points_scanned: int = 0
+    points_advanced: int = 0
+    gaps_found: int = 0
+    gaps_refilled: int = 0  # recorded gaps that readings committed later fell into
+
+
+def detect_gaps(
+    conn: Connection,
+    point_ids: Optional[Iterable[uuid.UUID]] = None,
+    batch_size: int = 1000,
+    settle: timedelta = timedelta(minutes=1),
+    now: Optional[datetime] = None,
+    refill_window: Optional[timedelta] = None,
+) -> GapRunStats:
+    """Scan data newer than each point's watermark and record gaps.
+
+    Rows younger than ``settle`` are left for the next run so in-flight ingest
+    batches are not mistaken for gaps. A point scanned for the first time
+    starts from its newest reading before ``INITIAL_LOOKBACK``, so a point that
+    went silent long ago gets a watermark and counts as stale.
+
+    Uploads that commit out of order can still land behind a watermark. Gaps
+    ending within ``refill_window`` (all gaps when ``None``) that now contain a
+    reading are re-scanned with ``redetect_gaps``; older rows go through the
+    late merge (db/late.py), which does the same, so pass its threshold. Each
+    batch of points commits on its own, so an interrupted run keeps the
+    progress already made.
+    """
+    now = now or datetime.now(timezone.utc)
+    if point_ids is None:
+        point_ids = conn.execute(text("SELECT id FROM points WHERE active ORDER BY id")).scalars().all()
+    ids: Sequence[uuid.UUID] = list(point_ids)
+
+    stats = GapRunStats()
+    for i in range(0, len(ids), batch_size):
+        chunk = ids[i:i + batch_size]
+        row = conn.execute(
+            _DETECT_SQL,
+            {
+                "point_ids": [str(pid) for pid in chunk],
+                "floor": now - INITIAL_LOOKBACK,
+                "upper": now - settle,
+                "default_interval": DEFAULT_INTERVAL_S,
+                "factor": GAP_FACTOR,
+            },
+        ).one()
+        refilled = conn.execute(
+            _REFILLED_SQL,
+            {
+                "point_ids": [str(pid) for pid in chunk],
+                "since": now - refill_window if refill_window is not None else datetime.min.replace(tzinfo=timezone.utc),
+            },
+        ).all()
+        if refilled:
+            redetect_gaps(
+                conn, [r.point_id for r in refilled], [r.gap_start for r in refilled], [r.gap_end for r in refilled]
+            )
+        conn.commit()
+        stats.gaps_refilled += len(refilled)
+        stats.points_scanned += len(chunk)
+        stats.gaps_found += int(row.gaps)
+        stats.points_advanced += int(row.advanced)
+    return stats
+
+
+_REOPEN_SQL = text(
+    """
+    WITH written AS (
+        SELECT * FROM unnest(
+            CAST(:point_ids AS uuid[]), CAST(:froms AS timestamptz[]), CAST(:tos AS timestamptz[])
+        ) AS w(point_id, dirty_from, dirty_to)
+    )
+    DELETE FROM measurement_gaps g
+     USING written w
+     WHERE g.point_id = w.point_id
+       AND g.gap_start < w.dirty_to
+       AND g.gap_end > w.dirty_from
+    RETURNING CAST(g.point_id AS text) AS point_id, g.gap_start, g.gap_end, g.expected_interval_s
+    """
+)
+
+_REDETECT_SQL = text(
+    """
+    WITH reopened AS (
+        SELECT * FROM unnest(
+            CAST(:point_ids AS uuid[]), CAST(:starts AS timestamptz[]),
+            CAST(:ends AS timestamptz[]), CAST(:intervals AS integer[])
+        ) AS r(point_id, gap_start, gap_end, interval_s)
+    ),
+    readings AS (
+        SELECT r.point_id,
+               r.interval_s,
+               m.measurement_timestamp AS ts,
+               lag(m.measurement_timestamp)
+                   OVER (PARTITION BY r.point_id, r.gap_start ORDER BY m.measurement_timestamp) AS prev_ts
+          FROM reopened r
+          JOIN LATERAL (
+              SELECT measurement_timestamp
+                FROM measurements
+               WHERE point_id = r.point_id
+                 AND measurement_timestamp BETWEEN r.gap_start AND r.gap_end
+          ) m ON true
+    ),
+    gaps AS (
+        INSERT INTO measurement_gaps (id, point_id, gap_start, gap_end, expected_interval_s)
+        SELECT gen_random_uuid(), point_id, prev_ts, ts, interval_s
+          FROM readings
+         WHERE prev_ts IS NOT NULL
+           AND ts - prev_ts > make_interval(secs => interval_s * :factor)
+        ON CONFLICT (point_id, gap_start) DO NOTHING
+        RETURNING 1
+    )
+    SELECT count(*) FROM gaps
+    """
+)
+
+
+def redetect_gaps(
+    conn: Connection,
+    point_ids: Sequence[str],
+    dirty_from: Sequence[datetime],
+    dirty_to: Sequence[datetime],
+) -> int:
+    """Re-evaluate recorded gaps that overlap ranges written behind the watermarks.
+
+    ``detect_gaps`` never looks behind a point's watermark, so readings merged
+    there later (db/late.py) would leave their gaps reported forever. Each
+    overlapping gap is deleted and the readings between its two ends are
+    scanned again; what is still missing is recorded as (smaller) gaps. Runs in
+    the caller's transaction; returns the number of gaps that remain.
+    """
+    if not point_ids:
+        return 0
+    reopened = conn.execute(
+        _REOPEN_SQL, {"point_ids": list(point_ids), "froms": list(dirty_from), "tos": list(dirty_to)}
+    ).all()
+    if not reopened:
+        return 0
+    return conn.execute(
+        _REDETECT_SQL,
+        {
+            "point_ids": [r.point_id for r in reopened],
+            "starts": [r.gap_start for r in reopened],
+            "ends": [r.gap_end for r in reopened],
+            "intervals": [r.expected_interval_s for r in reopened],
+            "factor": GAP_FACTOR,
+        },
+    ).scalar()
+
+
+_STALENESS_SQL = text(
+    "WITH"
+    + _SITE_INTERVALS_CTE
+    + """
+    SELECT p.site_id,
+           count(*) AS points,
+           count(*) FILTER (WHERE w.watermark_ts IS NULL) AS never_seen,
+           count(*) FILTER (
+               WHERE w.watermark_ts >= CAST(:as_of AS timestamptz)
+                                      - make_interval(secs => COALESCE(si.interval_s, :default_interval) * :factor)
+           ) AS fresh,
+           count(*) FILTER (
+               WHERE w.watermark_ts < CAST(:as_of AS timestamptz)
+                                     - make_interval(secs => COALESCE(si.interval_s, :default_interval) * :factor)
+           ) AS stale,
+           min(w.watermark_ts) AS oldest_watermark
+      FROM points p
+      LEFT JOIN point_gap_watermarks w ON w.point_id = p.id
+      LEFT JOIN site_intervals si ON si.site_id = p.site_id
+     WHERE p.active
+     GROUP BY p.site_id
+    """
+)
+
+
+@dataclass
+class SiteStaleness:
+    site_id: uuid.UUID
+    points: int
+    fresh: int
+    stale: int
+    never_seen: int
+    oldest_watermark: Optional[datetime]
+
+
+def staleness_summary(
+    conn: Connection,
+    settle: timedelta = timedelta(minutes=1),
+    now: Optional[datetime] = None,
+) -> List[SiteStaleness]:
+    """Per-site counts of fresh / stale / never-seen points.
+
+    Reads only ``points``, the watermark table and device state (never
+    ``measurements``), so it stays cheap enough to refresh every minute for a
+    large fleet. Freshness is as of the last ``detect_gaps`` run; pass the same
+    ``settle`` so its lag is not counted as staleness.
+    """
+    rows = conn.execute(
+        _STALENESS_SQL,
+        {
+            "as_of": (now or datetime.now(timezone.utc)) - settle,
+            "default_interval": DEFAULT_INTERVAL_S,
+            "factor": GAP_FACTOR,
+        },
+    )
+    return [
+        SiteStaleness(
+            site_id=r.site_id,
+            points=r.points,
+            fresh=r.fresh,
+            stale=r.stale,
+            never_seen=r.never_seen,
+            oldest_watermark=r.oldest_watermark,
+        )
+        for r in rows
+    ]
+
+
+def fleet_totals(summary: Iterable[SiteStaleness]) -> Dict[str, int]:
+    totals = {"sites": 0, "points": 0, "fresh": 0, "stale": 0, "never_seen": 0}
+    for s in summary:
+        totals["sites"] += 1
+        totals["points"] += s.points
+        totals["fresh"] += s.fresh
+        totals["stale"] += s.stale
+        totals["never_seen"] += s.never_seen
+    return totals
@@ -0,0 +1,483 @@
+"""Streaming decode and bulk write of agent measurement uploads (asyncpg).
+
+An upload is a stream of records, either newline-delimited JSON or a sequence
+of concatenated msgpack maps (columnar batches are described in ``db/wire.py``)::
+
+    {"object_type": "analog-value", "object_instance": 9, "ts": "2025-09-10T12:00:00Z",
+     "value": 21.5, "status_flags": {"in_alarm": 0, "fault": 0}, "reliability": 0}
+
+``ts`` / ``source_ts`` may be ISO 8601 strings or epoch seconds. Points are
+resolved by BACnet identity ``(site_id, object_type, object_instance)``.
+Decoded rows are COPYed into a per-transaction staging table and merged into
+``measurements`` in one statement, so nothing is visible (or acknowledged)
+before commit. With ``late_after`` set, rows older than that are moved to
+``measurements_late`` instead and merged later by ``db/late.py``.
+"""
+import io
+import json
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import asyncpg
+import msgpack
+import numpy as np
+
+from .models import SCHEMA_VERSION, ValidationRuleType
+from .profile import ProfileAccumulator
+from .validation import ValidationEngine, to_epoch_seconds
+from .wire import COPY_COLUMNS, ColumnarBatch, to_copy_binary, uuid_matrix
+
+PointKey = Tuple[str, int]  # (object_type, object_instance) within a site
+PointInfo = Tuple[uuid.UUID, str, str]  # (point_id, name, unit)
+
+# measurements.value is Numeric(14, 6); larger magnitudes, NaN and infinities are rejected per row
+MAX_ABS_VALUE = 99_999_999.999999
+
+STAGE_COLUMNS = (
+    "point_id",
+    "measurement_timestamp",
+    "point_name",
+    "unit",
+    "value",
+    "status_flags",
+    "event_state",
+    "reliability",
+    "priority_array",
+    "source_timestamp",
+    "quality",
+)
+
+_CREATE_STAGE_SQL = """
+    CREATE TEMP TABLE ingest_stage (
+        point_id uuid NOT NULL,
+        measurement_timestamp timestamptz NOT NULL,
+        point_name text NOT NULL,
+        unit text,
+        value double precision NOT NULL,
+        status_flags jsonb,
+        event_state integer,
+        reliability integer,
+        priority_array jsonb,
+        source_timestamp timestamptz,
+        quality integer
+    ) ON COMMIT DROP
+"""
+
+def _with_dirty_log(insert_sql: str) -> str:
+    """Wrap a measurements INSERT so it also logs the written range per point (see db/cache.py)
+    and returns the inserted row count."""
+    return (
+        "WITH ins AS ("
+        + insert_sql
+        + """    RETURNING point_id, measurement_timestamp
+    ),
+    logged AS (
+        INSERT INTO point_dirty_log (point_id, dirty_from, dirty_to)
+        SELECT point_id, min(measurement_timestamp), max(measurement_timestamp)
+          FROM ins
+         GROUP BY point_id
+    )
+    SELECT count(*) FROM ins
+"""
+    )
+
+
+# Columns written to measurements (after id) and to measurements_late (after id, staged_at)
+_TARGET_COLUMNS = (
+    "point_id, measurement_timestamp, point_name, unit, value, status_flags, event_state, "
+    "reliability, priority_array, source_timestamp, quality, schema_version"
+)
+
+
+def _merge_sql(rows_sql: str) -> str:
+    """INSERT of the staged rows at or after the late cutoff ``$2`` (all rows when NULL)."""
+    return _with_dirty_log(f"""
+    INSERT INTO measurements (id, {_TARGET_COLUMNS})
+    SELECT gen_random_uuid(), r.*
+      FROM ({rows_sql}) AS r({_TARGET_COLUMNS})
+     WHERE $2::timestamptz IS NULL OR r.measurement_timestamp >= $2
+    ON CONFLICT (point_id, measurement_timestamp) DO NOTHING
+""")
+
+
+def _stage_late_sql(rows_sql: str) -> str:
+    """Divert staged rows older than the late cutoff ``$2`` to ``measurements_late`` (see db/late.py)."""
+    return f"""
+    WITH late AS (
+        INSERT INTO measurements_late (id, {_TARGET_COLUMNS})
+        SELECT gen_random_uuid(), r.*
+          FROM ({rows_sql}) AS r({_TARGET_COLUMNS})
+         WHERE r.measurement_timestamp < $2
+        RETURNING 1
+    )
+    SELECT count(*) FROM late
+"""
+
+
+_STAGE_ROWS_SQL = """
+        SELECT point_id, measurement_timestamp, point_name, unit, value,
+               status_flags, event_state, reliability, priority_array, source_timestamp,
+               quality, $1::int
+          FROM ingest_stage
+"""
+_MERGE_SQL = _merge_sql(_STAGE_ROWS_SQL)
+_STAGE_LATE_SQL = _stage_late_sql(_STAGE_ROWS_SQL)
+
+# Fixed-width staging for columnar uploads, filled by binary COPY (see db/wire.py)
+_CREATE_COLUMNAR_STAGE_SQL = """
+    CREATE TEMP TABLE ingest_stage_columnar (
+        point_id uuid NOT NULL,
+        measurement_timestamp timestamptz NOT NULL,
+        value double precision NOT NULL,
+        status_bits smallint NOT NULL,
+        quality integer NOT NULL
+    ) ON COMMIT DROP
+"""
+
+_COLUMNAR_ROWS_SQL = """
+        SELECT s.point_id, s.measurement_timestamp, p.name, p.unit, s.value,
+               CASE WHEN s.status_bits & 128 = 0 THEN NULL ELSE jsonb_build_object(
+                   'in_alarm', s.status_bits & 1,
+                   'fault', (s.status_bits >> 1) & 1,
+                   'overridden', (s.status_bits >> 2) & 1,
+                   'out_of_service', (s.status_bits >> 3) & 1
+               ) END,
+               NULL::int, NULL::int, NULL::jsonb, NULL::timestamptz,
+               s.quality, $1::int
+          FROM ingest_stage_columnar s
+          JOIN points p ON p.id = s.point_id
+"""
+_MERGE_COLUMNAR_SQL = _merge_sql(_COLUMNAR_ROWS_SQL)
+_STAGE_LATE_COLUMNAR_SQL = _stage_late_sql(_COLUMNAR_ROWS_SQL)
+
+_TOUCH_DEVICE_SQL = """
+    INSERT INTO device_state (id, last_seen_ts, last_upload_ts, status, updated_at)
+    VALUES ($1, now(), now(), 'READY', now())
+    ON CONFLICT (id) DO UPDATE
+       SET last_upload_ts = now(),
+           last_seen_ts = GREATEST(device_state.last_seen_ts, now()),
+           updated_at = now()
+"""
+
+_DEVICE_SITE_SQL = "SELECT site_id FROM devices WHERE id = $1"
+
+_RESOLVE_SQL = """
+    SELECT p.id, p.name, p.unit, p.object_type, p.object_instance
+      FROM unnest($2::text[], $3::int[]) AS k(object_type, object_instance)
+      JOIN points p
+        ON p.site_id = $1 AND p.object_type = k.object_type AND p.object_instance = k.object_instance
+     WHERE p.active
+"""
+
+_RULES_SQL = """
+    SELECT point_id, rule_type::text AS rule_type, params::text AS params
+      FROM validation_rules
+     WHERE point_id = ANY($1::uuid[]) AND enabled
+"""
+
+
+class NdjsonDecoder:
+    """Incremental newline-delimited JSON decoder; ``feed`` returns complete records.
+
+    An unfinished line is kept as a list of chunks, joined once its newline
+    arrives, and may not grow past ``max_buffer_size`` bytes.
+    """
+
+    def __init__(self, max_buffer_size: int = 64 * 1024 * 1024):
+        self.max_buffer_size = max_buffer_size
+        self._tail: List[bytes] = []
+        self._tail_size = 0
+
+    def feed(self, data: bytes) -> List[dict]:
+        if b"\n" not in data:
+            self._keep(data)
+            return []
+        lines = b"".join(self._tail + [data]).split(b"\n")
+        self._tail, self._tail_size = [], 0
+        self._keep(lines.pop())
+        return [json.loads(line) for line in lines if line.strip()]
+
+    def _keep(self, data: bytes) -> None:
+        self._tail_size += len(data)
+        if self._tail_size > self.max_buffer_size:
+            raise ValueError(f"ndjson line longer than {self.max_buffer_size} bytes")
+        if data:
+            self._tail.append(data)
+
+    def close(self) -> List[dict]:
+        tail = b"".join(self._tail)
+        self._tail, self._tail_size = [], 0
+        return [json.loads(tail)] if tail.strip() else []
+
+
+class MsgpackDecoder:
+    """Incremental decoder for a stream of concatenated msgpack maps."""
+
+    def __init__(self, max_buffer_size: int = 64 * 1024 * 1024):
+        self._unpacker = msgpack.Unpacker(raw=False, max_buffer_size=max_buffer_size)
+        self._fed = 0
+        self._decoded = 0  # stream offset after the last complete record
+
+    def feed(self, data: bytes) -> List[dict]:
+        self._unpacker.feed(data)
+        self._fed += len(data)
+        records = []
+        # tell() also counts the bytes of a partial record, so it is read after each complete one
+        for record in self._unpacker:
+            records.append(record)
+            self._decoded = self._unpacker.tell()
+        return records
+
+    def close(self) -> List[dict]:
+        if self._decoded != self._fed:
+            raise ValueError("truncated msgpack record at end of body")
+        return []
+
+
+DECODERS = {
+    "application/x-ndjson": NdjsonDecoder,
+    "application/ndjson": NdjsonDecoder,
+    "application/msgpack": MsgpackDecoder,
+    "application/x-msgpack": MsgpackDecoder,
+}
+
+
+def _parse_ts(value: Any) -> Optional[datetime]:
+    if value is None:
+        return None
+    if isinstance(value, (int, float)):
+        return datetime.fromtimestamp(value, tz=timezone.utc)
+    ts = datetime.fromisoformat(value)
+    return ts if ts.tzinfo is not None else ts.replace(tzinfo=timezone.utc)
+
+
+def _json_or_none(value: Any) -> Optional[str]:
+    return None if value is None else json.dumps(value, separators=(",", ":"))
+
+
+class UnknownDevice(ValueError):
+    """The upload's device does not exist or belongs to another site."""
+
+
+class PointResolver:
+    """Caches BACnet identity -> point per site; misses are resolved in one query.
+
+    A site's entries are dropped ``ttl_s`` after they were first loaded, so
+    renames, unit changes and deactivations from a catalog sync (db/catalog.py)
+    in another process are picked up; call ``invalidate`` after changing points
+    in-process.
+    """
+
+    def __init__(self, ttl_s: float = 300.0):
+        self.ttl_s = ttl_s
+        self._cache: Dict[uuid.UUID, Dict[PointKey, PointInfo]] = {}
+        self._loaded_at: Dict[uuid.UUID, float] = {}
+
+    async def resolve(self, conn: asyncpg.Connection, site_id: uuid.UUID, keys: Iterable[PointKey]) -> Dict[PointKey, PointInfo]:
+        now = time.monotonic()
+        if now - self._loaded_at.get(site_id, now) >= self.ttl_s:
+            self.invalidate(site_id)
+        self._loaded_at.setdefault(site_id, now)
+        site = self._cache.setdefault(site_id, {})
+        missing = [k for k in set(keys) if k not in site]
+        if missing:
+            rows = await conn.fetch(
+                _RESOLVE_SQL, site_id, [k[0] for k in missing], [k[1] for k in missing]
+            )
+            for r in rows:
+                site[(r["object_type"], r["object_instance"])] = (r["id"], r["name"], r["unit"])
+        return site
+
+    def invalidate(self, site_id: Optional[uuid.UUID] = None) -> None:
+        if site_id is None:
+            self._cache.clear()
+            self._loaded_at.clear()
+        else:
+            self._cache.pop(site_id, None)
+            self._loaded_at.pop(site_id, None)
+
+
+async def load_rule_sets(conn: asyncpg.Connection, validator: ValidationEngine, point_ids: Sequence[uuid.UUID]) -> np.ndarray:
+    """``RuleCache.load`` over asyncpg: rule cache slots for ``point_ids``, loading misses in one query."""
+    slots, missing = validator.cache.lookup(point_ids)
+    if missing:
+        rows = await conn.fetch(_RULES_SQL, missing)
+        rules = [
+            SimpleNamespace(
+                point_id=r["point_id"],
+                rule_type=ValidationRuleType[r["rule_type"]],
+                params=json.loads(r["params"]),
+                enabled=True,
+            )
+            for r in rows
+        ]
+        validator.cache.store(missing, rules)
+    return slots
+
+
+class IngestBatch:
+    """One upload: stage rows inside the caller's transaction, then merge on ``finish``.
+
+    Usage::
+
+        async with conn.transaction():
+            batch = IngestBatch(conn, site_id, device_id, resolver, validator)
+            await batch.begin()
+            for records in decoded_chunks:
+                await batch.add(records)
+            result = await batch.finish()
+    """
+
+    def __init__(
+        self,
+        conn: asyncpg.Connection,
+        site_id: uuid.UUID,
+        device_id: uuid.UUID,
+        resolver: PointResolver,
+        validator: Optional[ValidationEngine] = None,
+        late_after: Optional[timedelta] = None,
+        profiles: Optional[ProfileAccumulator] = None,
+    ):
+        self.conn = conn
+        self.site_id = site_id
+        self.device_id = device_id
+        self.resolver = resolver
+        self.validator = validator
+        # Rows older than this go to measurements_late instead of (possibly compressed) chunks
+        self.late_after = late_after
+        self.profiles = profiles
+        self._observed: List[tuple] = []  # (point_ids, codes, ts, values) for profiles after commit
+        self.received = 0
+        self.rejected = 0
+        self._columnar_version: Optional[int] = None
+
+    async def begin(self) -> None:
+        """Check the device against the site and create the staging table.
+
+        Raises ``UnknownDevice`` before any of the body is read, rather than
+        failing the device_state foreign key in ``finish``.
+        """
+        device_site = await self.conn.fetchval(_DEVICE_SITE_SQL, self.device_id)
+        if device_site is None:
+            raise UnknownDevice(f"unknown device {self.device_id}")
+        if device_site != self.site_id:
+            raise UnknownDevice(f"device {self.device_id} does not belong to site {self.site_id}")
+        await self.conn.execute(_CREATE_STAGE_SQL)
+
+    async def add(self, records: List[dict]) -> None:
+        if not records:
+            return
+        self.received += len(records)
+        points = await self.resolver.resolve(
+            self.conn, self.site_id, ((r.get("object_type"), r.get("object_instance")) for r in records)
+        )
+
+        rows = []
+        for r in records:
+            info = points.get((r.get("object_type"), r.get("object_instance")))
+            if info is None or r.get("value") is None or r.get("ts") is None:
+                self.rejected += 1
+                continue
+            value = float(r["value"])
+            if not abs(value) <= MAX_ABS_VALUE:  # also false for NaN
+                self.rejected += 1
+                continue
+            rows.append((
+                info[0],
+                _parse_ts(r["ts"]),
+                info[1],
+                info[2],
+                value,
+                _json_or_none(r.get("status_flags")),
+                r.get("event_state"),
+                r.get("reliability"),
+                _json_or_none(r.get("priority_array")),
+                _parse_ts(r.get("source_ts")),
+                r.get("quality"),
+            ))
+        if not rows:
+            return
+
+        if self.validator is not None or self.profiles is not None:
+            index: Dict[uuid.UUID, int] = {}
+            codes = np.fromiter((index.setdefault(row[0], len(index)) for row in rows), dtype=np.int64, count=len(rows))
+            point_ids = list(index)
+            ts = to_epoch_seconds([row[1] for row in rows])
+            values = np.fromiter((row[4] for row in rows), dtype=np.float64, count=len(rows))
+            if self.validator is not None:
+                rows = await self._validate(rows, point_ids, codes, ts, values)
+            if self.profiles is not None:
+                self._observed.append((point_ids, codes, ts, values))
+        await self.conn.copy_records_to_table("ingest_stage", records=rows, columns=STAGE_COLUMNS)
+
+    async def add_columnar(self, batch: ColumnarBatch) -> None:
+        """Stage a decoded columnar batch with one binary COPY; no per-row Python objects."""
+        n = batch.n_rows
+        if n == 0:
+            return
+        if self._columnar_version is None:
+            await self.conn.execute(_CREATE_COLUMNAR_STAGE_SQL)
+            self._columnar_version = batch.version
+        elif batch.version != self._columnar_version:
+            raise ValueError("columnar batches with different versions in one upload")
+        self.received += n
+
+        keys = batch.point_keys()
+        points = await self.resolver.resolve(self.conn, self.site_id, keys)
+        unresolved = uuid.UUID(int=0)
+        point_ids = [points[k][0] if k in points else unresolved for k in keys]
+        known = np.fromiter((k in points for k in keys), dtype=bool, count=len(keys))
+        rows = np.flatnonzero(known[batch.point_idx] & (np.abs(batch.values) <= MAX_ABS_VALUE))
+        self.rejected += n - rows.shape[0]
+        if rows.shape[0] == 0:
+            return
+
+        quality = None
+        if self.validator is not None:
+            # Unresolved keys share one slot with no rules; none of their rows are evaluated
+            slots = await load_rule_sets(self.conn, self.validator, point_ids)
+            quality = np.zeros(n, dtype=np.int32)
+            quality[rows] = self.validator.evaluate_slots(
+                slots, batch.point_idx[rows], batch.ts_us[rows] / 1e6, batch.values[rows]
+            )
+
+        if self.profiles is not None:
+            self._observed.append((point_ids, batch.point_idx[rows], batch.ts_us[rows] / 1e6, batch.values[rows]))
+        data = to_copy_binary(batch, uuid_matrix(point_ids), quality, rows=rows)
+        await self.conn.copy_to_table(
+            "ingest_stage_columnar", source=io.BytesIO(data), columns=COPY_COLUMNS, format="binary"
+        )
+
+    async def _validate(self, rows: List[tuple], point_ids: List[uuid.UUID], codes: np.ndarray, ts: np.ndarray, values: np.ndarray) -> List[tuple]:
+        slots = await load_rule_sets(self.conn, self.validator, point_ids)
+        quality = self.validator.evaluate_slots(slots, codes, ts, values)
+        return [row[:10] + ((row[10] or 0) | q,) for row, q in zip(rows, quality.tolist())]
+
+    def publish_profiles(self) -> None:
+        """Fold this upload's rows into ``profiles``; call only once the transaction has committed."""
+        for point_ids, codes, ts, values in self._observed:
+            self.profiles.add(self.device_id, point_ids, codes, ts, values)
+        self._observed = []
+
+    async def finish(self) -> Dict[str, int]:
+        cutoff = datetime.now(timezone.utc) - self.late_after if self.late_after is not None else None
+        merges = [(_MERGE_SQL, _STAGE_LATE_SQL, SCHEMA_VERSION)]
+        if self._columnar_version is not None:
+            merges.append((_MERGE_COLUMNAR_SQL, _STAGE_LATE_COLUMNAR_SQL, self._columnar_version))
+        inserted = late = 0
+        for merge_sql, late_sql, version in merges:
+            inserted += await self.conn.fetchval(merge_sql, version, cutoff)
+            if cutoff is not None:
+                late += await self.conn.fetchval(late_sql, version, cutoff)
+        await self.conn.execute(_TOUCH_DEVICE_SQL, self.device_id)
+        staged = self.received - self.rejected
+        return {
+            "received": self.received,
+            "inserted": inserted,
+            "late": late,
+            "duplicates": staged - inserted - late,
+            "rejected": self.rejected,
+        }
@@ -0,0 +1,210 @@
+"""Merge of late and out-of-order measurements staged in ``measurements_late``.
+
+Rows older than the ingest late threshold (``LATE_DATA_AFTER_HOURS``) are not
+inserted into ``measurements`` directly, where they would land in compressed
+chunks one conflict check at a time. ``merge_late_data`` instead maps the
+staged rows to the compressed chunk they belong to (time slice and
+``point_id`` hash partition) and, per chunk, in one transaction: decompresses
+it once, moves its staged rows in with a single deduplicating
+``INSERT ... ON CONFLICT DO NOTHING``, and recompresses it. Rows for
+uncompressed or not yet existing chunks are merged last with one plain insert.
+
+Once a chunk has committed, a second short transaction appends the merged
+per-point ranges to ``point_dirty_log`` and re-scans the ``measurement_gaps``
+rows they overlap: the rows land behind the gap watermarks, where
+``detect_gaps`` never looks again.
+"""
+import os
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+
+from db.gaps import redetect_gaps
+
+LATE_DATA_AFTER_HOURS = float(os.getenv("LATE_DATA_AFTER_HOURS", "24"))
+
+# pg advisory lock key, so only one merge job per database runs at a time
+_MERGE_LOCK_KEY = 0x4C415445  # "LATE"
+
+_COLUMNS = (
+    "point_id, measurement_timestamp, point_name, unit, value, status_flags, event_state, "
+    "reliability, priority_array, source_timestamp, quality, schema_version"
+)
+
+# Compressed chunks with staged rows. A row belongs to the chunk whose time slice holds its
+# timestamp and whose space slice holds the hash of its point_id (the default partitioning
+# function of the 8 point_id partitions), so only the partitions actually hit are rewritten.
+_CHUNKS_SQL = text(
+    """
+    SELECT format('%I.%I', c.schema_name, c.table_name) AS chunk,
+           _timescaledb_functions.to_timestamp(st.range_start) AS range_start,
+           _timescaledb_functions.to_timestamp(st.range_end) AS range_end,
+           sp.range_start AS hash_start,
+           sp.range_end AS hash_end
+      FROM _timescaledb_catalog.hypertable h
+      JOIN _timescaledb_catalog.dimension dt ON dt.hypertable_id = h.id AND dt.column_name = 'measurement_timestamp'
+      JOIN _timescaledb_catalog.dimension dp ON dp.hypertable_id = h.id AND dp.column_name = 'point_id'
+      JOIN _timescaledb_catalog.chunk c ON c.hypertable_id = h.id AND NOT c.dropped AND c.compressed_chunk_id IS NOT NULL
+      JOIN _timescaledb_catalog.chunk_constraint ct ON ct.chunk_id = c.id
+      JOIN _timescaledb_catalog.dimension_slice st ON st.id = ct.dimension_slice_id AND st.dimension_id = dt.id
+      JOIN _timescaledb_catalog.chunk_constraint cp ON cp.chunk_id = c.id
+      JOIN _timescaledb_catalog.dimension_slice sp ON sp.id = cp.dimension_slice_id AND sp.dimension_id = dp.id
+     WHERE h.table_name = 'measurements'
+       AND EXISTS (
+           SELECT 1 FROM measurements_late l
+            WHERE l.staged_at <= :cutoff
+              AND l.measurement_timestamp >= _timescaledb_functions.to_timestamp(st.range_start)
+              AND l.measurement_timestamp < _timescaledb_functions.to_timestamp(st.range_end)
+              AND _timescaledb_functions.get_partition_hash(l.point_id) >= sp.range_start
+              AND _timescaledb_functions.get_partition_hash(l.point_id) < sp.range_end
+       )
+     ORDER BY st.range_start, sp.range_start
+    """
+)
+
+_MOVE_SQL = text(
+    f"""
+    WITH moved AS (
+        DELETE FROM measurements_late
+         WHERE measurement_timestamp >= :range_start
+           AND measurement_timestamp < :range_end
+           AND _timescaledb_functions.get_partition_hash(point_id) >= :hash_start
+           AND _timescaledb_functions.get_partition_hash(point_id) < :hash_end
+           AND staged_at <= :cutoff
+        RETURNING *
+    ),
+    ins AS (
+        INSERT INTO measurements (id, {_COLUMNS})
+        SELECT DISTINCT ON (point_id, measurement_timestamp) gen_random_uuid(), {_COLUMNS}
+          FROM moved
+         ORDER BY point_id, measurement_timestamp, staged_at
+        ON CONFLICT (point_id, measurement_timestamp) DO NOTHING
+        RETURNING point_id, measurement_timestamp
+    ),
+    merged AS (
+        SELECT CAST(point_id AS text) AS point_id,
+               min(measurement_timestamp) AS dirty_from,
+               max(measurement_timestamp) AS dirty_to
+          FROM ins
+         GROUP BY point_id
+    )
+    SELECT (SELECT count(*) FROM moved) AS staged,
+           (SELECT count(*) FROM ins) AS inserted,
+           array_agg(point_id) AS point_ids,
+           array_agg(dirty_from) AS dirty_from,
+           array_agg(dirty_to) AS dirty_to
+      FROM merged
+    """
+)
+
+_LOG_DIRTY_SQL = text(
+    """
+    INSERT INTO point_dirty_log (point_id, dirty_from, dirty_to)
+    SELECT * FROM unnest(CAST(:point_ids AS uuid[]), CAST(:froms AS timestamptz[]), CAST(:tos AS timestamptz[]))
+    """
+)
+
+_DECOMPRESS_SQL = text("SELECT decompress_chunk(CAST(:chunk AS regclass), if_compressed => true)")
+_COMPRESS_SQL = text("SELECT compress_chunk(CAST(:chunk AS regclass), if_not_compressed => true)")
+
+_LOCK_SQL = text("SELECT pg_try_advisory_lock(:key)")
+_UNLOCK_SQL = text("SELECT pg_advisory_unlock(:key)")
+
+# Bounds for the final pass over rows outside every compressed chunk
+_MIN_TS = datetime(1, 1, 2, tzinfo=timezone.utc)
+_MAX_TS = datetime(9999, 12, 30, tzinfo=timezone.utc)
+_MIN_HASH, _MAX_HASH = -(2 ** 63), 2 ** 63 - 1
+
+
+@dataclass
+class LateMergeStats:
+    chunks_recompressed: int = 0
+    staged: int = 0
+    inserted: int = 0
+    gaps_redetected: int = 0  # gaps still open after re-scanning the ones the merge overlapped
+    skipped: bool = False  # another merge job held the lock
+
+    @property
+    def duplicates(self) -> int:
+        return self.staged - self.inserted
+
+
+def late_data_threshold() -> Optional[timedelta]:
+    """Age past which live ingest stages rows in ``measurements_late`` (``None``: disabled)."""
+    return timedelta(hours=LATE_DATA_AFTER_HOURS) if LATE_DATA_AFTER_HOURS > 0 else None
+
+
+def _move(conn: Connection, cutoff: datetime, stats: LateMergeStats, range_start: datetime = _MIN_TS,
+          range_end: datetime = _MAX_TS, hash_start: int = _MIN_HASH, hash_end: int = _MAX_HASH):
+    row = conn.execute(
+        _MOVE_SQL,
+        {
+            "range_start": range_start,
+            "range_end": range_end,
+            "hash_start": hash_start,
+            "hash_end": hash_end,
+            "cutoff": cutoff,
+        },
+    ).one()
+    stats.staged += row.staged
+    stats.inserted += row.inserted
+    return row
+
+
+def _record_merged(conn: Connection, merged, stats: LateMergeStats) -> None:
+    """Log the merged ranges for the read cache and re-scan the gaps they overlap.
+
+    Runs in its own short transaction after the chunk's has committed: dirty-log
+    ids taken inside a transaction that spends minutes recompressing would be
+    skipped as a hole by the cache poller (db/cache.py) before they commit.
+    """
+    if not merged.point_ids:
+        return
+    params = {"point_ids": merged.point_ids, "froms": merged.dirty_from, "tos": merged.dirty_to}
+    conn.execute(_LOG_DIRTY_SQL, params)
+    stats.gaps_redetected += redetect_gaps(conn, merged.point_ids, merged.dirty_from, merged.dirty_to)
+    conn.commit()
+
+
+def merge_late_data(conn: Connection, cutoff: Optional[datetime] = None) -> LateMergeStats:
+    """Merge rows staged up to ``cutoff`` (default: now) into ``measurements``.
+
+    ``conn`` must not be inside a transaction: every chunk commits on its own,
+    so a failure rolls back only the chunk it was on, still compressed.
+    """
+    stats = LateMergeStats()
+    if not conn.execute(_LOCK_SQL, {"key": _MERGE_LOCK_KEY}).scalar():
+        conn.commit()
+        stats.skipped = True
+        return stats
+    try:
+        cutoff = cutoff or conn.execute(text("SELECT now()")).scalar()
+        chunks = conn.execute(_CHUNKS_SQL, {"cutoff": cutoff}).all()
+        conn.commit()
+
+        for c in chunks:
+            conn.execute(_DECOMPRESS_SQL, {"chunk": c.chunk})
+            merged = _move(conn, cutoff, stats, c.range_start, c.range_end, c.hash_start, c.hash_end)
+            conn.execute(_COMPRESS_SQL, {"chunk": c.chunk})
+            conn.commit()
+            stats.chunks_recompressed += 1
+            _record_merged(conn, merged, stats)
+
+        # Rows for uncompressed chunks, or with no chunk yet (the insert creates it)
+        merged = _move(conn, cutoff, stats)
+        conn.commit()
+        _record_merged(conn, merged, stats)
+    finally:
+        # Undo a failed chunk (it was decompressed in the same transaction)
+        conn.rollback()
+        conn.execute(_UNLOCK_SQL, {"key": _MERGE_LOCK_KEY})
+        conn.commit()
+    return stats
+
+
+def late_backlog(conn: Connection) -> int:
+    """Rows currently waiting in ``measurements_late``."""
+    return conn.execute(text("SELECT count(*) FROM measurements_late")).scalar()
@@ -1,16 +1,19 @@
 import enum
 import uuid
 from sqlalchemy import (
-    Column, Integer, Boolean, Numeric, Text, ForeignKey, DateTime, String,
-    UniqueConstraint, Enum, Index
+    Column, Integer, BigInteger, Boolean, Numeric, Float, Text, ForeignKey, DateTime, String,
+    LargeBinary, UniqueConstraint, Enum, Index
 )
-from sqlalchemy.dialects.postgresql import JSONB, UUID
+from sqlalchemy.dialects.postgresql import ARRAY, JSONB, UUID
 from sqlalchemy.ext.mutable import MutableDict
 from sqlalchemy.orm import declarative_base, relationship
 from sqlalchemy.sql import func
 
 Base = declarative_base()
 
+# Version of the measurement row layout; also the agent wire format version (see db/wire.py)
+SCHEMA_VERSION = 1
+
 
 class Site(Base):
     __tablename__ = 'sites'
@@ -74,6 +77,7 @@ class Point(Base):
     unit = Column(String(64), nullable=False)
     tags = Column(MutableDict.as_mutable(JSONB), nullable=False, default=dict)
     active = Column(Boolean, nullable=False, default=True)
+    meta_hash = Column(Text, nullable=True)  # hash of the current definition, see db/catalog.py
     created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
 
     __table_args__ = (UniqueConstraint('site_id', 'object_type', 'object_instance', name='uq_points_site_type_instance'),)
@@ -97,6 +101,34 @@ class PointMetadataHistory(Base):
     point = relationship("Point", back_populates="metadata_history")
 
 
+class ValidationRuleType(enum.Enum):
+    RANGE = "range"
+    RATE_OF_CHANGE = "rate_of_change"
+    STUCK = "stuck"
+    SPIKE = "spike"
+
+
+class ValidationRule(Base):
+    __tablename__ = 'validation_rules'
+
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    point_id = Column(UUID(as_uuid=True), ForeignKey('points.id', ondelete='CASCADE'), nullable=False)
+
+    rule_type = Column(Enum(ValidationRuleType, name="validation_rule_type"), nullable=False)
+    params = Column(MutableDict.as_mutable(JSONB), nullable=False, default=dict)  # e.g. {"min": 10, "max": 35}
+    enabled = Column(Boolean, nullable=False, default=True)
+
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    updated_at = Column(
+        DateTime(timezone=True),
+        server_default=func.now(),
+        onupdate=func.now(),
+        nullable=False,
+    )
+
+    point = relationship("Point", back_populates="validation_rules")
+
+
 class Measurement(Base):
     __tablename__ = 'measurements'
 
@@ -121,11 +153,33 @@ class Measurement(Base):
     __table_args__ = (UniqueConstraint('point_id', 'measurement_timestamp', name='uq_point_measurement_time'),)
 
     quality = Column(Integer)
-    schema_version = Column(Integer, nullable=False, default=1)
+    schema_version = Column(Integer, nullable=False, default=SCHEMA_VERSION)
     meta_hash = Column(Text)
 
     point = relationship("Point", back_populates="measurements")
 
+class LateMeasurement(Base):
+    __tablename__ = 'measurements_late'
+
+    # Hypertable on staged_at; rows older than the ingest late threshold wait here
+    # until db/late.py merges them into measurements one target chunk at a time
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    staged_at = Column(DateTime(timezone=True), primary_key=True, server_default=func.now())
+    point_id = Column(UUID(as_uuid=True), nullable=False)
+    measurement_timestamp = Column(DateTime(timezone=True), nullable=False)
+
+    point_name = Column(String(255), nullable=False)
+    unit = Column(String(64))
+    value = Column(Numeric(14, 6), nullable=False)
+    status_flags = Column(JSONB, nullable=True)
+    event_state = Column(Integer, nullable=True)
+    reliability = Column(Integer, nullable=True)
+    priority_array = Column(JSONB, nullable=True)
+    source_timestamp = Column(DateTime(timezone=True), nullable=True)
+    quality = Column(Integer)
+    schema_version = Column(Integer, nullable=False, default=SCHEMA_VERSION)
+
+
 class DeviceStatus(enum.Enum):
     READY = "ready"
     DEGRADED = "degraded"
@@ -155,9 +209,81 @@ class DeviceState(Base):
 
     device = relationship("Device", back_populates="state")
 
+class PointGapWatermark(Base):
+    __tablename__ = "point_gap_watermarks"
+
+    point_id = Column(UUID(as_uuid=True), ForeignKey("points.id", ondelete="CASCADE"), primary_key=True)
+    watermark_ts = Column(DateTime(timezone=True), nullable=False)  # newest measurement already scanned for gaps
+    updated_at = Column(
+        DateTime(timezone=True),
+        server_default=func.now(),
+        onupdate=func.now(),
+        nullable=False,
+    )
+
+
+class MeasurementGap(Base):
+    __tablename__ = "measurement_gaps"
+
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    point_id = Column(UUID(as_uuid=True), ForeignKey("points.id", ondelete="CASCADE"), nullable=False)
+    gap_start = Column(DateTime(timezone=True), nullable=False)  # last reading before the gap
+    gap_end = Column(DateTime(timezone=True), nullable=False)  # first reading after the gap
+    expected_interval_s = Column(Integer, nullable=False)
+    detected_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+
+    __table_args__ = (UniqueConstraint("point_id", "gap_start", name="uq_measurement_gaps_point_start"),)
+
+
+class PointDirtyLog(Base):
+    __tablename__ = "point_dirty_log"
+
+    # One row per point per committed upload; readers tail it by id to invalidate cached results
+    id = Column(BigInteger, primary_key=True, autoincrement=True)
+    point_id = Column(UUID(as_uuid=True), nullable=False)
+    dirty_from = Column(DateTime(timezone=True), nullable=False)
+    dirty_to = Column(DateTime(timezone=True), nullable=False)
+    written_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+
+
+class PointProfile(Base):
+    __tablename__ = "point_profiles"
+
+    # Maintained incrementally by ingest (db/profile.py); sketches are stored serialized
+    point_id = Column(UUID(as_uuid=True), ForeignKey("points.id", ondelete="CASCADE"), primary_key=True)
+    device_id = Column(UUID(as_uuid=True), nullable=True)  # device that last uploaded the point
+    samples = Column(BigInteger, nullable=False, server_default="0")
+    first_ts = Column(DateTime(timezone=True))
+    last_ts = Column(DateTime(timezone=True))
+    min_value = Column(Float)
+    max_value = Column(Float)
+    sum_abs_delta = Column(Float, nullable=False, server_default="0")
+    deltas = Column(BigInteger, nullable=False, server_default="0")
+    value_digest = Column(LargeBinary)  # t-digest centroids
+    ts_hll = Column(LargeBinary)  # HyperLogLog over timestamps (duplicate ratio)
+    value_hll = Column(LargeBinary)  # HyperLogLog over values
+    compressed_bytes = Column(BigInteger, nullable=False, server_default="0")
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+
+
+class ProfileChunkBytes(Base):
+    __tablename__ = "profile_chunk_bytes"
+
+    # Compressed chunks already added to point_profiles.compressed_bytes, with each point's share
+    chunk_id = Column(Integer, primary_key=True)  # _timescaledb_catalog.chunk id of the measurements chunk
+    compressed_chunk_id = Column(Integer, nullable=False)
+    compressed_size = Column(BigInteger, nullable=False)  # a change means the chunk was recompressed
+    point_ids = Column(ARRAY(UUID(as_uuid=True)), nullable=False)
+    bytes = Column(ARRAY(BigInteger), nullable=False)
+    counted_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+
+
 Index('ix_measurements_point_time', Measurement.point_id, Measurement.measurement_timestamp.desc())
 Index('ix_measurements_time', Measurement.measurement_timestamp.desc())
 Index('ix_devices_site', Device.site_id)
+Index('ix_validation_rules_point', ValidationRule.point_id)
+Index('ix_point_dirty_log_written_at', PointDirtyLog.written_at)
+Index('ix_measurements_late_time', LateMeasurement.measurement_timestamp)
 Index('ix_points_site', Point.site_id)
 Index('ix_points_site_type_instance',
       Point.site_id,
@@ -0,0 +1,402 @@
+"""Per-point data profiles maintained by ingest, for chunk sizing and COV tuning.
+
+``point_profiles`` holds, per point: samples, time span (samples/day), value
+range, mean absolute change between consecutive samples, a t-digest of values,
+HyperLogLog counts of distinct timestamps (duplicate ratio) and distinct values,
+and compressed bytes.
+
+The ingest server folds every committed batch into a ``ProfileAccumulator``
+(vectorized over the batch, no database work) and periodically flushes it with
+``flush_profiles``: scalars are added in SQL and sketches merged in Python under
+``FOR UPDATE``, so any number of servers can flush into the same rows. Values
+for the digests are only buffered by ``add``; they are compressed together with
+the stored digests once per flush, in a worker thread. Compressed bytes come from
+``refresh_compressed_bytes``, which reads each compressed chunk once, again
+only after it was recompressed, and subtracts chunks that retention dropped.
+"""
+import asyncio
+import uuid
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import asyncpg
+import numpy as np
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+
+from .sketch import HLL_P, TDigest, compress_centroids, hash64, hll_count, hll_registers
+from .validation import batch_order
+
+_HLL_M = 1 << HLL_P
+
+_ENSURE_SQL = """
+    INSERT INTO point_profiles (point_id)
+    SELECT id FROM points WHERE id = ANY($1::uuid[]) ORDER BY id
+    ON CONFLICT (point_id) DO NOTHING
+"""
+
+_LOCK_SQL = """
+    SELECT point_id, value_digest, ts_hll, value_hll
+      FROM point_profiles
+     WHERE point_id = ANY($1::uuid[])
+     ORDER BY point_id
+       FOR UPDATE
+"""
+
+_UPDATE_SQL = """
+    UPDATE point_profiles p
+       SET device_id = COALESCE(u.device_id, p.device_id),
+           samples = p.samples + u.samples,
+           first_ts = LEAST(p.first_ts, u.first_ts),
+           last_ts = GREATEST(p.last_ts, u.last_ts),
+           min_value = LEAST(p.min_value, u.min_value),
+           max_value = GREATEST(p.max_value, u.max_value),
+           sum_abs_delta = p.sum_abs_delta + u.sum_abs_delta,
+           deltas = p.deltas + u.deltas,
+           value_digest = u.value_digest,
+           ts_hll = u.ts_hll,
+           value_hll = u.value_hll,
+           updated_at = now()
+      FROM unnest(
+          $1::uuid[], $2::uuid[], $3::bigint[], $4::timestamptz[], $5::timestamptz[],
+          $6::float8[], $7::float8[], $8::float8[], $9::bigint[], $10::bytea[], $11::bytea[], $12::bytea[]
+      ) AS u(point_id, device_id, samples, first_ts, last_ts, min_value, max_value,
+             sum_abs_delta, deltas, value_digest, ts_hll, value_hll)
+     WHERE p.point_id = u.point_id
+"""
+
+# Per-slot scalar arrays of the accumulator and their empty values
+_FIELDS = {
+    "samples": (np.int64, 0),
+    "first_ts": (np.float64, np.inf),
+    "last_ts": (np.float64, -np.inf),
+    "min_value": (np.float64, np.inf),
+    "max_value": (np.float64, -np.inf),
+    "sum_abs_delta": (np.float64, 0.0),
+    "deltas": (np.int64, 0),
+    "tail_ts": (np.float64, np.nan),
+    "tail_value": (np.float64, np.nan),
+}
+
+
+@dataclass
+class ProfileDelta:
+    """Everything accumulated since the last flush, one entry per point."""
+
+    point_ids: List[uuid.UUID]
+    device_ids: List[Optional[uuid.UUID]]
+    arrays: Dict[str, np.ndarray]
+    digest: Tuple[np.ndarray, np.ndarray]  # buffered (slot, value) pairs
+    ts_hll: np.ndarray
+    value_hll: np.ndarray
+
+
+class ProfileAccumulator:
+    """In-memory profile deltas for the points of one shard.
+
+    ``add`` takes one committed batch column-wise, like ``ValidationEngine``:
+    ``codes`` index into ``point_ids``. Flush once ``buffered`` reaches
+    ``max_buffered`` to bound memory.
+    """
+
+    def __init__(self, max_buffered: int = 2_000_000):
+        self.max_buffered = max_buffered
+        # Last reading per point, kept across flushes for the change between batches
+        self._tails: Dict[uuid.UUID, Tuple[float, float]] = {}
+        self._reset()
+
+    def _reset(self) -> None:
+        self._slots: Dict[uuid.UUID, int] = {}
+        self._point_ids: List[uuid.UUID] = []
+        self._devices: List[Optional[uuid.UUID]] = []
+        self._capacity = 0
+        self._arrays = {name: np.empty(0, dtype=dtype) for name, (dtype, _) in _FIELDS.items()}
+        self._ts_hll = np.zeros((0, _HLL_M), dtype=np.uint8)
+        self._value_hll = np.zeros((0, _HLL_M), dtype=np.uint8)
+        self._digest: List[Tuple[np.ndarray, np.ndarray]] = []
+        self.buffered = 0
+
+    def __len__(self) -> int:
+        return len(self._point_ids)
+
+    @property
+    def full(self) -> bool:
+        return self.buffered >= self.max_buffered
+
+    def _slot(self, point_id: uuid.UUID, device_id: Optional[uuid.UUID]) -> int:
+        slot = self._slots.get(point_id)
+        if slot is None:
+            slot = len(self._point_ids)
+            if slot == self._capacity:
+                self._grow(max(64, 2 * self._capacity))
+            self._slots[point_id] = slot
+            self._point_ids.append(point_id)
+            self._devices.append(device_id)
+            tail = self._tails.pop(point_id, None)
+            if tail is not None:
+                self._arrays["tail_ts"][slot], self._arrays["tail_value"][slot] = tail
+        elif device_id is not None:
+            self._devices[slot] = device_id
+        return slot
+
+    def _grow(self, capacity: int) -> None:
+        for name, (dtype, empty) in _FIELDS.items():
+            grown = np.full(capacity, empty, dtype=dtype)
+            grown[: self._capacity] = self._arrays[name]
+            self._arrays[name] = grown
+        for attr in ("_ts_hll", "_value_hll"):
+            grown = np.zeros((capacity, _HLL_M), dtype=np.uint8)
+            grown[: self._capacity] = getattr(self, attr)
+            setattr(self, attr, grown)
+        self._capacity = capacity
+
+    def add(
+        self,
+        device_id: Optional[uuid.UUID],
+        point_ids: Sequence[uuid.UUID],
+        codes: np.ndarray,
+        ts: np.ndarray,
+        values: np.ndarray,
+    ) -> None:
+        """Fold rows (epoch-second ``ts``, float ``values``) into the per-point deltas."""
+        n = codes.shape[0]
+        if n == 0:
+            return
+        code_to_slot = np.full(len(point_ids), -1, dtype=np.int64)
+        for code in np.flatnonzero(np.bincount(codes, minlength=len(point_ids))).tolist():
+            code_to_slot[code] = self._slot(point_ids[code], device_id)
+        slots = code_to_slot[codes]
+
+        order = batch_order(codes, ts, len(point_ids))
+        s, t, v = slots[order], np.asarray(ts, dtype=np.float64)[order], np.asarray(values, dtype=np.float64)[order]
+        starts = np.flatnonzero(np.r_[True, s[1:] != s[:-1]])
+        ends = np.r_[starts[1:], n]
+        gs = s[starts]  # unique within the batch, so fancy-index updates below are safe
+        a = self._arrays
+
+        a["samples"][gs] += ends - starts
+        a["first_ts"][gs] = np.minimum(a["first_ts"][gs], t[starts])
+        a["last_ts"][gs] = np.maximum(a["last_ts"][gs], t[ends - 1])
+        a["min_value"][gs] = np.minimum(a["min_value"][gs], np.minimum.reduceat(v, starts))
+        a["max_value"][gs] = np.maximum(a["max_value"][gs], np.maximum.reduceat(v, starts))
+
+        same = s[1:] == s[:-1]
+        steps = np.abs(np.diff(v))[same]
+        a["sum_abs_delta"] += np.bincount(s[1:][same], weights=steps, minlength=self._capacity)
+        a["deltas"] += np.bincount(s[1:][same], minlength=self._capacity)
+        # Step from the previous batch's last reading, unless this batch is older (late data)
+        follows = a["tail_ts"][gs] < t[starts]
+        a["sum_abs_delta"][gs[follows]] += np.abs(v[starts[follows]] - a["tail_value"][gs[follows]])
+        a["deltas"][gs[follows]] += 1
+        newer = ~(a["tail_ts"][gs] > t[ends - 1])
+        a["tail_ts"][gs[newer]] = t[ends - 1][newer]
+        a["tail_value"][gs[newer]] = v[ends - 1][newer]
+
+        local = np.repeat(np.arange(gs.shape[0]), ends - starts)
+        ts_us = np.round(t * 1e6).astype(np.int64)
+        self._ts_hll[gs] = np.maximum(self._ts_hll[gs], hll_registers(local, hash64(ts_us), gs.shape[0]))
+        self._value_hll[gs] = np.maximum(self._value_hll[gs], hll_registers(local, hash64(v, seed=1), gs.shape[0]))
+
+        self._digest.append((s, v))
+        self.buffered += n
+
+    def take(self) -> Optional[ProfileDelta]:
+        """Detach the accumulated deltas (``None`` when empty) and start a new window."""
+        n = len(self._point_ids)
+        if n == 0:
+            return None
+        a = {name: arr[:n] for name, arr in self._arrays.items()}
+        digest = (np.concatenate([d[0] for d in self._digest]), np.concatenate([d[1] for d in self._digest]))
+        delta = ProfileDelta(
+            point_ids=self._point_ids,
+            device_ids=self._devices,
+            arrays=a,
+            digest=digest,
+            ts_hll=self._ts_hll[:n],
+            value_hll=self._value_hll[:n],
+        )
+        for pid, ts, value in zip(self._point_ids, a["tail_ts"].tolist(), a["tail_value"].tolist()):
+            if ts == ts:  # not NaN
+                self._tails[pid] = (ts, value)
+        self._reset()
+        return delta
+
+
+def _ts_or_none(seconds: float) -> Optional[datetime]:
+    return datetime.fromtimestamp(seconds, tz=timezone.utc) if np.isfinite(seconds) else None
+
+
+def _split(groups: np.ndarray, n: int) -> List[slice]:
+    bounds = np.searchsorted(groups, np.arange(n + 1))
+    return [slice(lo, hi) for lo, hi in zip(bounds[:-1].tolist(), bounds[1:].tolist())]
+
+
+async def flush_profiles(conn: asyncpg.Connection, delta: ProfileDelta) -> int:
+    """Merge ``delta`` into ``point_profiles``; returns the number of profiles updated."""
+    n = len(delta.point_ids)
+    async with conn.transaction():
+        await conn.execute(_ENSURE_SQL, delta.point_ids)
+        rows = await conn.fetch(_LOCK_SQL, delta.point_ids)
+        found = {r["point_id"]: r for r in rows}
+
+        # Stored digests join the new values as weighted items; one compression merges all
+        groups, means, weights = [delta.digest[0]], [delta.digest[1]], [np.ones(delta.digest[1].shape[0])]
+        ts_hll, value_hll = delta.ts_hll.copy(), delta.value_hll.copy()
+        for slot, pid in enumerate(delta.point_ids):
+            r = found.get(pid)
+            if r is None:
+                continue
+            stored = TDigest.from_bytes(r["value_digest"])
+            groups.append(np.full(stored.means.shape[0], slot))
+            means.append(stored.means)
+            weights.append(stored.weights)
+            if r["ts_hll"]:
+                np.maximum(ts_hll[slot], np.frombuffer(r["ts_hll"], dtype=np.uint8), out=ts_hll[slot])
+            if r["value_hll"]:
+                np.maximum(value_hll[slot], np.frombuffer(r["value_hll"], dtype=np.uint8), out=value_hll[slot])
+        g, m, w = await asyncio.get_running_loop().run_in_executor(
+            None, compress_centroids, np.concatenate(groups), np.concatenate(means), np.concatenate(weights)
+        )
+        digests = [TDigest(m[sl], w[sl]).to_bytes() for sl in _split(g, n)]
+
+        a = delta.arrays
+        await conn.execute(
+            _UPDATE_SQL,
+            delta.point_ids,
+            delta.device_ids,
+            a["samples"].tolist(),
+            [_ts_or_none(x) for x in a["first_ts"].tolist()],
+            [_ts_or_none(x) for x in a["last_ts"].tolist()],
+            [x if np.isfinite(x) else None for x in a["min_value"].tolist()],
+            [x if np.isfinite(x) else None for x in a["max_value"].tolist()],
+            a["sum_abs_delta"].tolist(),
+            a["deltas"].tolist(),
+            digests,
+            [row.tobytes() for row in ts_hll],
+            [row.tobytes() for row in value_hll],
+        )
+    return len(found)
+
+
+_COMPRESSED_CHUNKS_SQL = text(
+    """
+    SELECT c.id AS chunk_id,
+           cc.id AS compressed_chunk_id,
+           format('%I.%I', cc.schema_name, cc.table_name) AS compressed_chunk,
+           pg_total_relation_size(CAST(format('%I.%I', cc.schema_name, cc.table_name) AS regclass)) AS compressed_size
+      FROM _timescaledb_catalog.hypertable h
+      JOIN _timescaledb_catalog.chunk c ON c.hypertable_id = h.id
+      JOIN _timescaledb_catalog.chunk cc ON cc.id = c.compressed_chunk_id
+      LEFT JOIN profile_chunk_bytes b ON b.chunk_id = c.id
+     WHERE h.table_name = 'measurements'
+       AND NOT c.dropped
+       AND (b.chunk_id IS NULL
+            OR b.compressed_chunk_id <> cc.id
+            OR b.compressed_size <> pg_total_relation_size(CAST(format('%I.%I', cc.schema_name, cc.table_name) AS regclass)))
+     ORDER BY c.id
+    """
+)
+
+_CHUNK_BYTES_SQL = """
+    WITH counted AS (
+        SELECT point_id, CAST(sum(pg_column_size(t.*)) AS bigint) AS bytes FROM {chunk} t GROUP BY point_id
+    ),
+    previous AS (
+        SELECT u.point_id, u.bytes
+          FROM profile_chunk_bytes b, unnest(b.point_ids, b.bytes) AS u(point_id, bytes)
+         WHERE b.chunk_id = :chunk_id
+    ),
+    recorded AS (
+        INSERT INTO profile_chunk_bytes (chunk_id, compressed_chunk_id, compressed_size, point_ids, bytes)
+        SELECT :chunk_id, :compressed_chunk_id, :compressed_size,
+               COALESCE(array_agg(point_id), '{{}}'), COALESCE(array_agg(bytes), '{{}}')
+          FROM counted
+        ON CONFLICT (chunk_id) DO UPDATE
+           SET compressed_chunk_id = EXCLUDED.compressed_chunk_id,
+               compressed_size = EXCLUDED.compressed_size,
+               point_ids = EXCLUDED.point_ids,
+               bytes = EXCLUDED.bytes,
+               counted_at = now()
+    ),
+    delta AS (
+        -- A recounted chunk replaces its earlier contribution
+        SELECT d.point_id, sum(d.bytes) AS bytes
+          FROM (SELECT * FROM counted UNION ALL SELECT point_id, -bytes FROM previous) d
+         GROUP BY d.point_id
+    )
+    INSERT INTO point_profiles (point_id, compressed_bytes)
+    SELECT d.point_id, d.bytes
+      FROM delta d
+      JOIN points p ON p.id = d.point_id
+     ORDER BY d.point_id
+    ON CONFLICT (point_id) DO UPDATE
+       SET compressed_bytes = point_profiles.compressed_bytes + EXCLUDED.compressed_bytes
+"""
+
+
+_RELEASE_DROPPED_SQL = text(
+    """
+    WITH gone AS (
+        DELETE FROM profile_chunk_bytes b
+         WHERE NOT EXISTS (
+             SELECT 1 FROM _timescaledb_catalog.chunk c WHERE c.id = b.chunk_id AND NOT c.dropped
+         )
+        RETURNING b.point_ids, b.bytes
+    ),
+    shares AS (
+        SELECT u.point_id, sum(u.bytes) AS bytes
+          FROM gone, unnest(gone.point_ids, gone.bytes) AS u(point_id, bytes)
+         GROUP BY u.point_id
+    ),
+    released AS (
+        UPDATE point_profiles p
+           SET compressed_bytes = GREATEST(p.compressed_bytes - s.bytes, 0)
+          FROM shares s
+         WHERE p.point_id = s.point_id
+        RETURNING 1
+    )
+    SELECT (SELECT count(*) FROM gone) AS chunks, (SELECT count(*) FROM released) AS profiles
+    """
+)
+
+
+def refresh_compressed_bytes(conn: Connection) -> int:
+    """Bring the profiles' compressed bytes up to date with the chunk catalog; returns chunks read.
+
+    Compressed chunks are segmented by ``point_id``, so a chunk's rows group
+    directly by point. Counted chunks are recorded by chunk id in
+    ``profile_chunk_bytes`` with each point's share. A chunk is read again only
+    when its compressed chunk changed (recompressed after a late merge or a
+    decompress), and the new shares replace the recorded ones. Points without a
+    profile yet get one. Chunks dropped by retention since the last run have
+    their shares subtracted first. Each chunk commits on its own.
+    """
+    conn.execute(_RELEASE_DROPPED_SQL)
+    conn.commit()
+    chunks = conn.execute(_COMPRESSED_CHUNKS_SQL).all()
+    conn.commit()
+    for chunk in chunks:
+        # The chunk name comes from the catalog, quoted by format('%I')
+        conn.execute(
+            text(_CHUNK_BYTES_SQL.format(chunk=chunk.compressed_chunk)),
+            {
+                "chunk_id": chunk.chunk_id,
+                "compressed_chunk_id": chunk.compressed_chunk_id,
+                "compressed_size": chunk.compressed_size,
+            },
+        )
+        conn.commit()
+    return len(chunks)
+
+
+def profile_estimates(ts_hll: Sequence[Optional[bytes]], value_hll: Sequence[Optional[bytes]]) -> Tuple[np.ndarray, np.ndarray]:
+    """Distinct timestamps and distinct values per profile row, from the stored registers."""
+    def counts(blobs) -> np.ndarray:
+        regs = np.zeros((len(blobs), _HLL_M), dtype=np.uint8)
+        for i, blob in enumerate(blobs):
+            if blob:
+                regs[i] = np.frombuffer(blob, dtype=np.uint8)
+        return hll_count(regs) if len(blobs) else np.zeros(0)
+
+    return counts(ts_hll), counts(value_hll)
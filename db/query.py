@@ -0,0 +1,74 @@
+"""Read API for dashboards: per-point time-bucketed rollups, optionally cached."""
+import uuid
+from datetime import datetime, timedelta
+from typing import List, Optional, Sequence, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+
+from .cache import DirtyLogPoller, ResultCache
+
+# (bucket, point_id, avg, min, max, samples)
+RollupRow = Tuple[datetime, uuid.UUID, float, float, float, int]
+
+_ROLLUP_SQL = text(
+    """
+    SELECT time_bucket(:bucket, measurement_timestamp) AS bucket,
+           point_id,
+           avg(value)::float8 AS avg,
+           min(value)::float8 AS min,
+           max(value)::float8 AS max,
+           count(*) AS samples
+      FROM measurements
+     WHERE point_id = ANY(CAST(:point_ids AS uuid[]))
+       AND measurement_timestamp >= :start
+       AND measurement_timestamp < :end
+     GROUP BY 1, 2
+     ORDER BY 2, 1
+    """
+)
+
+
+class ReadAPI:
+    """Rollup queries against one engine, served from ``cache`` when it holds the range.
+
+    With a cache, a ``DirtyLogPoller`` on the same engine runs in the background
+    so ingested writes invalidate it; ``close`` stops it.
+    """
+
+    def __init__(self, engine: Engine, cache: Optional[ResultCache] = None, poll_interval_s: float = 2.0):
+        self.engine = engine
+        self.cache = cache
+        self.poller: Optional[DirtyLogPoller] = None
+        if cache is not None:
+            self.poller = DirtyLogPoller(engine, cache, interval_s=poll_interval_s)
+            self.poller.start()
+
+    def close(self) -> None:
+        if self.poller is not None:
+            self.poller.stop()
+
+    def rollup(
+        self,
+        point_ids: Sequence[uuid.UUID],
+        start: datetime,
+        end: datetime,
+        resolution: timedelta,
+    ) -> List[RollupRow]:
+        def load() -> List[RollupRow]:
+            with self.engine.connect() as conn:
+                rows = conn.execute(
+                    _ROLLUP_SQL,
+                    {
+                        "bucket": resolution,
+                        "point_ids": [str(pid) for pid in key[1]],
+                        "start": start,
+                        "end": end,
+                    },
+                )
+                return [tuple(r) for r in rows]
+
+        key = ResultCache.make_key("rollup", point_ids, start, end, resolution)
+        if self.cache is None:
+            return load()
+        return self.cache.get_or_load(key, load)
@@ -0,0 +1,149 @@
+"""Mergeable sketches for per-point profiles: t-digest quantiles and HyperLogLog counts.
+
+Both work on many points at once. A batch is given column-wise with a group
+(point slot) per row, and everything is vectorized over the whole batch:
+
+- ``compress_centroids`` builds or re-compresses t-digests for all groups in
+  one sort; merging two digests is concatenating their centroids and
+  compressing again.
+- ``hll_registers`` fills HyperLogLog registers for all groups with one
+  ``np.maximum.at``; merging is an element-wise maximum.
+
+Serialized forms (``TDigest.to_bytes``, ``HyperLogLog.to_bytes``) are stored
+as ``bytea`` in ``point_profiles``.
+"""
+from typing import Optional, Tuple
+
+import numpy as np
+
+DIGEST_DELTA = 100  # compression: at most ~DELTA/2 centroids per digest
+HLL_P = 10  # 2**P registers, ~3% standard error
+
+_GOLDEN = np.uint64(0x9E3779B97F4A7C15)
+
+
+def hash64(values: np.ndarray, seed: int = 0) -> np.ndarray:
+    """splitmix64 finalizer over the raw 64-bit pattern of ``values``."""
+    x = np.ascontiguousarray(values).view(np.uint64) + np.uint64(seed) * _GOLDEN
+    x = (x ^ (x >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    x = (x ^ (x >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return x ^ (x >> np.uint64(31))
+
+
+def _k_scale(q: np.ndarray, delta: float) -> np.ndarray:
+    # k1 scale: small centroids at the tails, where quantiles need precision
+    return delta / (2 * np.pi) * np.arcsin(2 * np.clip(q, 0.0, 1.0) - 1)
+
+
+def compress_centroids(
+    groups: np.ndarray,
+    means: np.ndarray,
+    weights: Optional[np.ndarray] = None,
+    delta: float = DIGEST_DELTA,
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Compress (group, mean, weight) items into per-group t-digest centroids.
+
+    Items may be raw values (weight 1) or existing centroids. Returns
+    ``(groups, means, weights)`` sorted by group, then mean.
+    """
+    n = means.shape[0]
+    if weights is None:
+        weights = np.ones(n, dtype=np.float64)
+    if n == 0:
+        return groups[:0], means[:0].astype(np.float64), weights[:0].astype(np.float64)
+    # Sort by mean, then stably by group (a radix sort for 16-bit group numbers)
+    order = np.argsort(means)
+    key = groups[order]
+    order = order[np.argsort(key.astype(np.uint16) if key.max() <= np.iinfo(np.uint16).max else key, kind="stable")]
+    g, m, w = groups[order], means[order].astype(np.float64), weights[order].astype(np.float64)
+
+    starts = np.flatnonzero(np.r_[True, g[1:] != g[:-1]])
+    group_of = np.repeat(np.arange(starts.shape[0]), np.diff(np.r_[starts, n]))
+    cum = np.cumsum(w)
+    before_group = np.r_[0.0, cum][starts][group_of]
+    total = np.add.reduceat(w, starts)[group_of]
+    q_mid = (cum - before_group - w / 2) / total
+    cell = np.floor(_k_scale(q_mid, delta) - _k_scale(np.zeros(1), delta)).astype(np.int64)
+
+    bounds = np.flatnonzero(np.r_[True, (g[1:] != g[:-1]) | (cell[1:] != cell[:-1])])
+    out_w = np.add.reduceat(w, bounds)
+    out_m = np.add.reduceat(w * m, bounds) / out_w
+    return g[bounds], out_m, out_w
+
+
+def hll_registers(groups: np.ndarray, hashes: np.ndarray, n_groups: int, p: int = HLL_P) -> np.ndarray:
+    """HyperLogLog registers, one row of ``2**p`` per group, from 64-bit hashes."""
+    m = 1 << p
+    registers = np.zeros((n_groups, m), dtype=np.uint8)
+    if hashes.shape[0] == 0:
+        return registers
+    idx = (hashes >> np.uint64(64 - p)).astype(np.int64)
+    rest = hashes << np.uint64(p)
+    # Leading zeros of the remaining bits via the float exponent (bit length); rest == 0 gives 64
+    bit_length = np.frexp(rest.astype(np.float64))[1]
+    rho = np.minimum(64 - bit_length, 64 - p) + 1
+    np.maximum.at(registers.reshape(-1), groups.astype(np.int64) * m + idx, rho.astype(np.uint8))
+    return registers
+
+
+def hll_count(registers: np.ndarray) -> np.ndarray:
+    """Cardinality estimate per register row (with the small-range correction)."""
+    registers = np.atleast_2d(registers)
+    m = registers.shape[1]
+    alpha = 0.7213 / (1 + 1.079 / m)
+    raw = alpha * m * m / np.sum(np.exp2(-registers.astype(np.float64)), axis=1)
+    zeros = np.count_nonzero(registers == 0, axis=1)
+    with np.errstate(divide="ignore"):
+        linear = m * np.log(m / np.maximum(zeros, 1))
+    return np.where((raw <= 2.5 * m) & (zeros > 0), linear, raw)
+
+
+class TDigest:
+    """One point's digest: centroid means and weights, sorted by mean."""
+
+    def __init__(self, means: np.ndarray, weights: np.ndarray):
+        self.means = means
+        self.weights = weights
+
+    @classmethod
+    def from_bytes(cls, data: Optional[bytes]) -> "TDigest":
+        if not data:
+            return cls(np.empty(0), np.empty(0))
+        arr = np.frombuffer(data, dtype="<f8").reshape(2, -1)
+        return cls(arr[0], arr[1])
+
+    def to_bytes(self) -> bytes:
+        return np.stack([self.means, self.weights]).astype("<f8").tobytes()
+
+    @property
+    def count(self) -> float:
+        return float(self.weights.sum())
+
+    def merge(self, other: "TDigest") -> "TDigest":
+        means = np.concatenate([self.means, other.means])
+        _, m, w = compress_centroids(np.zeros(means.shape[0], dtype=np.int64), means, np.concatenate([self.weights, other.weights]))
+        return TDigest(m, w)
+
+    def quantile(self, q: float) -> Optional[float]:
+        if self.means.shape[0] == 0:
+            return None
+        mid = np.cumsum(self.weights) - self.weights / 2
+        return float(np.interp(q * self.weights.sum(), mid, self.means))
+
+
+class HyperLogLog:
+    def __init__(self, registers: Optional[np.ndarray] = None, p: int = HLL_P):
+        self.registers = registers if registers is not None else np.zeros(1 << p, dtype=np.uint8)
+
+    @classmethod
+    def from_bytes(cls, data: Optional[bytes], p: int = HLL_P) -> "HyperLogLog":
+        return cls(np.frombuffer(data, dtype=np.uint8).copy() if data else None, p)
+
+    def to_bytes(self) -> bytes:
+        return self.registers.tobytes()
+
+    def merge(self, other: "HyperLogLog") -> "HyperLogLog":
+        return HyperLogLog(np.maximum(self.registers, other.registers))
+
+    def count(self) -> float:
+        return float(hll_count(self.registers)[0])
@@ -0,0 +1,334 @@
+"""Vectorized validation of measurement batches.
+
+Rules from ``validation_rules`` are compiled once per point into flat float
+thresholds and evaluated over whole ingest batches with NumPy. The result is a
+bitmask written into ``Measurement.quality`` (0 means no rule fired).
+"""
+import math
+import threading
+import time
+import uuid
+from dataclasses import dataclass
+from itertools import repeat
+from typing import Dict, Iterable, List, Mapping, Optional, Sequence, Tuple
+
+import numpy as np
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from .models import ValidationRule, ValidationRuleType
+
+QUALITY_GOOD = 0
+QUALITY_RANGE = 1 << 0
+QUALITY_RATE_OF_CHANGE = 1 << 1
+QUALITY_STUCK = 1 << 2
+QUALITY_SPIKE = 1 << 3
+
+# (last_ts, last_value, stuck_run_start_ts) carried between batches per point
+Tail = Tuple[float, float, float]
+
+
+@dataclass
+class CompiledRuleSet:
+    min_value: float = -math.inf
+    max_value: float = math.inf
+    max_rate_per_s: float = math.inf
+    stuck_window_s: float = math.inf
+    stuck_tolerance: float = 0.0
+    spike_threshold: float = math.inf
+
+    @classmethod
+    def compile(cls, rules: Iterable[ValidationRule]) -> "CompiledRuleSet":
+        """Fold a point's enabled rules into one set; repeated rules keep the tightest bound."""
+        rs = cls()
+        for rule in rules:
+            if not rule.enabled:
+                continue
+            p = rule.params or {}
+            if rule.rule_type == ValidationRuleType.RANGE:
+                if p.get("min") is not None:
+                    rs.min_value = max(rs.min_value, float(p["min"]))
+                if p.get("max") is not None:
+                    rs.max_value = min(rs.max_value, float(p["max"]))
+            elif rule.rule_type == ValidationRuleType.RATE_OF_CHANGE:
+                rs.max_rate_per_s = min(rs.max_rate_per_s, float(p["max_per_s"]))
+            elif rule.rule_type == ValidationRuleType.STUCK:
+                rs.stuck_window_s = min(rs.stuck_window_s, float(p["window_s"]))
+                rs.stuck_tolerance = max(rs.stuck_tolerance, float(p.get("tolerance", 0.0)))
+            elif rule.rule_type == ValidationRuleType.SPIKE:
+                rs.spike_threshold = min(rs.spike_threshold, float(p["threshold"]))
+        return rs
+
+    @property
+    def empty(self) -> bool:
+        return not (
+            math.isfinite(self.min_value)
+            or math.isfinite(self.max_value)
+            or math.isfinite(self.max_rate_per_s)
+            or math.isfinite(self.stuck_window_s)
+            or math.isfinite(self.spike_threshold)
+        )
+
+    def as_row(self) -> Tuple[float, float, float, float, float, float]:
+        return (
+            self.min_value,
+            self.max_value,
+            self.max_rate_per_s,
+            self.stuck_window_s,
+            self.stuck_tolerance,
+            self.spike_threshold,
+        )
+
+
+_EMPTY = CompiledRuleSet()
+_EMPTY_ROW = np.array(_EMPTY.as_row(), dtype=np.float64)
+# Columns of the per-slot parameter rows that must be finite for a rule to be active
+_BOUND_COLUMNS = [0, 1, 2, 3, 5]
+
+
+class RuleCache:
+    """Compiled rule sets per point, loaded lazily in one query per batch of misses.
+
+    Every point seen gets a permanent slot; its thresholds are kept as one row
+    of a ``(slots, 6)`` float array so a batch gathers them with ``params[slots]``.
+    Entries expire after ``ttl_s`` so rule edits made by other processes are
+    picked up; call ``invalidate`` after editing rules in-process.
+    """
+
+    def __init__(self, ttl_s: float = 300.0):
+        self.ttl_s = ttl_s
+        self._slots: Dict[uuid.UUID, int] = {}
+        self._params = np.empty((0, 6), dtype=np.float64)
+        self._loaded_at = np.empty(0, dtype=np.float64)
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._slots)
+
+    @property
+    def params(self) -> np.ndarray:
+        return self._params
+
+    def _grow(self, capacity: int) -> None:
+        params = np.tile(_EMPTY_ROW, (capacity, 1))
+        params[: self._params.shape[0]] = self._params
+        loaded_at = np.full(capacity, -np.inf)
+        loaded_at[: self._loaded_at.shape[0]] = self._loaded_at
+        self._params, self._loaded_at = params, loaded_at
+
+    def slots(self, point_ids: Sequence[uuid.UUID]) -> np.ndarray:
+        """Slot per point id, assigning new slots (with empty rule sets) for unseen ids."""
+        with self._lock:
+            slots = np.fromiter(map(self._slots.get, point_ids, repeat(-1)), dtype=np.int64, count=len(point_ids))
+            new = np.flatnonzero(slots < 0)
+            if new.shape[0]:
+                for i in new.tolist():
+                    slots[i] = self._slots.setdefault(point_ids[i], len(self._slots))
+                if len(self._slots) > self._params.shape[0]:
+                    self._grow(max(1024, 2 * len(self._slots)))
+        return slots
+
+    def lookup(self, point_ids: Sequence[uuid.UUID]) -> Tuple[np.ndarray, List[uuid.UUID]]:
+        """Slots for ``point_ids`` and the ids whose rule sets need (re)loading."""
+        slots = self.slots(point_ids)
+        stale = np.flatnonzero(time.monotonic() - self._loaded_at[slots] >= self.ttl_s)
+        return slots, [point_ids[i] for i in stale.tolist()]
+
+    def store(self, point_ids: Iterable[uuid.UUID], rules: Iterable[ValidationRule]) -> Dict[uuid.UUID, CompiledRuleSet]:
+        """Compile and cache ``rules`` for ``point_ids``; ids without rules are cached as empty."""
+        by_point: Dict[uuid.UUID, list] = {pid: [] for pid in point_ids}
+        for rule in rules:
+            by_point.setdefault(rule.point_id, []).append(rule)
+        compiled = {
+            pid: CompiledRuleSet.compile(point_rules) if point_rules else _EMPTY
+            for pid, point_rules in by_point.items()
+        }
+        self._put_many(compiled)
+        return compiled
+
+    def load(self, session: Session, point_ids: Sequence[uuid.UUID]) -> np.ndarray:
+        """Slots for ``point_ids``, loading expired or unseen rule sets first."""
+        slots, missing = self.lookup(point_ids)
+        if missing:
+            rules = session.execute(
+                select(ValidationRule).where(ValidationRule.point_id.in_(missing), ValidationRule.enabled.is_(True))
+            ).scalars()
+            self.store(missing, rules)
+        return slots
+
+    def get(self, point_id: uuid.UUID) -> CompiledRuleSet:
+        slot = self._slots.get(point_id)
+        return _EMPTY if slot is None else CompiledRuleSet(*self._params[slot].tolist())
+
+    def put(self, point_id: uuid.UUID, rule_set: CompiledRuleSet) -> None:
+        self._put_many({point_id: rule_set})
+
+    def _put_many(self, rule_sets: Mapping[uuid.UUID, CompiledRuleSet]) -> None:
+        point_ids = list(rule_sets)
+        slots = self.slots(point_ids)
+        rows = np.array([rule_sets[pid].as_row() for pid in point_ids], dtype=np.float64).reshape(-1, 6)
+        with self._lock:
+            self._params[slots] = rows
+            self._loaded_at[slots] = time.monotonic()
+
+    def invalidate(self, point_id: Optional[uuid.UUID] = None) -> None:
+        with self._lock:
+            if point_id is None:
+                self._loaded_at[:] = -np.inf
+            elif point_id in self._slots:
+                self._loaded_at[self._slots[point_id]] = -np.inf
+
+
+def to_epoch_seconds(ts) -> np.ndarray:
+    """Accept datetime64 arrays, numeric epoch seconds, or a sequence of aware datetimes."""
+    arr = np.asarray(ts)
+    if arr.dtype.kind == "M":
+        return arr.astype("datetime64[ns]").astype(np.int64) / 1e9
+    if arr.dtype.kind in "iuf":
+        return arr.astype(np.float64, copy=False)
+    return np.fromiter((t.timestamp() for t in ts), dtype=np.float64, count=len(ts))
+
+
+def batch_order(codes: np.ndarray, t: np.ndarray, n_points: int) -> np.ndarray:
+    """Permutation sorting a batch by (point, time).
+
+    Agents upload in time order, so the common case only needs a stable sort on
+    the point code, which NumPy does as a radix sort for 16-bit keys.
+    """
+    if n_points <= np.iinfo(np.uint16).max and bool((t[1:] >= t[:-1]).all()):
+        return np.argsort(codes.astype(np.uint16), kind="stable")
+    return np.lexsort((t, codes))
+
+
+class ValidationEngine:
+    """Batch validator producing ``Measurement.quality`` codes.
+
+    A batch is given column-wise: ``point_codes`` index into ``point_ids`` (the
+    dictionary encoding ingest already has), plus timestamps and values. The
+    point ids are mapped once to ``RuleCache`` slots; thresholds and carried
+    state live in arrays indexed by slot, so the only per-point Python work is
+    that dictionary lookup. The batch is sorted once by (point, time) and every
+    rule is evaluated over the whole sorted array.
+
+    With ``carry_state`` the last reading of each point is kept so the first row
+    of the next batch gets rate/stuck context; late batches ignore it.
+    """
+
+    def __init__(self, cache: Optional[RuleCache] = None, carry_state: bool = True):
+        self.cache = cache or RuleCache()
+        self.carry_state = carry_state
+        # (last_ts, last_value, stuck_run_start_ts) per cache slot; NaN when unknown
+        self._tails = np.empty((0, 3), dtype=np.float64)
+        self._tails_lock = threading.Lock()
+
+    def evaluate(
+        self,
+        session: Session,
+        point_codes: np.ndarray,
+        point_ids: Sequence[uuid.UUID],
+        ts,
+        values,
+    ) -> np.ndarray:
+        return self.evaluate_slots(self.cache.load(session, point_ids), point_codes, ts, values)
+
+    def evaluate_slots(self, point_slots: np.ndarray, point_codes: np.ndarray, ts, values) -> np.ndarray:
+        """``evaluate`` with ``point_slots`` already loaded (e.g. by an async caller via ``RuleCache.store``)."""
+        codes = np.asarray(point_codes, dtype=np.int64)
+        n = codes.shape[0]
+        if n == 0:
+            return np.zeros(0, dtype=np.int32)
+
+        point_params = self.cache.params[point_slots]
+        active = np.isfinite(point_params[:, _BOUND_COLUMNS]).any(axis=1)
+        if not active[codes].any():
+            return np.zeros(n, dtype=np.int32)
+
+        t = to_epoch_seconds(ts)
+        v = np.asarray(values, dtype=np.float64)
+        order = batch_order(codes, t, point_slots.shape[0])
+        sc = codes[order]
+        st = t[order]
+        sv = v[order]
+
+        first = np.empty(n, dtype=bool)
+        first[0] = True
+        np.not_equal(sc[1:], sc[:-1], out=first[1:])
+        last = np.empty(n, dtype=bool)
+        last[-1] = True
+        last[:-1] = first[1:]
+        fc = sc[first]
+
+        if self.carry_state:
+            with self._tails_lock:
+                if self._tails.shape[0] < len(self.cache):
+                    grown = np.full((max(1024, 2 * len(self.cache)), 3), np.nan)
+                    grown[: self._tails.shape[0]] = self._tails
+                    self._tails = grown
+                tails = self._tails[point_slots[fc]]
+        else:
+            tails = np.full((fc.shape[0], 3), np.nan)
+        tail_ts, tail_v, tail_start = tails.T
+        use_tail = st[first] > tail_ts  # NaN (no tail) compares False
+
+        lo, hi, max_rate, window, tol, spike_thr = point_params[sc].T
+        q = np.zeros(n, dtype=np.int32)
+
+        prev_t = np.empty(n)
+        prev_v = np.empty(n)
+        prev_t[1:] = st[:-1]
+        prev_v[1:] = sv[:-1]
+        prev_t[first] = np.where(use_tail, tail_ts, np.nan)
+        prev_v[first] = np.where(use_tail, tail_v, np.nan)
+
+        with np.errstate(invalid="ignore", divide="ignore"):
+            d_prev = sv - prev_v
+
+            q[(sv < lo) | (sv > hi)] |= QUALITY_RANGE
+
+            dt = st - prev_t
+            q[(dt > 0) & (np.abs(d_prev) / dt > max_rate)] |= QUALITY_RATE_OF_CHANGE
+
+            # A run of unchanged values starts at a change or at a point's first row;
+            # a first row that continues the previous batch's run inherits its start.
+            changed = ~(np.abs(d_prev) <= tol)
+            anchor = st.copy()
+            anchor[first] = np.where(use_tail & ~changed[first], tail_start, st[first])
+            run_idx = np.maximum.accumulate(np.where(changed | first, np.arange(n), 0))
+            run_start = anchor[run_idx]
+            q[(st - run_start) >= window] |= QUALITY_STUCK
+
+            # The last row of a point has no successor in this batch, so a spike on the batch edge passes.
+            d_next = np.empty(n)
+            d_next[:-1] = sv[:-1] - sv[1:]
+            d_next[last] = np.nan
+            spike = (
+                (np.abs(d_prev) > spike_thr)
+                & (np.abs(d_next) > spike_thr)
+                & (np.sign(d_prev) == np.sign(d_next))
+            )
+            q[spike] |= QUALITY_SPIKE
+
+        quality = np.empty(n, dtype=np.int32)
+        quality[order] = q
+
+        if self.carry_state:
+            lc = sc[last]
+            # Codes are unique per batch, so each slot is written at most once
+            ls = point_slots[lc]
+            with self._tails_lock:
+                newer = active[lc] & ~(st[last] < self._tails[ls, 0])
+                self._tails[ls[newer]] = np.column_stack((st[last], sv[last], run_start[last]))[newer]
+        return quality
+
+    def annotate_rows(self, session: Session, rows: List[Mapping]) -> List[Mapping]:
+        """Set ``quality`` on measurement row dicts, OR-ing with any quality already present."""
+        index: Dict[uuid.UUID, int] = {}
+        codes = np.fromiter(
+            (index.setdefault(r["point_id"], len(index)) for r in rows), dtype=np.int64, count=len(rows)
+        )
+        values = np.fromiter((float(r["value"]) for r in rows), dtype=np.float64, count=len(rows))
+        ts = [r["measurement_timestamp"] for r in rows]
+        quality = self.evaluate(session, codes, list(index), ts, values)
+        for row, q in zip(rows, quality.tolist()):
+            row["quality"] = (row.get("quality") or 0) | q
+        return rows
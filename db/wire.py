@@ -0,0 +1,295 @@
+"""Compact columnar wire format for agent uploads.
+
+A batch is one little-endian buffer; every array section starts on an 8-byte
+boundary so the decoder can wrap it with ``np.frombuffer`` without copying::
+
+    header      32 bytes   "<4sHHIIqII": magic b"HVCB", version, flags,
+                           n_points, n_rows, base_ts_us, dict_bytes, n_types
+    dictionary  dict_bytes object_instance int32[n_points]
+                           object_type index uint16[n_points]
+                           object_type names (uint8 length + UTF-8) * n_types
+    point_idx   uint16[n_rows] (uint32 with FLAG_WIDE_INDEX)
+    ts_delta    int32[n_rows] microseconds (int64 with FLAG_WIDE_DELTA);
+                the first delta is from base_ts_us, the rest from the previous row
+    value       float64[n_rows]
+    status      uint8[n_rows] (only with FLAG_HAS_STATUS): in_alarm, fault,
+                overridden, out_of_service in bits 0-3, bit 7 set when present
+
+An upload body is one or more batches back to back. The header fixes the size
+of everything after it, so ``ColumnarDecoder`` can decode each batch as soon as
+its last byte arrives and only ever buffers one batch.
+
+The format version is ``SCHEMA_VERSION`` and is stored with each row in
+``Measurement.schema_version``; decoders reject versions they do not know.
+
+``to_copy_binary`` turns a decoded batch into a PostgreSQL binary COPY stream
+for the fixed-width staging table ``ingest_stage_columnar`` by filling a NumPy
+structured array, so no Python object is built per row.
+"""
+import struct
+from dataclasses import dataclass
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .models import SCHEMA_VERSION
+
+MAGIC = b"HVCB"
+SUPPORTED_VERSIONS = frozenset({SCHEMA_VERSION})
+CONTENT_TYPE = "application/vnd.hvac.columnar"
+
+FLAG_WIDE_INDEX = 1 << 0
+FLAG_WIDE_DELTA = 1 << 1
+FLAG_HAS_STATUS = 1 << 2
+
+STATUS_IN_ALARM = 1 << 0
+STATUS_FAULT = 1 << 1
+STATUS_OVERRIDDEN = 1 << 2
+STATUS_OUT_OF_SERVICE = 1 << 3
+STATUS_PRESENT = 1 << 7
+
+_HEADER = struct.Struct("<4sHHIIqII")
+_INT32 = np.iinfo(np.int32)
+
+# Microseconds between the Unix and PostgreSQL (2000-01-01) epochs
+PG_EPOCH_OFFSET_US = 946_684_800_000_000
+
+COPY_SIGNATURE = b"PGCOPY\n\xff\r\n\x00" + struct.pack(">ii", 0, 0)
+COPY_TRAILER = struct.pack(">h", -1)
+COPY_COLUMNS = ("point_id", "measurement_timestamp", "value", "status_bits", "quality")
+
+# One binary COPY tuple of ingest_stage_columnar: field count, then (length, data) per column
+_COPY_ROW = np.dtype([
+    ("nfields", ">i2"),
+    ("point_id_len", ">i4"), ("point_id", "V16"),
+    ("ts_len", ">i4"), ("ts", ">i8"),
+    ("value_len", ">i4"), ("value", ">f8"),
+    ("status_len", ">i4"), ("status", ">i2"),
+    ("quality_len", ">i4"), ("quality", ">i4"),
+])
+
+
+class WireFormatError(ValueError):
+    pass
+
+
+@dataclass
+class ColumnarBatch:
+    version: int
+    object_types: List[str]  # object_type of each point
+    object_instances: np.ndarray  # int32[n_points]
+    point_idx: np.ndarray  # uint16/uint32[n_rows], index into the point dictionary
+    ts_us: np.ndarray  # int64[n_rows], Unix epoch microseconds
+    values: np.ndarray  # float64[n_rows]
+    status: Optional[np.ndarray]  # uint8[n_rows] or None
+
+    @property
+    def n_rows(self) -> int:
+        return int(self.values.shape[0])
+
+    def point_keys(self) -> List[Tuple[str, int]]:
+        return list(zip(self.object_types, self.object_instances.tolist()))
+
+
+def _pad(n: int) -> int:
+    return (-n) % 8
+
+
+def encode_batch(
+    point_keys: Sequence[Tuple[str, int]],
+    point_idx,
+    ts_us,
+    values,
+    status=None,
+    version: int = SCHEMA_VERSION,
+) -> bytes:
+    """Encode one batch. ``point_idx`` indexes ``point_keys`` (BACnet object_type, object_instance)."""
+    idx = np.asarray(point_idx)
+    ts = np.asarray(ts_us, dtype=np.int64)
+    vals = np.asarray(values, dtype=np.float64)
+    n_rows = vals.shape[0]
+    if idx.shape[0] != n_rows or ts.shape[0] != n_rows:
+        raise WireFormatError("point_idx, ts_us and values must have the same length")
+
+    flags = 0
+    n_points = len(point_keys)
+    if n_points > np.iinfo(np.uint16).max + 1:
+        flags |= FLAG_WIDE_INDEX
+    idx = idx.astype("<u4" if flags & FLAG_WIDE_INDEX else "<u2")
+
+    base = int(ts[0]) if n_rows else 0
+    deltas = np.diff(ts, prepend=base)
+    if n_rows and (deltas.min() < _INT32.min or deltas.max() > _INT32.max):
+        flags |= FLAG_WIDE_DELTA
+    deltas = deltas.astype("<i8" if flags & FLAG_WIDE_DELTA else "<i4")
+
+    type_names: List[str] = []
+    type_index = {}
+    type_idx = np.empty(n_points, dtype="<u2")
+    instances = np.empty(n_points, dtype="<i4")
+    for i, (object_type, object_instance) in enumerate(point_keys):
+        t = type_index.get(object_type)
+        if t is None:
+            t = type_index[object_type] = len(type_names)
+            type_names.append(object_type)
+        type_idx[i] = t
+        instances[i] = object_instance
+    names = b"".join(bytes([len(b)]) + b for b in (t.encode("utf-8") for t in type_names))
+    dictionary = instances.tobytes() + type_idx.tobytes() + names
+    dictionary += b"\0" * _pad(len(dictionary))
+
+    if status is not None:
+        flags |= FLAG_HAS_STATUS
+
+    parts = [_HEADER.pack(MAGIC, version, flags, n_points, n_rows, base, len(dictionary), len(type_names)), dictionary]
+    for arr in (idx, deltas, vals):
+        raw = arr.tobytes()
+        parts.append(raw + b"\0" * _pad(len(raw)))
+    if status is not None:
+        parts.append(np.asarray(status, dtype=np.uint8).tobytes())
+    return b"".join(parts)
+
+
+def _unpack_header(mv: memoryview) -> tuple:
+    if len(mv) < _HEADER.size:
+        raise WireFormatError("truncated header")
+    header = _HEADER.unpack_from(mv, 0)
+    if header[0] != MAGIC:
+        raise WireFormatError("not a columnar batch")
+    if header[1] not in SUPPORTED_VERSIONS:
+        raise WireFormatError(f"unsupported format version {header[1]}")
+    return header
+
+
+def batch_size(buf) -> int:
+    """Encoded size in bytes of the batch whose header starts ``buf``."""
+    _, _, flags, _, n_rows, _, dict_bytes, _ = _unpack_header(memoryview(buf))
+    # Same offsets as decode_batch
+    off = _HEADER.size + dict_bytes + (4 if flags & FLAG_WIDE_INDEX else 2) * n_rows
+    off += _pad(off) + (8 if flags & FLAG_WIDE_DELTA else 4) * n_rows
+    off += _pad(off) + 8 * n_rows
+    return off + (n_rows if flags & FLAG_HAS_STATUS else 0)
+
+
+def decode_batch(buf) -> ColumnarBatch:
+    """Decode a batch; array columns are views into ``buf`` except the timestamps (one cumsum)."""
+    mv = memoryview(buf)
+    _, version, flags, n_points, n_rows, base, dict_bytes, n_types = _unpack_header(mv)
+
+    off = _HEADER.size
+    try:
+        instances = np.frombuffer(mv, dtype="<i4", count=n_points, offset=off)
+        type_idx = np.frombuffer(mv, dtype="<u2", count=n_points, offset=off + 4 * n_points)
+        pos = off + 6 * n_points
+        type_names = []
+        for _ in range(n_types):
+            length = mv[pos]
+            type_names.append(bytes(mv[pos + 1:pos + 1 + length]).decode("utf-8"))
+            pos += 1 + length
+        off += dict_bytes
+
+        idx_dtype = np.dtype("<u4" if flags & FLAG_WIDE_INDEX else "<u2")
+        point_idx = np.frombuffer(mv, dtype=idx_dtype, count=n_rows, offset=off)
+        off += idx_dtype.itemsize * n_rows
+        off += _pad(off)
+
+        delta_dtype = np.dtype("<i8" if flags & FLAG_WIDE_DELTA else "<i4")
+        deltas = np.frombuffer(mv, dtype=delta_dtype, count=n_rows, offset=off)
+        off += delta_dtype.itemsize * n_rows
+        off += _pad(off)
+
+        values = np.frombuffer(mv, dtype="<f8", count=n_rows, offset=off)
+        off += 8 * n_rows
+
+        status = np.frombuffer(mv, dtype=np.uint8, count=n_rows, offset=off) if flags & FLAG_HAS_STATUS else None
+    except (ValueError, IndexError) as exc:
+        raise WireFormatError(f"truncated batch: {exc}") from exc
+
+    if n_rows and int(point_idx.max()) >= n_points:
+        raise WireFormatError("point index out of range")
+    if n_points and int(type_idx.max()) >= n_types:
+        raise WireFormatError("object type index out of range")
+    # Point codes must be unique per batch, like the codes ingest builds from records
+    if len(set(type_names)) != n_types:
+        raise WireFormatError("repeated object type in dictionary")
+    keys = (type_idx.astype(np.int64) << 32) | instances.view(np.uint32).astype(np.int64)
+    if np.unique(keys).shape[0] != n_points:
+        raise WireFormatError("repeated (object_type, object_instance) in dictionary")
+
+    ts_us = np.cumsum(deltas, dtype=np.int64)
+    ts_us += base
+    return ColumnarBatch(
+        version=version,
+        object_types=[type_names[i] for i in type_idx.tolist()],
+        object_instances=instances,
+        point_idx=point_idx,
+        ts_us=ts_us,
+        values=values,
+        status=status,
+    )
+
+
+class ColumnarDecoder:
+    """Incremental decoder for a body of concatenated batches; ``feed`` returns complete ones.
+
+    Each batch is copied out of the receive buffer once, so the returned arrays
+    stay valid while later data arrives. Batches over ``max_batch_bytes`` are
+    rejected from their header, before they are buffered.
+    """
+
+    def __init__(self, max_batch_bytes: int = 16 * 1024 * 1024):
+        self.max_batch_bytes = max_batch_bytes
+        self._buf = bytearray()
+
+    def feed(self, data: bytes) -> List[ColumnarBatch]:
+        self._buf += data
+        batches = []
+        while len(self._buf) >= _HEADER.size:
+            size = batch_size(self._buf)
+            if size > self.max_batch_bytes:
+                raise WireFormatError(f"columnar batch of {size} bytes exceeds {self.max_batch_bytes}")
+            if len(self._buf) < size:
+                break
+            frame = bytes(self._buf[:size])
+            del self._buf[:size]
+            batches.append(decode_batch(frame))
+        return batches
+
+    def close(self) -> List[ColumnarBatch]:
+        if self._buf:
+            raise WireFormatError("truncated columnar batch at end of body")
+        return []
+
+
+def to_copy_binary(batch: ColumnarBatch, point_uuids: np.ndarray, quality: Optional[np.ndarray] = None, rows=None) -> bytes:
+    """Binary COPY stream for ``ingest_stage_columnar`` (columns ``COPY_COLUMNS``).
+
+    ``point_uuids`` is a ``(n_points, 16)`` uint8 array of resolved point ids in
+    dictionary order. ``rows`` optionally selects a subset (e.g. resolved rows only).
+    """
+    idx = batch.point_idx if rows is None else batch.point_idx[rows]
+    n = idx.shape[0]
+    out = np.empty(n, dtype=_COPY_ROW)
+    out["nfields"] = len(COPY_COLUMNS)
+    out["point_id_len"] = 16
+    out["point_id"] = np.ascontiguousarray(point_uuids, dtype=np.uint8).view("V16").reshape(-1)[idx]
+    out["ts_len"] = 8
+    out["ts"] = (batch.ts_us if rows is None else batch.ts_us[rows]) - PG_EPOCH_OFFSET_US
+    out["value_len"] = 8
+    out["value"] = batch.values if rows is None else batch.values[rows]
+    out["status_len"] = 2
+    if batch.status is None:
+        out["status"] = 0
+    else:
+        out["status"] = batch.status if rows is None else batch.status[rows]
+    out["quality_len"] = 4
+    if quality is None:
+        out["quality"] = 0
+    else:
+        out["quality"] = quality if rows is None else quality[rows]
+    return COPY_SIGNATURE + out.tobytes() + COPY_TRAILER
+
+
+def uuid_matrix(point_ids) -> np.ndarray:
+    """``(n, 16)`` uint8 array of UUID bytes for ``to_copy_binary``."""
+    return np.frombuffer(b"".join(pid.bytes for pid in point_ids), dtype=np.uint8).reshape(-1, 16)
@@ -0,0 +1,4 @@
+#!/bin/sh
+# Runs once from /docker-entrypoint-initdb.d on a fresh primary: lets standbys stream WAL
+set -e
+echo "host replication all all scram-sha-256" >> "$PGDATA/pg_hba.conf"
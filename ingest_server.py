@@ -0,0 +1,296 @@
+"""Lightweight asyncio HTTP server for agent measurement uploads.
+
+    POST /v1/ingest?site_id=<uuid>&device_id=<uuid>
+    Content-Type: application/x-ndjson | application/msgpack | application/vnd.hvac.columnar
+    (Content-Length or Transfer-Encoding: chunked)
+
+The body is decoded as it arrives and flushed to the database every
+``INGEST_FLUSH_ROWS`` records; the 200 response is only sent after the upload's
+transaction has committed. ``GET /healthz`` answers without touching the database.
+"""
+import asyncio
+import json
+import logging
+import os
+import uuid
+from typing import AsyncIterator, Dict, Optional, Tuple
+from urllib.parse import parse_qs
+
+import asyncpg
+from sqlalchemy.engine import make_url
+
+from db.ingest import DECODERS, IngestBatch, PointResolver, UnknownDevice
+from db.late import late_data_threshold
+from db.profile import ProfileAccumulator, flush_profiles
+from db.routing import SiteShardMap, load_routing_config
+from db.validation import ValidationEngine
+from db.wire import CONTENT_TYPE as COLUMNAR_CONTENT_TYPE, ColumnarDecoder
+from init_db import get_database_url
+
+log = logging.getLogger("ingest")
+
+READ_CHUNK = 64 * 1024
+MAX_HEADER_LINES = 100
+# Each columnar batch of an upload is buffered whole before decoding, so its size is capped
+MAX_COLUMNAR_BYTES = int(os.getenv("INGEST_MAX_COLUMNAR_BYTES", str(16 * 1024 * 1024)))
+
+
+class BadRequest(Exception):
+    pass
+
+
+def _parse_length(value: str, base: int = 10) -> int:
+    try:
+        length = int(value, base)
+    except ValueError:
+        raise BadRequest(f"invalid length {value[:20]!r}")
+    # reader.read() with a negative size would buffer the rest of the stream
+    if length < 0:
+        raise BadRequest(f"negative length {length}")
+    return length
+
+
+async def _body_chunks(reader: asyncio.StreamReader, headers: Dict[str, str]) -> AsyncIterator[bytes]:
+    if headers.get("transfer-encoding", "").lower() == "chunked":
+        while True:
+            size_line = await reader.readline()
+            size = _parse_length(size_line.split(b";", 1)[0].strip().decode("latin-1") or "0", 16)
+            if size == 0:
+                # Trailer section ends with an empty line
+                while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+                    pass
+                return
+            remaining = size
+            while remaining:
+                data = await reader.read(min(remaining, READ_CHUNK))
+                if not data:
+                    raise BadRequest("truncated chunked body")
+                remaining -= len(data)
+                yield data
+            await reader.readline()
+    else:
+        remaining = _parse_length(headers.get("content-length", "0"))
+        while remaining:
+            data = await reader.read(min(remaining, READ_CHUNK))
+            if not data:
+                raise BadRequest("truncated body")
+            remaining -= len(data)
+            yield data
+
+
+class IngestServer:
+    def __init__(
+        self,
+        flush_rows: int = 5000,
+        pool_size: int = 10,
+        validate: bool = True,
+        profile: bool = True,
+        profile_flush_s: float = 60.0,
+    ):
+        self.flush_rows = flush_rows
+        self.pool_size = pool_size
+        self.config = load_routing_config(get_database_url())
+        self.shard_map = SiteShardMap(self.config)
+        self.pools: Dict[str, asyncpg.Pool] = {}
+        self.resolver = PointResolver()
+        self.validator = ValidationEngine() if validate else None
+        self.late_after = late_data_threshold()
+        # Per-shard point profile deltas (db/profile.py), flushed every profile_flush_s or when full
+        self.profiles: Dict[str, ProfileAccumulator] = (
+            {shard.name: ProfileAccumulator() for shard in self.config.shards} if profile else {}
+        )
+        self.profile_flush_s = profile_flush_s
+        self._profile_full = asyncio.Event()
+        self._profile_task: Optional[asyncio.Task] = None
+
+    async def start(self, host: str, port: int) -> asyncio.base_events.Server:
+        for shard in self.config.shards:
+            dsn = make_url(shard.url).set(drivername="postgresql").render_as_string(hide_password=False)
+            self.pools[shard.name] = await asyncpg.create_pool(dsn, min_size=1, max_size=self.pool_size)
+        if self.profiles:
+            self._profile_task = asyncio.create_task(self._flush_profiles_loop())
+        return await asyncio.start_server(self._handle_connection, host, port, limit=READ_CHUNK)
+
+    async def close(self) -> None:
+        if self._profile_task is not None:
+            self._profile_task.cancel()
+            await asyncio.gather(self._profile_task, return_exceptions=True)
+            await self.flush_profiles()
+        for pool in self.pools.values():
+            await pool.close()
+
+    async def flush_profiles(self) -> None:
+        for shard, accumulator in self.profiles.items():
+            delta = accumulator.take()
+            if delta is not None:
+                async with self.pools[shard].acquire() as conn:
+                    await flush_profiles(conn, delta)
+
+    async def _flush_profiles_loop(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._profile_full.wait(), self.profile_flush_s)
+            except asyncio.TimeoutError:
+                pass
+            self._profile_full.clear()
+            try:
+                await self.flush_profiles()
+            except Exception:
+                # The taken deltas are lost; profiles are statistics, so ingest carries on
+                log.exception("profile flush failed")
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                try:
+                    method, target, version = request_line.decode("latin-1").split()
+                    headers = await self._read_headers(reader)
+                except (ValueError, BadRequest):
+                    await self._respond(writer, 400, {"error": "malformed request"}, close=True)
+                    break
+
+                keep_alive = version == "HTTP/1.1" and headers.get("connection", "").lower() != "close"
+                body = _body_chunks(reader, headers)
+                try:
+                    status, payload = await self._route(method, target, headers, body)
+                except BadRequest as exc:
+                    status, payload, keep_alive = 400, {"error": str(exc)}, False
+                except Exception:
+                    log.exception("ingest failed")
+                    status, payload, keep_alive = 500, {"error": "internal error"}, False
+                await self._respond(writer, status, payload, close=not keep_alive)
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    @staticmethod
+    async def _read_headers(reader: asyncio.StreamReader) -> Dict[str, str]:
+        headers: Dict[str, str] = {}
+        for _ in range(MAX_HEADER_LINES):
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                return headers
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+        raise BadRequest("too many headers")
+
+    async def _route(self, method: str, target: str, headers: Dict[str, str], body: AsyncIterator[bytes]) -> Tuple[int, dict]:
+        path, _, query = target.partition("?")
+        if method == "GET" and path == "/healthz":
+            return 200, {"status": "ok"}
+        if method == "POST" and path == "/v1/ingest":
+            return 200, await self._ingest(parse_qs(query), headers, body)
+        # Unknown routes leave the body unread, so they answer 400 and close the connection
+        raise BadRequest(f"no route for {method} {path}")
+
+    async def _ingest(self, params: Dict[str, list], headers: Dict[str, str], body: AsyncIterator[bytes]) -> dict:
+        try:
+            site_id = uuid.UUID(params["site_id"][0])
+            device_id = uuid.UUID(params["device_id"][0])
+        except (KeyError, ValueError):
+            raise BadRequest("site_id and device_id query parameters are required")
+        content_type = headers.get("content-type", "application/x-ndjson").split(";", 1)[0].strip()
+        if content_type == COLUMNAR_CONTENT_TYPE:
+            return await self._ingest_columnar(site_id, device_id, body)
+        decoder_cls = DECODERS.get(content_type)
+        if decoder_cls is None:
+            raise BadRequest(f"unsupported content type {content_type}")
+        decoder = decoder_cls()
+
+        shard = self.shard_map.shard_for_site(site_id)
+        async with self.pools[shard].acquire() as conn:
+            async with conn.transaction():
+                batch = IngestBatch(conn, site_id, device_id, self.resolver, self.validator, self.late_after, self.profiles.get(shard))
+                await self._begin(batch)
+                pending = []
+                try:
+                    async for chunk in body:
+                        pending.extend(decoder.feed(chunk))
+                        if len(pending) >= self.flush_rows:
+                            await batch.add(pending)
+                            pending = []
+                    pending.extend(decoder.close())
+                    await batch.add(pending)
+                except (ValueError, TypeError) as exc:
+                    # Undecodable body or a record with unparseable fields; the transaction rolls back
+                    raise BadRequest(f"invalid upload: {exc}")
+                result = await batch.finish()
+        self._publish_profiles(batch)
+        return result
+
+    async def _ingest_columnar(self, site_id: uuid.UUID, device_id: uuid.UUID, body: AsyncIterator[bytes]) -> dict:
+        decoder = ColumnarDecoder(MAX_COLUMNAR_BYTES)
+        shard = self.shard_map.shard_for_site(site_id)
+        async with self.pools[shard].acquire() as conn:
+            async with conn.transaction():
+                batch = IngestBatch(conn, site_id, device_id, self.resolver, self.validator, self.late_after, self.profiles.get(shard))
+                await self._begin(batch)
+                try:
+                    async for chunk in body:
+                        for columnar in decoder.feed(chunk):
+                            await batch.add_columnar(columnar)
+                    decoder.close()
+                except ValueError as exc:
+                    raise BadRequest(f"invalid upload: {exc}")
+                result = await batch.finish()
+        self._publish_profiles(batch)
+        return result
+
+    @staticmethod
+    async def _begin(batch: IngestBatch) -> None:
+        try:
+            await batch.begin()
+        except UnknownDevice as exc:
+            # A client error: retrying the same upload can never succeed
+            raise BadRequest(str(exc))
+
+    def _publish_profiles(self, batch: IngestBatch) -> None:
+        if batch.profiles is not None:
+            batch.publish_profiles()
+            if batch.profiles.full:
+                self._profile_full.set()
+
+    @staticmethod
+    async def _respond(writer: asyncio.StreamWriter, status: int, payload: dict, close: bool = False) -> None:
+        reason = {200: "OK", 400: "Bad Request", 500: "Internal Server Error"}.get(status, "")
+        body = json.dumps(payload).encode("utf-8")
+        head = (
+            f"HTTP/1.1 {status} {reason}\r\n"
+            f"Content-Type: application/json\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            f"Connection: {'close' if close else 'keep-alive'}\r\n\r\n"
+        ).encode("latin-1")
+        writer.write(head + body)
+        await writer.drain()
+
+
+async def serve(host: Optional[str] = None, port: Optional[int] = None) -> None:
+    server = IngestServer(
+        flush_rows=int(os.getenv("INGEST_FLUSH_ROWS", "5000")),
+        pool_size=int(os.getenv("INGEST_POOL_SIZE", "10")),
+        validate=os.getenv("INGEST_VALIDATE", "1") == "1",
+        profile=os.getenv("INGEST_PROFILE", "1") == "1",
+        profile_flush_s=float(os.getenv("INGEST_PROFILE_FLUSH_S", "60")),
+    )
+    listener = await server.start(host or os.getenv("INGEST_HOST", "0.0.0.0"), port or int(os.getenv("INGEST_PORT", "8080")))
+    log.info("ingest server listening on %s", ", ".join(str(s.getsockname()) for s in listener.sockets))
+    try:
+        async with listener:
+            await listener.serve_forever()
+    finally:
+        await server.close()
+
+
+def main() -> None:
+    logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO"))
+    asyncio.run(serve())
+
+
+if __name__ == "__main__":
+    main()
@@ -2,6 +2,7 @@ import os
 from sqlalchemy import create_engine, text
 from sqlalchemy.engine import URL
 from db import Base
+from db.routing import load_routing_config
 
 
 def get_database_url() -> str:
@@ -21,12 +22,12 @@ def get_database_url() -> str:
     )
 
 
-def main() -> None:
-    url = get_database_url()
+def init_database(url) -> None:
     engine = create_engine(url, future=True)
     allow_destructive = os.getenv("ALLOW_DESTRUCTIVE_INIT", "0") == "1"
     compress_after_days = int(os.getenv("COMPRESS_AFTER_DAYS", "7"))
     retain_days = int(os.getenv("RETAIN_DAYS", "365"))
+    dirty_log_keep_minutes = int(os.getenv("DIRTY_LOG_KEEP_MINUTES", "60"))
     desired_time_col = "measurement_timestamp"
     desired_space_col = "point_id"
     desired_num_partitions = 8
@@ -34,7 +35,6 @@ def main() -> None:
         conn.execute(text("CREATE EXTENSION IF NOT EXISTS timescaledb;"))
         # Optionally drop unmanaged legacy tables
         if allow_destructive:
-            conn.execute(text("DROP TABLE IF EXISTS validation_rules CASCADE;"))
             conn.execute(text("DROP TABLE IF EXISTS write_commands CASCADE;"))
             conn.execute(text("DROP TABLE IF EXISTS command_ack CASCADE;"))
 
@@ -79,6 +79,13 @@ def main() -> None:
             )
         )
 
+        # Late-data staging (db/late.py) is partitioned by arrival so merged days drain away
+        conn.execute(
+            text(
+                "SELECT create_hypertable('measurements_late', 'staged_at', chunk_time_interval => INTERVAL '1 day', if_not_exists => TRUE);"
+            )
+        )
+
         # Enable and configure compression
         conn.execute(
             text(
@@ -102,8 +109,35 @@ def main() -> None:
                 "INTERVAL ':days days', if_not_exists => TRUE);"
             ).bindparams(days=retain_days)
         )
+        # Every write appends to point_dirty_log (db/cache.py); prune it whether or not readers run
+        conn.execute(
+            text(
+                "CREATE OR REPLACE PROCEDURE prune_point_dirty_log(job_id int, config jsonb) LANGUAGE SQL AS $$ "
+                "DELETE FROM point_dirty_log "
+                "WHERE written_at < now() - make_interval(mins => (config->>'keep_minutes')::int) $$;"
+            )
+        )
+        conn.execute(
+            text(
+                "SELECT add_job('prune_point_dirty_log', INTERVAL '1 minute') "
+                "WHERE NOT EXISTS (SELECT 1 FROM timescaledb_information.jobs WHERE proc_name = 'prune_point_dirty_log');"
+            )
+        )
+        conn.execute(
+            text(
+                "SELECT alter_job(job_id, config => jsonb_build_object('keep_minutes', :minutes)) "
+                "FROM timescaledb_information.jobs WHERE proc_name = 'prune_point_dirty_log';"
+            ).bindparams(minutes=dirty_log_keep_minutes)
+        )
         conn.commit()
-    print("Database initialized; schema synced; 'measurements' uses measurement_timestamp + point_id; compression and retention applied.")
+    engine.dispose()
+
+
+def main() -> None:
+    # Each shard primary gets the full schema; replicas follow via replication
+    for shard in load_routing_config(get_database_url()).shards:
+        init_database(shard.url)
+        print(f"[{shard.name}] Database initialized; schema synced; 'measurements' uses measurement_timestamp + point_id; compression and retention applied.")
 
 
 if __name__ == "__main__":
@@ -3,7 +3,7 @@ import os
 from logging.config import fileConfig
 
 from sqlalchemy import pool, create_engine
-from sqlalchemy.engine import Connection
+from sqlalchemy.engine import Connection, make_url
 from sqlalchemy.ext.asyncio import async_engine_from_config
 
 from alembic import context
@@ -60,6 +60,18 @@ def run_migrations_offline() -> None:
         context.run_migrations()
 
 
+def target_urls(drivername: str) -> list:
+    """URLs to migrate: the configured one, or every shard primary when ALEMBIC_ALL_SHARDS=1."""
+    url = config.get_main_option("sqlalchemy.url")
+    if os.getenv("ALEMBIC_ALL_SHARDS", "0") != "1":
+        return [url]
+    from db.routing import load_routing_config
+    return [
+        make_url(shard.url).set(drivername=drivername).render_as_string(hide_password=False)
+        for shard in load_routing_config(url).shards
+    ]
+
+
 def do_run_migrations(connection: Connection) -> None:
     context.configure(connection=connection, target_metadata=target_metadata)
 
@@ -67,7 +79,7 @@ def do_run_migrations(connection: Connection) -> None:
         context.run_migrations()
 
 
-async def run_async_migrations() -> None:
+async def run_async_migrations(url: str) -> None:
     """In this scenario we need to create an Engine
     and associate a connection with the context.
 
@@ -77,8 +89,10 @@ async def run_async_migrations() -> None:
     require_ssl = os.getenv("ALEMBIC_SSL", "0") == "1"
     connect_args = {"ssl": True} if require_ssl else {}
 
+    section = config.get_section(config.config_ini_section, {})
+    section["sqlalchemy.url"] = url
     connectable = async_engine_from_config(
-        config.get_section(config.config_ini_section, {}),
+        section,
         prefix="sqlalchemy.",
         poolclass=pool.NullPool,
         connect_args=connect_args,
@@ -95,17 +109,17 @@ def run_migrations_online() -> None:
     use_sync = os.getenv("ALEMBIC_USE_SYNC", "0") == "1"
     if use_sync:
         # Synchronous engine using psycopg2
-        section = config.get_section(config.config_ini_section, {})
-        url = section.get("sqlalchemy.url")
-        # For psycopg2, respect ALEMBIC_SSL with sslmode=require if not in URL
-        require_ssl = os.getenv("ALEMBIC_SSL", "0") == "1"
-        connect_args = {"sslmode": "require"} if (require_ssl and (url and "sslmode=" not in url)) else {}
-        engine = create_engine(url, poolclass=pool.NullPool, connect_args=connect_args, future=True)
-        with engine.connect() as connection:
-            do_run_migrations(connection)
-        engine.dispose()
+        for url in target_urls("postgresql+psycopg2"):
+            # For psycopg2, respect ALEMBIC_SSL with sslmode=require if not in URL
+            require_ssl = os.getenv("ALEMBIC_SSL", "0") == "1"
+            connect_args = {"sslmode": "require"} if (require_ssl and (url and "sslmode=" not in url)) else {}
+            engine = create_engine(url, poolclass=pool.NullPool, connect_args=connect_args, future=True)
+            with engine.connect() as connection:
+                do_run_migrations(connection)
+            engine.dispose()
     else:
-        asyncio.run(run_async_migrations())
+        for url in target_urls("postgresql+asyncpg"):
+            asyncio.run(run_async_migrations(url))
 
 
 if context.is_offline_mode():
@@ -0,0 +1,55 @@
+"""add point profiles
+
+Revision ID: a4d97e20b5c6
+Revises: f2b86d41c9e3
+Create Date: 2026-10-19 14:37:12.504881
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a4d97e20b5c6'
+down_revision: Union[str, Sequence[str], None] = 'f2b86d41c9e3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'point_profiles',
+        sa.Column('point_id', postgresql.UUID(as_uuid=True), sa.ForeignKey('points.id', ondelete='CASCADE'), primary_key=True),
+        sa.Column('device_id', postgresql.UUID(as_uuid=True)),
+        sa.Column('samples', sa.BigInteger(), nullable=False, server_default='0'),
+        sa.Column('first_ts', sa.DateTime(timezone=True)),
+        sa.Column('last_ts', sa.DateTime(timezone=True)),
+        sa.Column('min_value', sa.Float()),
+        sa.Column('max_value', sa.Float()),
+        sa.Column('sum_abs_delta', sa.Float(), nullable=False, server_default='0'),
+        sa.Column('deltas', sa.BigInteger(), nullable=False, server_default='0'),
+        sa.Column('value_digest', sa.LargeBinary()),
+        sa.Column('ts_hll', sa.LargeBinary()),
+        sa.Column('value_hll', sa.LargeBinary()),
+        sa.Column('compressed_bytes', sa.BigInteger(), nullable=False, server_default='0'),
+        sa.Column('updated_at', sa.DateTime(timezone=True), nullable=False, server_default=sa.func.now()),
+    )
+    op.create_table(
+        'profile_chunk_bytes',
+        sa.Column('chunk_id', sa.Integer(), primary_key=True),
+        sa.Column('compressed_chunk_id', sa.Integer(), nullable=False),
+        sa.Column('compressed_size', sa.BigInteger(), nullable=False),
+        sa.Column('point_ids', postgresql.ARRAY(postgresql.UUID(as_uuid=True)), nullable=False),
+        sa.Column('bytes', postgresql.ARRAY(sa.BigInteger()), nullable=False),
+        sa.Column('counted_at', sa.DateTime(timezone=True), nullable=False, server_default=sa.func.now()),
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('profile_chunk_bytes')
+    op.drop_table('point_profiles')
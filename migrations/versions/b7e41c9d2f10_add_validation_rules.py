@@ -0,0 +1,60 @@
+"""add validation rules
+
+Revision ID: b7e41c9d2f10
+Revises: a65c8b32f3b0
+Create Date: 2026-10-19 09:12:41.503118
+
+"""
+import os
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b7e41c9d2f10'
+down_revision: Union[str, Sequence[str], None] = 'a65c8b32f3b0'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    bind = op.get_bind()
+    # A legacy unmanaged table of the same name may exist from early prototypes
+    if sa.inspect(bind).has_table('validation_rules'):
+        columns = {c['name'] for c in sa.inspect(bind).get_columns('validation_rules')}
+        if {'id', 'point_id', 'rule_type', 'params'} <= columns:
+            # Same shape: adopt it in place and fill in what the prototype lacked
+            op.execute("ALTER TABLE validation_rules ADD COLUMN IF NOT EXISTS enabled boolean NOT NULL DEFAULT true")
+            op.execute("ALTER TABLE validation_rules ADD COLUMN IF NOT EXISTS created_at timestamptz NOT NULL DEFAULT now()")
+            op.execute("ALTER TABLE validation_rules ADD COLUMN IF NOT EXISTS updated_at timestamptz NOT NULL DEFAULT now()")
+            op.execute("CREATE INDEX IF NOT EXISTS ix_validation_rules_point ON validation_rules (point_id)")
+            return
+        if os.getenv("ALLOW_DESTRUCTIVE_INIT", "0") != "1":
+            raise RuntimeError(
+                "validation_rules exists with an unexpected layout; migrate it by hand "
+                "or set ALLOW_DESTRUCTIVE_INIT=1 to drop it"
+            )
+        op.execute("DROP TABLE validation_rules CASCADE;")
+    op.execute("DROP TYPE IF EXISTS validation_rule_type")
+    op.create_table(
+        'validation_rules',
+        sa.Column('id', postgresql.UUID(as_uuid=True), primary_key=True),
+        sa.Column('point_id', postgresql.UUID(as_uuid=True), sa.ForeignKey('points.id', ondelete='CASCADE'), nullable=False),
+        sa.Column('rule_type', sa.Enum('RANGE', 'RATE_OF_CHANGE', 'STUCK', 'SPIKE', name='validation_rule_type'), nullable=False),
+        sa.Column('params', postgresql.JSONB(astext_type=sa.Text()), nullable=False, server_default=sa.text("'{}'::jsonb")),
+        sa.Column('enabled', sa.Boolean(), nullable=False, server_default=sa.text('true')),
+        sa.Column('created_at', sa.DateTime(timezone=True), nullable=False, server_default=sa.func.now()),
+        sa.Column('updated_at', sa.DateTime(timezone=True), nullable=False, server_default=sa.func.now()),
+    )
+    op.create_index('ix_validation_rules_point', 'validation_rules', ['point_id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_validation_rules_point', table_name='validation_rules')
+    op.drop_table('validation_rules')
+    op.execute("DROP TYPE IF EXISTS validation_rule_type")
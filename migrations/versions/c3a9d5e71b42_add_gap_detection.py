@@ -0,0 +1,45 @@
+"""add gap detection tables
+
+Revision ID: c3a9d5e71b42
+Revises: b7e41c9d2f10
+Create Date: 2026-10-19 10:02:17.218904
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c3a9d5e71b42'
+down_revision: Union[str, Sequence[str], None] = 'b7e41c9d2f10'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'point_gap_watermarks',
+        sa.Column('point_id', postgresql.UUID(as_uuid=True), sa.ForeignKey('points.id', ondelete='CASCADE'), primary_key=True),
+        sa.Column('watermark_ts', sa.DateTime(timezone=True), nullable=False),
+        sa.Column('updated_at', sa.DateTime(timezone=True), nullable=False, server_default=sa.func.now()),
+    )
+    op.create_table(
+        'measurement_gaps',
+        sa.Column('id', postgresql.UUID(as_uuid=True), primary_key=True),
+        sa.Column('point_id', postgresql.UUID(as_uuid=True), sa.ForeignKey('points.id', ondelete='CASCADE'), nullable=False),
+        sa.Column('gap_start', sa.DateTime(timezone=True), nullable=False),
+        sa.Column('gap_end', sa.DateTime(timezone=True), nullable=False),
+        sa.Column('expected_interval_s', sa.Integer(), nullable=False),
+        sa.Column('detected_at', sa.DateTime(timezone=True), nullable=False, server_default=sa.func.now()),
+        sa.UniqueConstraint('point_id', 'gap_start', name='uq_measurement_gaps_point_start'),
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('measurement_gaps')
+    op.drop_table('point_gap_watermarks')
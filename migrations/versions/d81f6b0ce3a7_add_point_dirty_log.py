@@ -0,0 +1,63 @@
+"""add point dirty log
+
+Revision ID: d81f6b0ce3a7
+Revises: c3a9d5e71b42
+Create Date: 2026-10-19 11:24:05.671332
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+import os
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd81f6b0ce3a7'
+down_revision: Union[str, Sequence[str], None] = 'c3a9d5e71b42'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'point_dirty_log',
+        sa.Column('id', sa.BigInteger(), primary_key=True, autoincrement=True),
+        sa.Column('point_id', postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column('dirty_from', sa.DateTime(timezone=True), nullable=False),
+        sa.Column('dirty_to', sa.DateTime(timezone=True), nullable=False),
+        sa.Column('written_at', sa.DateTime(timezone=True), nullable=False, server_default=sa.func.now()),
+    )
+    op.create_index('ix_point_dirty_log_written_at', 'point_dirty_log', ['written_at'], unique=False)
+
+    # Every write appends to point_dirty_log (db/cache.py); prune it whether or not readers run.
+    # Same procedure and job as init_db.py.
+    op.execute(
+        """
+        CREATE OR REPLACE PROCEDURE prune_point_dirty_log(job_id int, config jsonb) LANGUAGE SQL AS $$
+        DELETE FROM point_dirty_log
+         WHERE written_at < now() - make_interval(mins => (config->>'keep_minutes')::int) $$;
+        """
+    )
+    use_timescale = os.getenv("USE_TIMESCALE", "1").lower() not in {"0", "false", "no"}
+    if use_timescale:
+        keep_minutes = int(os.getenv("DIRTY_LOG_KEEP_MINUTES", "60"))
+        op.execute(
+            "SELECT add_job('prune_point_dirty_log', INTERVAL '1 minute', "
+            f"config => jsonb_build_object('keep_minutes', {keep_minutes})) "
+            "WHERE NOT EXISTS (SELECT 1 FROM timescaledb_information.jobs WHERE proc_name = 'prune_point_dirty_log');"
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    use_timescale = os.getenv("USE_TIMESCALE", "1").lower() not in {"0", "false", "no"}
+    if use_timescale:
+        op.execute(
+            "SELECT delete_job(job_id) FROM timescaledb_information.jobs WHERE proc_name = 'prune_point_dirty_log';"
+        )
+    op.execute("DROP PROCEDURE IF EXISTS prune_point_dirty_log(int, jsonb);")
+    op.drop_index('ix_point_dirty_log_written_at', table_name='point_dirty_log')
+    op.drop_table('point_dirty_log')
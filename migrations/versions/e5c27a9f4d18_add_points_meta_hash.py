@@ -0,0 +1,28 @@
+"""add points.meta_hash
+
+Revision ID: e5c27a9f4d18
+Revises: d81f6b0ce3a7
+Create Date: 2026-10-19 12:40:52.094417
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e5c27a9f4d18'
+down_revision: Union[str, Sequence[str], None] = 'd81f6b0ce3a7'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('points', sa.Column('meta_hash', sa.Text(), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('points', 'meta_hash')
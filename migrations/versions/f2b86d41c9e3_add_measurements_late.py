@@ -0,0 +1,53 @@
+"""add measurements_late staging hypertable
+
+Revision ID: f2b86d41c9e3
+Revises: e5c27a9f4d18
+Create Date: 2026-10-19 13:02:47.118204
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+import os
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f2b86d41c9e3'
+down_revision: Union[str, Sequence[str], None] = 'e5c27a9f4d18'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'measurements_late',
+        sa.Column('id', postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column('staged_at', sa.DateTime(timezone=True), nullable=False, server_default=sa.func.now()),
+        sa.Column('point_id', postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column('measurement_timestamp', sa.DateTime(timezone=True), nullable=False),
+        sa.Column('point_name', sa.String(length=255), nullable=False),
+        sa.Column('unit', sa.String(length=64)),
+        sa.Column('value', sa.Numeric(14, 6), nullable=False),
+        sa.Column('status_flags', postgresql.JSONB()),
+        sa.Column('event_state', sa.Integer()),
+        sa.Column('reliability', sa.Integer()),
+        sa.Column('priority_array', postgresql.JSONB()),
+        sa.Column('source_timestamp', sa.DateTime(timezone=True)),
+        sa.Column('quality', sa.Integer()),
+        sa.Column('schema_version', sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint('id', 'staged_at'),
+    )
+    op.create_index('ix_measurements_late_time', 'measurements_late', ['measurement_timestamp'], unique=False)
+    if os.getenv("USE_TIMESCALE", "1").lower() not in {"0", "false", "no"}:
+        op.execute(
+            "SELECT create_hypertable('measurements_late', 'staged_at', chunk_time_interval => INTERVAL '1 day', if_not_exists => TRUE);"
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_measurements_late_time', table_name='measurements_late')
+    op.drop_table('measurements_late')
@@ -0,0 +1,67 @@
+import json
+import os
+import sys
+import time
+import uuid
+from pathlib import Path
+
+import numpy as np
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+from db.wire import decode_batch, encode_batch, to_copy_binary, uuid_matrix  # noqa: E402
+
+
+def timed(fn, rounds: int):
+    fn()  # warm-up
+    start = time.perf_counter()
+    for _ in range(rounds):
+        result = fn()
+    return (time.perf_counter() - start) / rounds, result
+
+
+def main() -> None:
+    rows = int(os.getenv("BENCH_ROWS", "100000"))
+    points = int(os.getenv("BENCH_POINTS", "1000"))
+    rounds = int(os.getenv("BENCH_ROUNDS", "10"))
+
+    rng = np.random.default_rng(0)
+    keys = [("analog-value", i) for i in range(points)]
+    idx = rng.integers(0, points, rows)
+    ts_us = 1_700_000_000_000_000 + np.cumsum(rng.integers(0, 2000, rows))
+    values = 22.0 + rng.normal(0, 2.0, rows)
+    status = np.full(rows, 0x80, dtype=np.uint8)
+    uuids = uuid_matrix([uuid.uuid4() for _ in range(points)])
+
+    records = [
+        {
+            "object_type": keys[i][0],
+            "object_instance": keys[i][1],
+            "ts": t / 1e6,
+            "value": v,
+            "status_flags": {"in_alarm": 0, "fault": 0, "overridden": 0, "out_of_service": 0},
+        }
+        for i, t, v in zip(idx.tolist(), ts_us.tolist(), values.tolist())
+    ]
+    ndjson_s, ndjson = timed(lambda: b"".join(json.dumps(r).encode() + b"\n" for r in records), rounds)
+    ndjson_parse_s, _ = timed(lambda: [json.loads(line) for line in ndjson.splitlines()], rounds)
+
+    encode_s, payload = timed(lambda: encode_batch(keys, idx, ts_us, values, status), rounds)
+    decode_s, batch = timed(lambda: decode_batch(payload), rounds)
+    copy_s, copy = timed(lambda: to_copy_binary(batch, uuids), rounds)
+
+    assert np.array_equal(batch.ts_us, ts_us) and np.array_equal(batch.values, values)
+
+    def line(name: str, seconds: float, size: int = 0) -> None:
+        extra = f", {size / rows:.1f} bytes/row" if size else ""
+        print(f"{name:<22} {seconds * 1000:8.2f} ms  {rows / seconds:>14,.0f} rows/s{extra}")
+
+    print(f"{rows} rows / {points} points")
+    line("ndjson encode", ndjson_s, len(ndjson))
+    line("ndjson parse", ndjson_parse_s)
+    line("columnar encode", encode_s, len(payload))
+    line("columnar decode", decode_s)
+    line("columnar -> COPY", copy_s, len(copy))
+
+
+if __name__ == "__main__":
+    main()
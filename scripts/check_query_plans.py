@@ -0,0 +1,434 @@
+"""Query plan regression check for the canonical read workloads.
+
+Loads a fixed synthetic dataset into a dedicated TimescaleDB database
+(``PLAN_DB``, default ``hvac_plancheck`` on the configured server), runs each
+query in ``QUERIES`` under ``EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON)`` and
+compares chunks scanned, indexes used, sequential scans on chunks and
+decompression with ``query_plan_baselines.json``. With ``--timings`` it also
+compares shared buffers and execution time with the machine-local
+``query_plan_timings.local.json``. A query whose baseline was never recorded
+fails. Then lists ``measurements`` indexes that no query used, and indexes
+that duplicate another, since both only cost writes.
+
+    python scripts/check_query_plans.py                     # check, exit 1 on regressions
+    python scripts/check_query_plans.py --update            # record the current plans as baselines
+    python scripts/check_query_plans.py --timings           # also check buffers and time locally
+    python scripts/check_query_plans.py --update --timings  # also record local buffers and time
+    python scripts/check_query_plans.py --reseed            # rebuild the dataset first
+"""
+import json
+import os
+import re
+import sys
+import uuid
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Set
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.engine import Connection, make_url
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+from db.models import SCHEMA_VERSION  # noqa: E402
+from db.query import _ROLLUP_SQL  # noqa: E402
+from init_db import get_database_url, init_database  # noqa: E402
+
+BASELINE_FILE = Path(__file__).with_name("query_plan_baselines.json")
+# Buffers and timings depend on the machine, so they are kept out of the repository
+TIMINGS_FILE = Path(__file__).with_name("query_plan_timings.local.json")
+
+SITES = int(os.getenv("PLAN_SITES", "2"))
+POINTS_PER_SITE = int(os.getenv("PLAN_POINTS_PER_SITE", "100"))
+DAYS = int(os.getenv("PLAN_DAYS", "60"))
+INTERVAL_S = int(os.getenv("PLAN_INTERVAL_S", "300"))
+COMPRESS_AFTER_DAYS = 14
+# Buffers may grow by this fraction, execution time by this factor, before failing
+BUFFER_TOLERANCE = float(os.getenv("PLAN_BUFFER_TOLERANCE", "0.2"))
+TIME_FACTOR = float(os.getenv("PLAN_TIME_FACTOR", "3.0"))
+
+_NS = uuid.UUID("5b0c6f2e-8d1a-4c53-9a47-3f1e2d6c7b80")
+SITE_IDS = [uuid.uuid5(_NS, f"site/{s}") for s in range(SITES)]
+POINT_IDS = [[uuid.uuid5(_NS, f"site/{s}/point/{i}") for i in range(POINTS_PER_SITE)] for s in range(SITES)]
+
+_CHUNK_RE = re.compile(r"^_hyper_\d+_\d+_chunk$")
+# Chunk copies of hypertable indexes: "_hyper_1_3_chunk_<index>", constraint indexes: "12_34_<constraint>"
+_CHUNK_INDEX_RE = re.compile(r"^(?:_hyper_\d+_\d+_chunk_|\d+_\d+_)(.+)$")
+
+
+@dataclass
+class PlanQuery:
+    name: str
+    kind: str  # dashboard / export / analytics
+    sql: str
+    params: Callable[[datetime], Dict[str, Any]]
+
+
+def _site(s: int = 0) -> str:
+    return str(SITE_IDS[s])
+
+
+def _points(n: int) -> List[str]:
+    return [str(pid) for pid in POINT_IDS[0][:n]]
+
+
+QUERIES = [
+    PlanQuery(
+        "dashboard_latest",
+        "dashboard",
+        """
+        SELECT p.id, m.measurement_timestamp, m.value
+          FROM points p
+          CROSS JOIN LATERAL (
+              SELECT measurement_timestamp, value
+                FROM measurements
+               WHERE point_id = p.id AND measurement_timestamp > :since
+               ORDER BY measurement_timestamp DESC
+               LIMIT 1
+          ) m
+         WHERE p.site_id = CAST(:site_id AS uuid)
+        """,
+        lambda anchor: {"site_id": _site(), "since": anchor - timedelta(hours=1)},
+    ),
+    PlanQuery(
+        "dashboard_rollup_24h",
+        "dashboard",
+        _ROLLUP_SQL.text,
+        lambda anchor: {
+            "bucket": timedelta(minutes=15),
+            "point_ids": _points(10),
+            "start": anchor - timedelta(days=1),
+            "end": anchor,
+        },
+    ),
+    PlanQuery(
+        "point_range_6h",
+        "dashboard",
+        """
+        SELECT measurement_timestamp, value, quality
+          FROM measurements
+         WHERE point_id = CAST(:point_id AS uuid)
+           AND measurement_timestamp >= :start AND measurement_timestamp < :end
+         ORDER BY measurement_timestamp
+        """,
+        lambda anchor: {"point_id": _points(1)[0], "start": anchor - timedelta(hours=6), "end": anchor},
+    ),
+    PlanQuery(
+        "fleet_last_hour",
+        "dashboard",
+        """
+        SELECT point_id, count(*), max(measurement_timestamp)
+          FROM measurements
+         WHERE measurement_timestamp >= :start
+         GROUP BY point_id
+        """,
+        lambda anchor: {"start": anchor - timedelta(hours=1)},
+    ),
+    PlanQuery(
+        "export_site_day",
+        "export",
+        """
+        SELECT p.name, p.object_type, p.object_instance, m.measurement_timestamp, m.value, m.status_flags
+          FROM measurements m
+          JOIN points p ON p.id = m.point_id
+         WHERE p.site_id = CAST(:site_id AS uuid)
+           AND m.measurement_timestamp >= :start AND m.measurement_timestamp < :end
+         ORDER BY m.point_id, m.measurement_timestamp
+        """,
+        lambda anchor: {"site_id": _site(), "start": anchor - timedelta(days=3), "end": anchor - timedelta(days=2)},
+    ),
+    PlanQuery(
+        "compressed_point_week",
+        "export",
+        """
+        SELECT measurement_timestamp, value
+          FROM measurements
+         WHERE point_id = CAST(:point_id AS uuid)
+           AND measurement_timestamp >= :start AND measurement_timestamp < :end
+         ORDER BY measurement_timestamp
+        """,
+        lambda anchor: {
+            "point_id": _points(1)[0],
+            "start": anchor - timedelta(days=COMPRESS_AFTER_DAYS + 14),
+            "end": anchor - timedelta(days=COMPRESS_AFTER_DAYS + 7),
+        },
+    ),
+    PlanQuery(
+        "analytics_daily_30d",
+        "analytics",
+        """
+        SELECT time_bucket(INTERVAL '1 day', measurement_timestamp) AS day, point_id,
+               avg(value)::float8, min(value)::float8, max(value)::float8
+          FROM measurements
+         WHERE point_id = ANY(CAST(:point_ids AS uuid[]))
+           AND measurement_timestamp >= :start AND measurement_timestamp < :end
+         GROUP BY 1, 2
+        """,
+        lambda anchor: {"point_ids": _points(20), "start": anchor - timedelta(days=30), "end": anchor},
+    ),
+]
+
+
+def plan_database_url():
+    return make_url(get_database_url()).set(database=os.getenv("PLAN_DB", "hvac_plancheck"))
+
+
+def ensure_database(url) -> None:
+    admin = create_engine(url.set(database="postgres"), future=True, isolation_level="AUTOCOMMIT")
+    with admin.connect() as conn:
+        exists = conn.execute(text("SELECT 1 FROM pg_database WHERE datname = :name"), {"name": url.database}).scalar()
+        if not exists:
+            conn.execute(text(f'CREATE DATABASE "{url.database}"'))
+    admin.dispose()
+
+
+def dataset_anchor(conn: Connection):
+    return conn.execute(
+        text("SELECT max(measurement_timestamp) FROM measurements WHERE point_id = CAST(:pid AS uuid)"),
+        {"pid": str(POINT_IDS[0][0])},
+    ).scalar()
+
+
+def seed(url) -> None:
+    """Rebuild the synthetic dataset: SITES x POINTS_PER_SITE points, DAYS of readings every INTERVAL_S."""
+    init_database(url)
+    engine = create_engine(url, future=True)
+    with engine.connect() as conn:
+        # Background policies would change chunk layout between runs
+        conn.execute(text("SELECT remove_compression_policy('measurements', if_exists => true)"))
+        conn.execute(text("SELECT remove_retention_policy('measurements', if_exists => true)"))
+        conn.execute(text("TRUNCATE measurements, points, devices, sites CASCADE"))
+        for s, site_id in enumerate(SITE_IDS):
+            conn.execute(
+                text("INSERT INTO sites (id, display_name) VALUES (CAST(:id AS uuid), :name)"),
+                {"id": str(site_id), "name": f"plan-check-{s}"},
+            )
+            conn.execute(
+                text(
+                    """
+                    INSERT INTO points (id, site_id, name, object_type, object_instance, unit, tags, active)
+                    SELECT id, CAST(:site_id AS uuid), 'AV-' || i, 'analog-value', i, 'degC', '{}'::jsonb, true
+                      FROM unnest(CAST(:ids AS uuid[])) WITH ORDINALITY AS t(id, i)
+                    """
+                ),
+                {"site_id": str(site_id), "ids": [str(pid) for pid in POINT_IDS[s]]},
+            )
+        conn.commit()
+
+        anchor = conn.execute(text("SELECT date_trunc('hour', now())")).scalar()
+        for day in range(DAYS, 0, -1):
+            conn.execute(
+                text(
+                    """
+                    INSERT INTO measurements (id, point_id, measurement_timestamp, point_name, unit, value, quality, schema_version)
+                    SELECT gen_random_uuid(), p.id, ts, p.name, p.unit,
+                           round((20 + 5 * sin(extract(epoch FROM ts) / 43200 * pi()) + random())::numeric, 6),
+                           0, :schema_version
+                      FROM points p
+                     CROSS JOIN generate_series(:start, :end, make_interval(secs => :interval_s)) AS ts
+                    """
+                ),
+                {
+                    "start": anchor - timedelta(days=day),
+                    "end": anchor - timedelta(days=day - 1) - timedelta(seconds=INTERVAL_S),
+                    "interval_s": INTERVAL_S,
+                    "schema_version": SCHEMA_VERSION,
+                },
+            )
+            conn.commit()
+        conn.execute(
+            text(
+                "SELECT count(compress_chunk(c, if_not_compressed => true)) "
+                "FROM show_chunks('measurements', older_than => CAST(:before AS timestamptz)) AS c"
+            ),
+            {"before": anchor - timedelta(days=COMPRESS_AFTER_DAYS)},
+        )
+        conn.commit()
+        conn.execute(text("ANALYZE measurements"))
+        conn.execute(text("ANALYZE points"))
+        conn.commit()
+    engine.dispose()
+
+
+def _walk(node: dict):
+    yield node
+    for child in node.get("Plans", ()):
+        yield from _walk(child)
+
+
+def parent_index(name: str) -> str:
+    match = _CHUNK_INDEX_RE.match(name)
+    return match.group(1) if match else name
+
+
+def summarize(explain: list) -> Dict[str, Any]:
+    root = explain[0]
+    plan = root["Plan"]
+    chunks_planned: Set[str] = set()
+    chunks_scanned: Set[str] = set()
+    seq_scanned: Set[str] = set()
+    indexes: Set[str] = set()
+    decompress = False
+    for node in _walk(plan):
+        relation = node.get("Relation Name", "")
+        executed = node.get("Actual Loops", 0) > 0
+        if node.get("Custom Plan Provider") == "DecompressChunk":
+            decompress = decompress or executed
+        if _CHUNK_RE.match(relation):
+            chunks_planned.add(relation)
+            if executed:
+                chunks_scanned.add(relation)
+                if node["Node Type"] == "Seq Scan":
+                    seq_scanned.add(relation)
+        if "Index Name" in node and executed:
+            indexes.add(parent_index(node["Index Name"]))
+    return {
+        "chunks_planned": len(chunks_planned),
+        "chunks_scanned": len(chunks_scanned),
+        "seq_scanned_chunks": len(seq_scanned),
+        "indexes": sorted(indexes),
+        "decompress": decompress,
+        "buffers": plan.get("Shared Hit Blocks", 0) + plan.get("Shared Read Blocks", 0),
+        "ms": round(root["Execution Time"], 3),
+    }
+
+
+def explain(conn: Connection, query: PlanQuery, anchor: datetime) -> Dict[str, Any]:
+    params = query.params(anchor)
+    conn.execute(text(query.sql), params).all()  # warm the cache so timings compare
+    rows = conn.execute(text("EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) " + query.sql), params).scalar()
+    return summarize(rows if isinstance(rows, list) else json.loads(rows))
+
+
+# Plan shape on the fixed dataset, recorded by --update and committed
+RECORDED_METRICS = ("max_chunks_planned", "max_chunks_scanned", "decompress")
+# Machine-local, recorded by --update --timings and only checked with --timings
+TIMING_METRICS = ("buffers", "ms")
+# Set by hand; --update leaves them alone once present
+CURATED_KEYS = ("forbid_seq_scan", "index_any")
+
+
+def check(baseline: Dict[str, Any], observed: Dict[str, Any], timings: Optional[Dict[str, Any]] = None) -> List[str]:
+    """Regressions of ``observed`` against ``baseline`` and, when given, the local ``timings``."""
+    required = [(baseline, m) for m in RECORDED_METRICS] + [(timings, m) for m in TIMING_METRICS if timings is not None]
+    missing = [metric for source, metric in required if source.get(metric) is None]
+    if missing:
+        return [f"no recorded baseline for {', '.join(missing)}; run with --update{' --timings' if timings is not None else ''}"]
+    failures = []
+    if observed["chunks_planned"] > baseline["max_chunks_planned"]:
+        failures.append(f"plans {observed['chunks_planned']} chunks (max {baseline['max_chunks_planned']}): chunk exclusion lost")
+    if observed["chunks_scanned"] > baseline["max_chunks_scanned"]:
+        failures.append(f"scans {observed['chunks_scanned']} chunks (max {baseline['max_chunks_scanned']})")
+    if baseline.get("forbid_seq_scan") and observed["seq_scanned_chunks"]:
+        failures.append(f"sequential scan on {observed['seq_scanned_chunks']} chunks")
+    expected = baseline.get("index_any")
+    if expected and not set(expected) & set(observed["indexes"]):
+        failures.append(f"uses {observed['indexes'] or 'no index'}, expected one of {expected}")
+    if observed["decompress"] != baseline["decompress"]:
+        failures.append("expected DecompressChunk" if baseline["decompress"] else "unexpected DecompressChunk")
+    if timings is not None:
+        if observed["buffers"] > timings["buffers"] * (1 + BUFFER_TOLERANCE):
+            failures.append(f"{observed['buffers']} buffers (baseline {timings['buffers']})")
+        if observed["ms"] > timings["ms"] * TIME_FACTOR:
+            failures.append(f"{observed['ms']:.1f} ms (baseline {timings['ms']:.1f} ms)")
+    return failures
+
+
+def updated_baseline(baseline: Dict[str, Any], observed: Dict[str, Any]) -> Dict[str, Any]:
+    """Record the observed plan shape; curated keys already set are kept."""
+    return {
+        "forbid_seq_scan": not observed["seq_scanned_chunks"],
+        "index_any": observed["indexes"] or None,
+        **{key: baseline[key] for key in CURATED_KEYS if baseline.get(key) is not None},
+        "max_chunks_planned": observed["chunks_planned"],
+        "max_chunks_scanned": observed["chunks_scanned"],
+        "decompress": observed["decompress"],
+    }
+
+
+_INDEXES_SQL = text(
+    """
+    SELECT c.relname AS name,
+           pg_get_indexdef(i.indexrelid) AS definition,
+           i.indkey::text || ' ' || i.indoption::text || ' ' || COALESCE(pg_get_expr(i.indpred, i.indrelid), '') AS signature,
+           hypertable_index_size(CAST(format('%I', c.relname) AS regclass)) AS bytes
+      FROM pg_index i
+      JOIN pg_class c ON c.oid = i.indexrelid
+     WHERE i.indrelid = CAST('measurements' AS regclass)
+     ORDER BY c.relname
+    """
+)
+
+
+def index_report(conn: Connection, used: Set[str]) -> List[str]:
+    rows = conn.execute(_INDEXES_SQL).all()
+    lines = []
+    first_by_signature: Dict[str, str] = {}
+    for r in rows:
+        twin = first_by_signature.setdefault(r.signature, r.name)
+        if twin != r.name:
+            lines.append(f"  {r.name}: duplicates {twin} ({r.bytes / 1e6:.1f} MB)")
+        elif r.name not in used:
+            lines.append(f"  {r.name}: unused by every query ({r.bytes / 1e6:.1f} MB) -- {r.definition}")
+    return lines
+
+
+def main() -> None:
+    update = "--update" in sys.argv
+    with_timings = "--timings" in sys.argv
+    url = plan_database_url()
+    ensure_database(url)
+
+    engine = create_engine(url, future=True)
+    with engine.connect() as conn:
+        has_data = conn.execute(text("SELECT to_regclass('measurements') IS NOT NULL")).scalar() and dataset_anchor(conn)
+    if "--reseed" in sys.argv or not has_data:
+        print(f"seeding {url.database}: {SITES} sites x {POINTS_PER_SITE} points x {DAYS} days every {INTERVAL_S}s")
+        seed(url)
+
+    baselines = json.loads(BASELINE_FILE.read_text()) if BASELINE_FILE.exists() else {}
+    local = json.loads(TIMINGS_FILE.read_text()) if with_timings and TIMINGS_FILE.exists() else {}
+    failed = 0
+    used: Set[str] = set()
+    with engine.connect() as conn:
+        anchor = dataset_anchor(conn)
+        for query in QUERIES:
+            observed = explain(conn, query, anchor)
+            used.update(observed["indexes"])
+            baseline = baselines.get(query.name, {})
+            timings = local.get(query.name, {}) if with_timings else None
+            if update:
+                baselines[query.name] = updated_baseline(baseline, observed)
+                local[query.name] = {metric: observed[metric] for metric in TIMING_METRICS}
+                # Curated expectations are kept, so report where the current plan breaks them
+                failures = check(baselines[query.name], observed)
+            else:
+                failures = check(baseline, observed, timings)
+            failed += bool(failures)
+            print(
+                f"{'FAIL' if failures else 'ok  '} {query.name:<24} [{query.kind}] "
+                f"chunks {observed['chunks_scanned']}/{observed['chunks_planned']}, "
+                f"indexes {', '.join(observed['indexes']) or '-'}, "
+                f"{observed['buffers']} buffers, {observed['ms']:.1f} ms"
+            )
+            for failure in failures:
+                print(f"       {failure}")
+        conn.rollback()
+
+        report = index_report(conn, used)
+    engine.dispose()
+
+    if report:
+        print("indexes that only add write cost for this workload:")
+        print("\n".join(report))
+    if update:
+        BASELINE_FILE.write_text(json.dumps(baselines, indent=2, sort_keys=True) + "\n")
+        print(f"baselines written to {BASELINE_FILE.name}")
+        if with_timings:
+            TIMINGS_FILE.write_text(json.dumps(local, indent=2, sort_keys=True) + "\n")
+            print(f"buffers and timings written to {TIMINGS_FILE.name}")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
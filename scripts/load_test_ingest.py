@@ -0,0 +1,139 @@
+import asyncio
+import json
+import os
+import sys
+import time
+import uuid
+from datetime import datetime, timezone
+from pathlib import Path
+
+import msgpack
+import numpy as np
+from sqlalchemy.orm import Session
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+from db.models import Device, Point, Site  # noqa: E402
+from db.routing import ShardRouter  # noqa: E402
+from db.wire import CONTENT_TYPE as COLUMNAR_CONTENT_TYPE, STATUS_PRESENT, encode_batch  # noqa: E402
+from init_db import get_database_url  # noqa: E402
+
+OBJECT_TYPE = "analog-value"
+
+
+def seed(points: int) -> tuple:
+    """Create a throwaway site with one device and ``points`` points on the site's shard."""
+    site_id, device_id = uuid.uuid4(), uuid.uuid4()
+    router = ShardRouter.from_env(get_database_url())
+    with Session(router.engine_for_site(site_id)) as session:
+        session.add(Site(id=site_id, display_name=f"load-{site_id.hex[:12]}"))
+        session.add(Device(id=device_id, site_id=site_id, model="load-test"))
+        session.add_all(
+            Point(site_id=site_id, name=f"AV-{i}", object_type=OBJECT_TYPE, object_instance=i, unit="degC")
+            for i in range(points)
+        )
+        session.commit()
+    router.dispose()
+    return site_id, device_id
+
+
+def records_for(offset: int, rows: int, points: int, base_ts: float) -> list:
+    return [
+        {
+            "object_type": OBJECT_TYPE,
+            "object_instance": i % points,
+            "ts": base_ts + (offset + i) * 0.001,
+            "value": 20.0 + (i % 50) * 0.1,
+            "status_flags": {"in_alarm": 0, "fault": 0, "overridden": 0, "out_of_service": 0},
+        }
+        for i in range(rows)
+    ]
+
+
+def encode_columnar(offset: int, rows: int, points: int, base_ts: float) -> bytes:
+    i = np.arange(rows)
+    return encode_batch(
+        [(OBJECT_TYPE, p) for p in range(points)],
+        i % points,
+        ((base_ts + (offset + i) * 0.001) * 1_000_000).astype(np.int64),
+        20.0 + (i % 50) * 0.1,
+        np.full(rows, STATUS_PRESENT, dtype=np.uint8),
+    )
+
+
+def encode(records: list, fmt: str) -> bytes:
+    if fmt == "msgpack":
+        return b"".join(msgpack.packb(r) for r in records)
+    return b"".join(json.dumps(r, separators=(",", ":")).encode("utf-8") + b"\n" for r in records)
+
+
+async def agent(host: str, port: int, site_id, device_id, agent_no: int, requests: int, rows: int, points: int, fmt: str, base_ts: float, latencies: list) -> int:
+    content_type = {"msgpack": "application/msgpack", "columnar": COLUMNAR_CONTENT_TYPE}.get(fmt, "application/x-ndjson")
+    reader, writer = await asyncio.open_connection(host, port)
+    sent = 0
+    try:
+        for req in range(requests):
+            offset = (agent_no * requests + req) * rows
+            if fmt == "columnar":
+                body = encode_columnar(offset, rows, points, base_ts)
+            else:
+                body = encode(records_for(offset, rows, points, base_ts), fmt)
+            head = (
+                f"POST /v1/ingest?site_id={site_id}&device_id={device_id} HTTP/1.1\r\n"
+                f"Host: {host}\r\nContent-Type: {content_type}\r\nContent-Length: {len(body)}\r\n\r\n"
+            ).encode("latin-1")
+
+            started = time.perf_counter()
+            writer.write(head + body)
+            await writer.drain()
+            status_line = await reader.readline()
+            length = 0
+            while True:
+                line = await reader.readline()
+                if line in (b"\r\n", b""):
+                    break
+                name, _, value = line.decode("latin-1").partition(":")
+                if name.lower() == "content-length":
+                    length = int(value)
+            payload = await reader.readexactly(length)
+            latencies.append(time.perf_counter() - started)
+            if b" 200 " not in status_line:
+                raise RuntimeError(f"{status_line!r}: {payload!r}")
+            sent += rows
+    finally:
+        writer.close()
+    return sent
+
+
+async def run() -> None:
+    host = os.getenv("INGEST_HOST", "127.0.0.1")
+    port = int(os.getenv("INGEST_PORT", "8080"))
+    agents = int(os.getenv("LOAD_AGENTS", "50"))
+    requests = int(os.getenv("LOAD_REQUESTS", "20"))
+    rows = int(os.getenv("LOAD_ROWS", "5000"))
+    points = int(os.getenv("LOAD_POINTS", "500"))
+    fmt = os.getenv("LOAD_FORMAT", "ndjson")
+
+    site_id, device_id = seed(points)
+    base_ts = datetime.now(timezone.utc).timestamp() - 3600
+    latencies: list = []
+
+    started = time.perf_counter()
+    sent = await asyncio.gather(*(
+        agent(host, port, site_id, device_id, n, requests, rows, points, fmt, base_ts, latencies)
+        for n in range(agents)
+    ))
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    total_requests = len(latencies)
+
+    def pct(p: float) -> float:
+        return latencies[min(total_requests - 1, int(p * total_requests))] * 1000
+
+    print(f"{agents} agents x {requests} requests x {rows} rows ({fmt}) against site {site_id}")
+    print(f"{total_requests / elapsed:,.1f} requests/s, {sum(sent) / elapsed:,.0f} rows/s over {elapsed:.1f}s")
+    print(f"latency p50 {pct(0.50):.0f} ms, p95 {pct(0.95):.0f} ms, p99 {pct(0.99):.0f} ms")
+
+
+if __name__ == "__main__":
+    asyncio.run(run())
@@ -0,0 +1,48 @@
+import os
+import sys
+import time
+from pathlib import Path
+
+from sqlalchemy import create_engine
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+from db.late import late_backlog, merge_late_data  # noqa: E402
+from db.routing import load_routing_config  # noqa: E402
+from init_db import get_database_url  # noqa: E402
+
+
+def run_once(engines: dict) -> None:
+    for name, engine in engines.items():
+        with engine.connect() as conn:
+            started = time.perf_counter()
+            stats = merge_late_data(conn)
+            elapsed = time.perf_counter() - started
+            backlog = late_backlog(conn)
+            conn.commit()
+
+        if stats.skipped:
+            print(f"[{name}] another merge is running; skipped")
+            continue
+        print(
+            f"[{name}] merged {stats.staged} staged rows ({stats.inserted} inserted, {stats.duplicates} duplicates) "
+            f"recompressing {stats.chunks_recompressed} chunks, "
+            f"{stats.gaps_redetected} overlapped gaps still open, in {elapsed:.2f}s; {backlog} rows still staged"
+        )
+
+
+def main() -> None:
+    loop_seconds = int(os.getenv("LATE_MERGE_LOOP_SECONDS", "0"))
+    # Late rows are staged on the shard that owns their site, so every shard primary is merged
+    engines = {
+        shard.name: create_engine(shard.url, future=True)
+        for shard in load_routing_config(get_database_url()).shards
+    }
+
+    run_once(engines)
+    while loop_seconds > 0:
+        time.sleep(loop_seconds)
+        run_once(engines)
+
+
+if __name__ == "__main__":
+    main()
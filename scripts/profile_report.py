@@ -0,0 +1,150 @@
+"""Capacity-planning report from ``point_profiles`` (see db/profile.py).
+
+    python scripts/profile_report.py                 # roll up by site and device on every shard
+    python scripts/profile_report.py --points <site>  # per-point detail for one site (name or id)
+    python scripts/profile_report.py --no-refresh     # skip reading newly compressed chunks
+"""
+import sys
+from datetime import timedelta
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import numpy as np
+from sqlalchemy import create_engine, text
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+from db.profile import profile_estimates, refresh_compressed_bytes  # noqa: E402
+from db.routing import load_routing_config  # noqa: E402
+from db.sketch import TDigest  # noqa: E402
+from init_db import get_database_url  # noqa: E402
+
+_PROFILES_SQL = text(
+    """
+    SELECT s.id AS site_id, s.display_name AS site, pp.device_id, d.model AS device_model,
+           p.id AS point_id, p.name, p.unit, CAST(p.cov_increment AS float8) AS cov_increment,
+           pp.samples, pp.first_ts, pp.last_ts, pp.min_value, pp.max_value,
+           pp.sum_abs_delta, pp.deltas, pp.compressed_bytes, pp.ts_hll, pp.value_hll,
+           CASE WHEN :digests THEN pp.value_digest END AS value_digest
+      FROM point_profiles pp
+      JOIN points p ON p.id = pp.point_id
+      JOIN sites s ON s.id = p.site_id
+      LEFT JOIN devices d ON d.id = pp.device_id
+     WHERE pp.samples > 0
+     ORDER BY s.display_name, p.name
+    """
+)
+
+_CHUNK_INTERVAL_SQL = text(
+    """
+    SELECT time_interval FROM timescaledb_information.dimensions
+     WHERE hypertable_name = 'measurements' AND dimension_type = 'Time'
+    """
+)
+_PARTITIONS_SQL = text(
+    """
+    SELECT COALESCE(max(num_partitions), 1) FROM timescaledb_information.dimensions
+     WHERE hypertable_name = 'measurements' AND dimension_type = 'Space'
+    """
+)
+
+
+def point_metrics(rows: list) -> Dict[str, np.ndarray]:
+    samples = np.array([r.samples for r in rows], dtype=np.float64)
+    span_days = np.array([(r.last_ts - r.first_ts).total_seconds() / 86400 for r in rows])
+    deltas = np.array([r.deltas for r in rows], dtype=np.float64)
+    cov = np.array([r.cov_increment if r.cov_increment else np.nan for r in rows])
+    distinct_ts, distinct_values = profile_estimates([r.ts_hll for r in rows], [r.value_hll for r in rows])
+    avg_change = np.array([r.sum_abs_delta for r in rows]) / np.maximum(deltas, 1)
+    return {
+        "samples": samples,
+        # A point seen for less than an hour is extrapolated from that hour
+        "per_day": samples / np.maximum(span_days, 1 / 24),
+        "distinct_ts": np.minimum(distinct_ts, samples),
+        "distinct_values": np.minimum(distinct_values, samples),
+        "avg_change": avg_change,
+        "cov_ratio": avg_change / cov,
+        "compressed": np.array([r.compressed_bytes for r in rows], dtype=np.float64),
+    }
+
+
+def _median(values: np.ndarray) -> float:
+    values = values[np.isfinite(values)]
+    return float(np.median(values)) if values.size else float("nan")
+
+
+def summarize(m: Dict[str, np.ndarray], idx: np.ndarray) -> str:
+    samples = m["samples"][idx].sum()
+    dup = 1 - m["distinct_ts"][idx].sum() / samples
+    return (
+        f"{idx.shape[0]:>7} {m['per_day'][idx].sum():>13,.0f} {_median(m['per_day'][idx]):>11,.0f} "
+        f"{dup:>6.1%} {_median(m['distinct_values'][idx] / m['samples'][idx]):>9.2f} "
+        f"{_median(m['cov_ratio'][idx]):>9.2f} {m['compressed'][idx].sum() / 1e6:>11.1f}"
+    )
+
+
+HEADER = f"{'points':>7} {'rows/day':>13} {'med/point':>11} {'dups':>6} {'distinct':>9} {'chg/COV':>9} {'compr. MB':>11}"
+
+
+def rollup(rows: list, m: Dict[str, np.ndarray]) -> None:
+    sites: Dict[str, List[int]] = {}
+    devices: Dict[tuple, List[int]] = {}
+    for i, r in enumerate(rows):
+        sites.setdefault(r.site, []).append(i)
+        device = f"{r.device_model or 'device'} {str(r.device_id)[:8]}" if r.device_id else "(no device)"
+        devices.setdefault((r.site, device), []).append(i)
+    print(f"{'site / device':<40} {HEADER}")
+    for site, idx in sites.items():
+        print(f"{site[:40]:<40} {summarize(m, np.array(idx))}")
+        for (dev_site, device), didx in devices.items():
+            if dev_site == site:
+                print(f"  {device[:38]:<38} {summarize(m, np.array(didx))}")
+
+
+def point_detail(rows: list, m: Dict[str, np.ndarray], site: str) -> None:
+    print(f"{'point':<32} {'unit':<8} {'rows/day':>9} {'dups':>6} {'min':>10} {'p01':>10} {'p50':>10} {'p99':>10} {'max':>10} {'avg chg':>9} {'COV':>8}")
+    for i, r in enumerate(rows):
+        if site not in (r.site, str(r.site_id)):
+            continue
+        digest = TDigest.from_bytes(r.value_digest)
+        q = [digest.quantile(x) for x in (0.01, 0.5, 0.99)]
+        q = [float("nan") if x is None else x for x in q]
+        dup = 1 - m["distinct_ts"][i] / m["samples"][i]
+        print(
+            f"{r.name[:32]:<32} {(r.unit or '')[:8]:<8} {m['per_day'][i]:>9,.0f} {dup:>6.1%} "
+            f"{r.min_value:>10.3f} {q[0]:>10.3f} {q[1]:>10.3f} {q[2]:>10.3f} {r.max_value:>10.3f} "
+            f"{m['avg_change'][i]:>9.4f} {r.cov_increment or float('nan'):>8.3f}"
+        )
+
+
+def chunk_sizing(conn, rows_per_day: float) -> Optional[str]:
+    interval = conn.execute(_CHUNK_INTERVAL_SQL).scalar()
+    if not isinstance(interval, timedelta):
+        return None
+    partitions = conn.execute(_PARTITIONS_SQL).scalar()
+    per_chunk = rows_per_day * interval.total_seconds() / 86400 / partitions
+    return f"{rows_per_day:,.0f} rows/day; chunk interval {interval} x {partitions} partitions -> ~{per_chunk:,.0f} rows per chunk"
+
+
+def main() -> None:
+    detail = sys.argv[sys.argv.index("--points") + 1] if "--points" in sys.argv else None
+    for shard in load_routing_config(get_database_url()).shards:
+        engine = create_engine(shard.url, future=True)
+        with engine.connect() as conn:
+            if "--no-refresh" not in sys.argv:
+                refresh_compressed_bytes(conn)
+            rows = conn.execute(_PROFILES_SQL, {"digests": detail is not None}).all()
+            m = point_metrics(rows) if rows else None
+            sizing = chunk_sizing(conn, m["per_day"].sum()) if rows else "no profiles yet"
+        engine.dispose()
+
+        print(f"[{shard.name}] {sizing or ''}")
+        if m is None:
+            continue
+        if detail is not None:
+            point_detail(rows, m, detail)
+        else:
+            rollup(rows, m)
+        print()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+import json
+import sys
+import time
+import uuid
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+from db.catalog import DiscoveredPoint, sync_site_points  # noqa: E402
+from db.routing import ShardRouter  # noqa: E402
+from init_db import get_database_url  # noqa: E402
+
+USAGE = (
+    "usage: sync_catalog.py <site uuid> <discovery.json> [--deactivate-missing]\n"
+    "       sync_catalog.py <site uuid> --points N   (timed synthetic run, rolled back)"
+)
+
+
+def _report(label: str, result, elapsed: float) -> None:
+    print(
+        f"{label}{result.discovered} discovered: {result.inserted} inserted, {result.updated} updated, "
+        f"{result.reactivated} reactivated, {result.unchanged} unchanged, {result.deactivated} deactivated "
+        f"in {elapsed * 1000:.0f} ms"
+    )
+
+
+def synthetic_points(n: int, revision: int = 0, changed_every: int = 10) -> list:
+    """``n`` analog points; with ``revision`` > 0 every ``changed_every``-th one has a new description."""
+    return [
+        DiscoveredPoint(
+            name=f"AV-{i}",
+            object_type="analog-value",
+            object_instance=i,
+            unit="degC",
+            description=f"rev {revision}" if revision and i % changed_every == 0 else None,
+            cov_increment="0.5",
+            tags={"floor": i % 12, "zone": f"Z{i % 40}"},
+        )
+        for i in range(n)
+    ]
+
+
+def bench(router: ShardRouter, site_id: uuid.UUID, n: int) -> None:
+    # Fresh insert, resync with nothing changed, resync with 10% changed; all rolled back
+    with router.engine_for_site(site_id).connect() as conn:
+        try:
+            for label, points in (
+                ("insert   ", synthetic_points(n)),
+                ("unchanged", synthetic_points(n)),
+                ("10% edit ", synthetic_points(n, revision=1)),
+            ):
+                started = time.perf_counter()
+                result = sync_site_points(conn, site_id, points)
+                _report(f"{label} ", result, time.perf_counter() - started)
+        finally:
+            conn.rollback()
+
+
+def main() -> None:
+    if len(sys.argv) < 3:
+        sys.exit(USAGE)
+    site_id = uuid.UUID(sys.argv[1])
+    router = ShardRouter.from_env(get_database_url())
+    try:
+        if sys.argv[2] == "--points":
+            bench(router, site_id, int(sys.argv[3]))
+            return
+        with open(sys.argv[2], encoding="utf-8") as f:
+            discovered = [DiscoveredPoint.from_dict(p) for p in json.load(f)]
+        with router.engine_for_site(site_id).begin() as conn:
+            started = time.perf_counter()
+            result = sync_site_points(conn, site_id, discovered, deactivate_missing="--deactivate-missing" in sys.argv)
+            elapsed = time.perf_counter() - started
+    finally:
+        router.dispose()
+    _report("", result, elapsed)
+
+
+if __name__ == "__main__":
+    main()
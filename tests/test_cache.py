@@ -0,0 +1,142 @@
+import uuid
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+from db import cache as cache_module
+from db.cache import DirtyLogPoller, ResultCache
+
+T0 = datetime(2025, 9, 1, tzinfo=timezone.utc)
+HOUR = timedelta(hours=1)
+
+
+def _key(point_id, start=T0, end=T0 + HOUR):
+    return ResultCache.make_key("rollup", [point_id], start, end, timedelta(minutes=5))
+
+
+def test_invalidate_drops_only_overlapping_ranges():
+    cache = ResultCache()
+    pid, other = uuid.uuid4(), uuid.uuid4()
+    old, recent = _key(pid, T0, T0 + HOUR), _key(pid, T0 + HOUR, T0 + 2 * HOUR)
+    for key in (old, recent, _key(other)):
+        cache.put(key, [(1, 2.0)])
+    assert cache.invalidate(pid, T0 + HOUR + timedelta(minutes=1), T0 + HOUR + timedelta(minutes=2)) == 1
+    assert cache.get(old) == (True, [(1, 2.0)])
+    assert cache.get(recent) == (False, None)
+    assert cache.get(_key(other))[0]
+
+
+def test_put_skips_values_loaded_across_an_invalidation():
+    cache = ResultCache()
+    pid, other = uuid.uuid4(), uuid.uuid4()
+    generation = cache.generation()
+    cache.invalidate(pid, T0, T0)
+    cache.put(_key(pid), ["stale"], generation)
+    cache.put(_key(other), ["fresh"], generation)
+    assert cache.get(_key(pid))[0] is False
+    assert cache.get(_key(other))[0] is True
+
+    generation = cache.generation()
+    cache.clear()
+    cache.put(_key(other), ["stale"], generation)
+    assert cache.get(_key(other))[0] is False
+    cache.put(_key(other), ["fresh"], cache.generation())
+    assert cache.get(_key(other))[0] is True
+
+
+def test_get_or_load_and_lru_eviction():
+    cache = ResultCache(max_bytes=1)
+    calls = []
+    value = cache.get_or_load(_key(uuid.uuid4()), lambda: calls.append(1) or ["row"])
+    assert value == ["row"] and calls == [1]
+    # Larger than max_bytes: returned but never stored
+    assert cache.stats()["entries"] == 0
+
+    cache = ResultCache(max_bytes=10_000)
+    keys = [_key(uuid.uuid4()) for _ in range(50)]
+    for key in keys:
+        cache.put(key, [(i, float(i)) for i in range(10)])
+    assert cache.stats()["bytes"] <= 10_000
+    assert cache.get(keys[-1])[0] and not cache.get(keys[0])[0]
+
+
+class FakeLog:
+    """point_dirty_log rows keyed by id, served to DirtyLogPoller as a fake Engine."""
+
+    def __init__(self):
+        self.rows = {}
+
+    def write(self, row_id, point_id, dirty_from=T0):
+        self.rows[row_id] = SimpleNamespace(id=row_id, point_id=point_id, dirty_from=dirty_from, dirty_to=dirty_from + HOUR)
+
+    def connect(self):
+        return self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, sql, params=None):
+        ids = sorted(self.rows)
+        if sql is cache_module._LOG_BOUNDS_SQL:
+            return SimpleNamespace(one=lambda: (ids[0] if ids else 0, ids[-1] if ids else 0))
+        if sql is cache_module._LOG_TAIL_SQL:
+            rows = [self.rows[i] for i in ids if i > params["last"]][: params["limit"]]
+        else:
+            rows = [self.rows[i] for i in ids if any(lo <= i <= hi for lo, hi in zip(params["los"], params["his"]))]
+        return _Rows(rows)
+
+
+class _Rows(list):
+    def all(self):
+        return list(self)
+
+
+def test_poller_applies_rows_in_holes_once_and_gives_holes_up(monkeypatch):
+    pid = uuid.uuid4()
+    log = FakeLog()
+    cache = ResultCache()
+    poller = DirtyLogPoller(log, cache, gap_timeout_s=30.0)
+    applied = []
+    monkeypatch.setattr(cache, "invalidate", lambda point_id, start, end: applied.append(point_id) or 0)
+    now = [1000.0]
+    monkeypatch.setattr(cache_module.time, "monotonic", lambda: now[0])
+
+    log.write(1, pid)
+    poller.poll()  # first poll starts from the current end of the log
+    assert poller.last_id == 1
+
+    # Ids 2-3 are still committing (or rolled back) when 4 and 5 are read
+    log.write(4, pid)
+    log.write(5, pid)
+    poller.poll()
+    assert len(applied) == 2 and poller.last_id == 1
+    poller.poll()
+    assert len(applied) == 2  # rows past the hole are not applied again
+
+    log.write(2, pid)  # commits late
+    poller.poll()
+    poller.poll()
+    assert len(applied) == 3 and poller.last_id == 1  # id 3 is still pending
+
+    now[0] += 31  # id 3 was rolled back
+    poller.poll()
+    assert poller.last_id == 5
+    log.write(6, pid)
+    poller.poll()
+    assert len(applied) == 4 and poller.last_id == 6
+
+
+def test_poller_clears_cache_when_unseen_rows_were_pruned():
+    pid = uuid.uuid4()
+    log = FakeLog()
+    cache = ResultCache()
+    poller = DirtyLogPoller(log, cache)
+    log.write(1, pid)
+    poller.poll()
+    cache.put(_key(pid, T0 + 5 * HOUR, T0 + 6 * HOUR), ["row"])
+    log.rows.clear()
+    log.write(10, pid)
+    poller.poll()
+    assert cache.stats()["entries"] == 0 and poller.last_id == 10
@@ -0,0 +1,62 @@
+from decimal import Decimal
+
+import pytest
+
+from db.catalog import DiscoveredPoint, _cov_text, compute_meta_hash
+
+
+def _point(**overrides):
+    fields = dict(
+        name="ZN-T",
+        object_type="analog-input",
+        object_instance=1,
+        unit="degC",
+        description="Zone temp",
+        cov_increment="0.5",
+        tags={"floor": 2, "zone": "A"},
+    )
+    fields.update(overrides)
+    return DiscoveredPoint(**fields)
+
+
+@pytest.mark.parametrize("value", [0.5, "0.5", "0.50", Decimal("0.500000"), Decimal("0.5000001")])
+def test_cov_text_normalizes_like_numeric_14_6(value):
+    assert _cov_text(value) == "0.500000"
+
+
+def test_cov_text_none_and_integers():
+    assert _cov_text(None) is None
+    assert _cov_text(2) == _cov_text("2.0") == "2.000000"
+
+
+@pytest.mark.parametrize("cov", [0.5, "0.50", Decimal("0.500000")])
+def test_equivalent_cov_increments_hash_alike(cov):
+    assert compute_meta_hash(_point(cov_increment=cov)) == compute_meta_hash(_point())
+
+
+def test_tag_key_order_does_not_change_hash():
+    assert compute_meta_hash(_point(tags={"zone": "A", "floor": 2})) == compute_meta_hash(_point())
+
+
+@pytest.mark.parametrize(
+    "change",
+    [
+        {"name": "ZN-T2"},
+        {"unit": "degF"},
+        {"description": None},
+        {"cov_increment": None},
+        {"cov_increment": "0.25"},
+        {"tags": {"floor": 3, "zone": "A"}},
+        {"object_instance": 2},
+    ],
+)
+def test_definition_changes_change_hash(change):
+    assert compute_meta_hash(_point(**change)) != compute_meta_hash(_point())
+
+
+def test_from_dict_matches_constructor():
+    data = {"name": "ZN-T", "object_type": "analog-input", "object_instance": "1", "unit": "degC",
+            "description": "Zone temp", "cov_increment": "0.5", "tags": {"zone": "A", "floor": 2}}
+    point = DiscoveredPoint.from_dict(data)
+    assert point.key == ("analog-input", 1)
+    assert compute_meta_hash(point) == compute_meta_hash(_point())
@@ -0,0 +1,134 @@
+import asyncio
+import json
+import uuid
+
+import msgpack
+import numpy as np
+import pytest
+
+from db.ingest import IngestBatch, MsgpackDecoder, NdjsonDecoder, PointResolver, UnknownDevice
+from db.wire import encode_batch, decode_batch
+
+SITE = uuid.uuid4()
+DEVICE = uuid.uuid4()
+POINT = uuid.uuid4()
+
+
+class FakeConn:
+    """Just enough of asyncpg.Connection for IngestBatch without validation or profiles."""
+
+    def __init__(self, device_site=SITE):
+        self.device_site = device_site
+        self.resolves = 0
+        self.copied = []
+
+    async def fetchval(self, sql, *args):
+        return self.device_site
+
+    async def execute(self, sql, *args):
+        return None
+
+    async def fetch(self, sql, site_id, object_types, object_instances):
+        self.resolves += 1
+        return [
+            {"id": POINT, "name": "ZN-T", "unit": "degC", "object_type": t, "object_instance": i}
+            for t, i in zip(object_types, object_instances)
+            if (t, i) == ("analog-input", 1)
+        ]
+
+    async def copy_records_to_table(self, table, records, columns):
+        self.copied.extend(records)
+
+    async def copy_to_table(self, table, source, columns, format):
+        self.copied.append(source.getvalue())
+
+
+def _run(coro):
+    return asyncio.run(coro)
+
+
+def test_ndjson_decoder_splits_records_across_chunks():
+    decoder = NdjsonDecoder()
+    assert decoder.feed(b'{"a": 1}\n{"b"') == [{"a": 1}]
+    assert decoder.feed(b": 2}\n\n") == [{"b": 2}]
+    assert decoder.feed(b'{"c": 3}') == []
+    assert decoder.close() == [{"c": 3}]
+
+
+def test_msgpack_decoder_rejects_truncated_last_record():
+    data = msgpack.packb({"a": 1}) + msgpack.packb({"b": [1, 2, 3]})
+    decoder = MsgpackDecoder()
+    assert decoder.feed(data[:2]) == []
+    assert decoder.feed(data[2:6]) == [{"a": 1}]
+    assert decoder.feed(data[6:]) == [{"b": [1, 2, 3]}]
+    assert decoder.close() == []
+
+    decoder = MsgpackDecoder()
+    assert decoder.feed(data[:-1]) == [{"a": 1}]
+    with pytest.raises(ValueError):
+        decoder.close()
+
+
+def test_begin_rejects_unknown_or_foreign_device():
+    resolver = PointResolver()
+    with pytest.raises(UnknownDevice):
+        _run(IngestBatch(FakeConn(device_site=None), SITE, DEVICE, resolver).begin())
+    with pytest.raises(UnknownDevice):
+        _run(IngestBatch(FakeConn(device_site=uuid.uuid4()), SITE, DEVICE, resolver).begin())
+    _run(IngestBatch(FakeConn(), SITE, DEVICE, resolver).begin())
+
+
+def test_add_rejects_unresolved_and_unstorable_values():
+    records = [
+        {"object_type": "analog-input", "object_instance": 1, "ts": 1_700_000_000 + i, "value": v}
+        for i, v in enumerate([21.5, float("inf"), float("nan"), 1e9, -99_999_999.0])
+    ]
+    records.append({"object_type": "analog-input", "object_instance": 2, "ts": 1_700_000_000, "value": 1.0})
+    records.append({"object_type": "analog-input", "object_instance": 1, "ts": 1_700_000_000})
+    # What an agent sends for infinity in JSON
+    records = json.loads(json.dumps(records))
+
+    conn = FakeConn()
+    batch = IngestBatch(conn, SITE, DEVICE, PointResolver())
+    _run(batch.add(records))
+    assert (batch.received, batch.rejected) == (7, 5)
+    assert [row[4] for row in conn.copied] == [21.5, -99_999_999.0]
+
+
+def test_add_columnar_rejects_unstorable_values():
+    data = encode_batch(
+        [("analog-input", 1), ("analog-input", 2)],
+        [0, 0, 0, 1],
+        np.arange(4, dtype=np.int64) * 1_000_000,
+        [1.0, np.inf, 2e8, 3.0],
+    )
+    conn = FakeConn()
+    batch = IngestBatch(conn, SITE, DEVICE, PointResolver())
+    _run(batch.add_columnar(decode_batch(data)))
+    assert (batch.received, batch.rejected) == (4, 3)
+
+
+def test_point_resolver_expires_sites():
+    conn = FakeConn()
+    resolver = PointResolver(ttl_s=float("inf"))
+    key = ("analog-input", 1)
+    assert _run(resolver.resolve(conn, SITE, [key]))[key][0] == POINT
+    _run(resolver.resolve(conn, SITE, [key]))
+    assert conn.resolves == 1
+    resolver.invalidate(SITE)
+    _run(resolver.resolve(conn, SITE, [key]))
+    assert conn.resolves == 2
+
+    expiring = PointResolver(ttl_s=0.0)
+    _run(expiring.resolve(conn, SITE, [key]))
+    _run(expiring.resolve(conn, SITE, [key]))
+    assert conn.resolves == 4
+
+
+def test_ndjson_decoder_caps_unfinished_line():
+    decoder = NdjsonDecoder(max_buffer_size=16)
+    assert decoder.feed(b'{"a": 1}\n{"b":') == [{"a": 1}]
+    assert decoder.feed(b' 2}\n') == [{"b": 2}]
+    decoder.feed(b'{"c": "' + b"x" * 8)
+    with pytest.raises(ValueError):
+        decoder.feed(b"x" * 8)
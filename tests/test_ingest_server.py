@@ -0,0 +1,43 @@
+import asyncio
+
+import pytest
+
+from ingest_server import BadRequest, _body_chunks
+
+
+def _read(raw: bytes, headers: dict) -> bytes:
+    async def run():
+        reader = asyncio.StreamReader()
+        reader.feed_data(raw)
+        reader.feed_eof()
+        return b"".join([chunk async for chunk in _body_chunks(reader, headers)])
+
+    return asyncio.run(run())
+
+
+def test_content_length_body():
+    assert _read(b"hello world", {"content-length": "5"}) == b"hello"
+
+
+def test_chunked_body():
+    raw = b"5\r\nhello\r\n6;ext=1\r\n world\r\n0\r\n\r\n"
+    assert _read(raw, {"transfer-encoding": "chunked"}) == b"hello world"
+
+
+@pytest.mark.parametrize(
+    "raw, headers",
+    [
+        (b"data", {"content-length": "-1"}),
+        (b"data", {"content-length": "many"}),
+        (b"-1\r\ndata\r\n0\r\n\r\n", {"transfer-encoding": "chunked"}),
+        (b"zz\r\ndata\r\n0\r\n\r\n", {"transfer-encoding": "chunked"}),
+    ],
+)
+def test_rejects_negative_or_non_numeric_lengths(raw, headers):
+    with pytest.raises(BadRequest):
+        _read(raw, headers)
+
+
+def test_truncated_body():
+    with pytest.raises(BadRequest):
+        _read(b"abc", {"content-length": "10"})
@@ -0,0 +1,80 @@
+import json
+import uuid
+
+import pytest
+
+from db.routing import HashRing, RoutingConfig, ShardConfig, SiteShardMap, load_routing_config
+
+SITES = [uuid.UUID(int=i * 7919 + 1) for i in range(2000)]
+
+
+def _config(*names, site_map=None):
+    return RoutingConfig(shards=[ShardConfig(name=n, url=f"postgresql://h/{n}") for n in names], site_map=site_map or {})
+
+
+def test_assignment_is_stable():
+    a = SiteShardMap(_config("s0", "s1", "s2"))
+    b = SiteShardMap(_config("s2", "s0", "s1"))  # order of shards does not matter
+    assert [a.shard_for_site(s) for s in SITES] == [b.shard_for_site(s) for s in SITES]
+    assert {a.shard_for_site(s) for s in SITES} == {"s0", "s1", "s2"}
+
+
+def test_adding_a_shard_moves_only_sites_onto_it():
+    before = SiteShardMap(_config("s0", "s1", "s2"))
+    after = SiteShardMap(_config("s0", "s1", "s2", "s3"))
+    moved = [s for s in SITES if before.shard_for_site(s) != after.shard_for_site(s)]
+
+    assert all(after.shard_for_site(s) == "s3" for s in moved)
+    # About a quarter of the sites belong on the new shard
+    assert 0.15 < len(moved) / len(SITES) < 0.35
+
+
+def test_site_map_overrides_ring():
+    site = SITES[0]
+    ring_shard = SiteShardMap(_config("s0", "s1")).shard_for_site(site)
+    other = "s1" if ring_shard == "s0" else "s0"
+    pinned = SiteShardMap(_config("s0", "s1", site_map={site: other}))
+    assert pinned.shard_for_site(site) == other
+    assert pinned.shard_for_site(SITES[1]) == SiteShardMap(_config("s0", "s1")).shard_for_site(SITES[1])
+
+
+def test_ring_lookup_wraps_around():
+    ring = HashRing(["only"], vnodes=1)
+    assert {ring.lookup(str(s)) for s in SITES[:50]} == {"only"}
+
+
+def test_load_without_configuration(monkeypatch):
+    monkeypatch.delenv("HVAC_SHARDS", raising=False)
+    monkeypatch.delenv("HVAC_SHARDS_FILE", raising=False)
+    config = load_routing_config("postgresql://h/hvac")
+    assert [(s.name, s.url) for s in config.shards] == [("default", "postgresql://h/hvac")]
+
+
+def test_load_from_file(monkeypatch, tmp_path):
+    site = SITES[3]
+    path = tmp_path / "shards.json"
+    path.write_text(json.dumps({
+        "shards": [{"name": "a", "url": "postgresql://h/a", "replicas": ["postgresql://r/a"]}, {"name": "b", "url": "postgresql://h/b"}],
+        "site_map": {str(site): "b"},
+        "replica_max_lag_s": 5,
+    }))
+    monkeypatch.delenv("HVAC_SHARDS", raising=False)
+    monkeypatch.setenv("HVAC_SHARDS_FILE", str(path))
+    config = load_routing_config("postgresql://h/hvac")
+    assert [s.name for s in config.shards] == ["a", "b"]
+    assert config.shards[0].replicas == ["postgresql://r/a"]
+    assert config.site_map == {site: "b"}
+    assert config.replica_max_lag_s == 5.0
+
+
+@pytest.mark.parametrize(
+    "data, message",
+    [
+        ({"shards": [{"name": "a", "url": "u1"}, {"name": "a", "url": "u2"}]}, "unique"),
+        ({"shards": [{"name": "a", "url": "u1"}], "site_map": {str(SITES[0]): "b"}}, "unknown shards"),
+    ],
+)
+def test_load_rejects_bad_shard_names(monkeypatch, data, message):
+    monkeypatch.setenv("HVAC_SHARDS", json.dumps(data))
+    with pytest.raises(ValueError, match=message):
+        load_routing_config("postgresql://h/hvac")
@@ -0,0 +1,80 @@
+import numpy as np
+import pytest
+
+from db.sketch import DIGEST_DELTA, HyperLogLog, TDigest, compress_centroids, hash64, hll_count, hll_registers
+
+
+def _digest(values):
+    values = np.asarray(values, dtype=np.float64)
+    _, m, w = compress_centroids(np.zeros(values.shape[0], dtype=np.int64), values)
+    return TDigest(m, w)
+
+
+def test_hash64_is_deterministic_and_seeded():
+    values = np.arange(1000, dtype=np.float64)
+    assert np.array_equal(hash64(values), hash64(values.copy()))
+    assert np.unique(hash64(values)).shape[0] == 1000
+    assert not np.array_equal(hash64(values), hash64(values, seed=1))
+
+
+def test_compress_centroids_per_group():
+    rng = np.random.default_rng(0)
+    groups = rng.integers(0, 3, 30_000)
+    values = rng.normal(groups * 100.0, 1.0)
+    g, m, w = compress_centroids(groups, values)
+
+    assert np.all(np.diff(g) >= 0)
+    for group in range(3):
+        sel = g == group
+        assert w[sel].sum() == np.count_nonzero(groups == group)
+        assert np.all(np.diff(m[sel]) >= 0)
+        assert sel.sum() <= DIGEST_DELTA
+        # Weighted means of the centroids keep the group's mean exactly
+        assert np.average(m[sel], weights=w[sel]) == pytest.approx(values[groups == group].mean())
+
+
+def test_compress_centroids_empty():
+    g, m, w = compress_centroids(np.empty(0, dtype=np.int64), np.empty(0))
+    assert g.shape == m.shape == w.shape == (0,)
+
+
+def test_tdigest_quantiles_and_merge():
+    rng = np.random.default_rng(1)
+    a, b = rng.uniform(0, 100, 20_000), rng.uniform(0, 100, 30_000)
+    merged = _digest(a).merge(_digest(b))
+    both = np.concatenate([a, b])
+
+    assert merged.count == both.shape[0]
+    for q in (0.01, 0.25, 0.5, 0.75, 0.99):
+        assert merged.quantile(q) == pytest.approx(np.quantile(both, q), abs=1.0)
+    assert TDigest.from_bytes(None).quantile(0.5) is None
+
+
+def test_tdigest_bytes_round_trip():
+    digest = _digest(np.linspace(-5, 5, 1000))
+    restored = TDigest.from_bytes(digest.to_bytes())
+    assert np.array_equal(restored.means, digest.means)
+    assert np.array_equal(restored.weights, digest.weights)
+
+
+@pytest.mark.parametrize("n", [10, 1_000, 100_000])
+def test_hll_count_within_error(n):
+    registers = hll_registers(np.zeros(n, dtype=np.int64), hash64(np.arange(n, dtype=np.int64)), 1)
+    # ~3% standard error at p=10; allow four of them
+    assert hll_count(registers)[0] == pytest.approx(n, rel=0.12)
+
+
+def test_hll_registers_per_group_and_merge():
+    values = np.arange(20_000, dtype=np.int64)
+    groups = (values >= 5_000).astype(np.int64)
+    registers = hll_registers(groups, hash64(values), 2)
+    counts = hll_count(registers)
+    assert counts[0] == pytest.approx(5_000, rel=0.12)
+    assert counts[1] == pytest.approx(15_000, rel=0.12)
+
+    # Merging the halves counts the union; duplicates do not add
+    merged = HyperLogLog(registers[0]).merge(HyperLogLog(registers[1]))
+    assert merged.count() == pytest.approx(20_000, rel=0.12)
+    assert merged.merge(HyperLogLog(registers[1])).count() == merged.count()
+    assert HyperLogLog.from_bytes(merged.to_bytes()).count() == merged.count()
+    assert HyperLogLog.from_bytes(None).count() == 0
@@ -0,0 +1,112 @@
+import uuid
+from types import SimpleNamespace
+
+import numpy as np
+
+from db.models import ValidationRuleType
+from db.validation import (
+    QUALITY_RANGE,
+    QUALITY_RATE_OF_CHANGE,
+    QUALITY_SPIKE,
+    QUALITY_STUCK,
+    CompiledRuleSet,
+    RuleCache,
+    ValidationEngine,
+)
+
+
+def _rule(rule_type, enabled=True, **params):
+    return SimpleNamespace(point_id=None, rule_type=rule_type, params=params, enabled=enabled)
+
+
+def _engine(rule_sets, **kwargs):
+    cache = RuleCache(ttl_s=float("inf"))
+    for pid, rs in rule_sets.items():
+        cache.put(pid, rs)
+    return ValidationEngine(cache=cache, **kwargs)
+
+
+def test_compile_keeps_tightest_bounds_and_skips_disabled():
+    rs = CompiledRuleSet.compile([
+        _rule(ValidationRuleType.RANGE, min=0, max=50),
+        _rule(ValidationRuleType.RANGE, min=5, max=60),
+        _rule(ValidationRuleType.RATE_OF_CHANGE, max_per_s=2.0),
+        _rule(ValidationRuleType.RATE_OF_CHANGE, max_per_s=0.5, enabled=False),
+        _rule(ValidationRuleType.STUCK, window_s=600, tolerance=0.1),
+    ])
+    assert (rs.min_value, rs.max_value) == (5.0, 50.0)
+    assert rs.max_rate_per_s == 2.0
+    assert (rs.stuck_window_s, rs.stuck_tolerance) == (600.0, 0.1)
+    assert not rs.empty
+    assert CompiledRuleSet.compile([]).empty
+
+
+def test_range_and_rate_flags():
+    pid = uuid.uuid4()
+    engine = _engine({pid: CompiledRuleSet(min_value=0.0, max_value=10.0, max_rate_per_s=1.0)})
+    ts = np.array([0.0, 1.0, 2.0, 3.0])
+    values = np.array([5.0, 5.5, 11.0, 9.0])
+    quality = engine.evaluate(None, np.zeros(4, dtype=np.int64), [pid], ts, values)
+    assert quality.tolist() == [0, 0, QUALITY_RANGE | QUALITY_RATE_OF_CHANGE, QUALITY_RATE_OF_CHANGE]
+
+
+def test_rows_are_evaluated_per_point_in_time_order():
+    a, b = uuid.uuid4(), uuid.uuid4()
+    engine = _engine({a: CompiledRuleSet(max_rate_per_s=1.0), b: CompiledRuleSet(max_rate_per_s=1.0)})
+    # Interleaved and out of order: per point the series is smooth
+    codes = np.array([0, 1, 0, 1])
+    ts = np.array([2.0, 1.0, 1.0, 2.0])
+    values = np.array([1.5, 100.0, 1.0, 100.5])
+    assert engine.evaluate(None, codes, [a, b], ts, values).tolist() == [0, 0, 0, 0]
+
+
+def test_spike_and_stuck():
+    pid = uuid.uuid4()
+    engine = _engine({pid: CompiledRuleSet(spike_threshold=5.0, stuck_window_s=3.0)})
+    ts = np.arange(7, dtype=np.float64)
+    values = np.array([1.0, 20.0, 1.0, 2.0, 2.0, 2.0, 2.0])
+    quality = engine.evaluate(None, np.zeros(7, dtype=np.int64), [pid], ts, values)
+    assert quality[1] == QUALITY_SPIKE
+    assert quality.tolist()[3:] == [0, 0, 0, QUALITY_STUCK]
+
+
+def test_points_without_rules_pass():
+    pid = uuid.uuid4()
+    engine = _engine({pid: CompiledRuleSet()})
+    quality = engine.evaluate(None, np.zeros(3, dtype=np.int64), [pid], np.arange(3.0), np.array([1e9, -1e9, 0.0]))
+    assert quality.tolist() == [0, 0, 0]
+
+
+def test_state_carries_into_next_batch_but_not_into_late_batches():
+    pid = uuid.uuid4()
+    engine = _engine({pid: CompiledRuleSet(max_rate_per_s=1.0, stuck_window_s=10.0)})
+    one = np.zeros(1, dtype=np.int64)
+    engine.evaluate(None, np.zeros(2, dtype=np.int64), [pid], np.array([0.0, 5.0]), np.array([1.0, 1.0]))
+    # Continues the run started at t=0 and jumps 50 in 1s from the carried reading
+    assert engine.evaluate(None, one, [pid], np.array([10.0]), np.array([1.0])).tolist() == [QUALITY_STUCK]
+    assert engine.evaluate(None, one, [pid], np.array([11.0]), np.array([51.0])).tolist() == [QUALITY_RATE_OF_CHANGE]
+    # Older than the carried reading: evaluated without it
+    assert engine.evaluate(None, one, [pid], np.array([3.0]), np.array([500.0])).tolist() == [0]
+
+    stateless = _engine({pid: CompiledRuleSet(max_rate_per_s=1.0)}, carry_state=False)
+    stateless.evaluate(None, one, [pid], np.array([0.0]), np.array([1.0]))
+    assert stateless.evaluate(None, one, [pid], np.array([1.0]), np.array([50.0])).tolist() == [0]
+
+
+def test_rule_cache_expiry_and_invalidate():
+    a, b = uuid.uuid4(), uuid.uuid4()
+    cache = RuleCache(ttl_s=float("inf"))
+    cache.put(a, CompiledRuleSet(max_value=1.0))
+    slots, missing = cache.lookup([a, b])
+    assert missing == [b]
+    assert cache.params[slots[0], 1] == 1.0
+
+    cache.store([b], [])
+    assert cache.lookup([a, b])[1] == []
+    assert cache.get(b).empty
+
+    cache.invalidate(a)
+    assert cache.lookup([a, b])[1] == [a]
+    cache.invalidate()
+    assert cache.lookup([a, b])[1] == [a, b]
+    assert RuleCache(ttl_s=0.0).lookup([a])[1] == [a]
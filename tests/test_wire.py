@@ -0,0 +1,127 @@
+import struct
+import uuid
+
+import numpy as np
+import pytest
+
+from db.models import SCHEMA_VERSION
+from db.wire import (
+    COPY_SIGNATURE,
+    COPY_TRAILER,
+    PG_EPOCH_OFFSET_US,
+    STATUS_FAULT,
+    STATUS_PRESENT,
+    ColumnarDecoder,
+    WireFormatError,
+    batch_size,
+    decode_batch,
+    encode_batch,
+    to_copy_binary,
+    uuid_matrix,
+)
+
+KEYS = [("analog-input", 1), ("analog-value", 9), ("analog-input", 2)]
+
+
+def _batch(n_rows=7, keys=KEYS, step_us=1_000_000, status=True):
+    rng = np.random.default_rng(n_rows)
+    idx = rng.integers(0, len(keys), n_rows)
+    ts = 1_700_000_000_000_000 + np.arange(n_rows, dtype=np.int64) * step_us
+    values = rng.normal(20, 2, n_rows)
+    flags = np.full(n_rows, STATUS_PRESENT | STATUS_FAULT, dtype=np.uint8) if status else None
+    return idx, ts, values, flags, encode_batch(keys, idx, ts, values, flags)
+
+
+# Hour steps overflow int32 microsecond deltas (FLAG_WIDE_DELTA)
+@pytest.mark.parametrize("n_rows, step_us, status", [(7, 1_000_000, True), (0, 1, False), (5, 3_600_000_000, False)])
+def test_round_trip(n_rows, step_us, status):
+    idx, ts, values, flags, data = _batch(n_rows, step_us=step_us, status=status)
+    batch = decode_batch(data)
+    assert batch.version == SCHEMA_VERSION
+    assert batch.point_keys() == KEYS
+    assert batch.point_idx.tolist() == idx.tolist()
+    assert batch.ts_us.tolist() == ts.tolist()
+    assert batch.values.tolist() == values.tolist()
+    assert (batch.status is None) == (flags is None)
+    assert batch_size(data) == len(data)
+
+
+def test_round_trip_wide_index():
+    keys = [("analog-input", i) for i in range(70_000)]
+    _, ts, values, _, _ = _batch(3)
+    idx = np.array([0, 69_999, 65_536])
+    data = encode_batch(keys, idx, ts, values)
+    batch = decode_batch(data)
+    assert batch.point_idx.tolist() == idx.tolist()
+    assert batch.point_keys()[69_999] == ("analog-input", 69_999)
+    assert batch_size(data) == len(data)
+
+
+def test_header_errors():
+    data = _batch()[-1]
+    with pytest.raises(WireFormatError, match="truncated header"):
+        decode_batch(data[:10])
+    with pytest.raises(WireFormatError, match="not a columnar batch"):
+        decode_batch(b"XXXX" + data[4:])
+    with pytest.raises(WireFormatError, match="unsupported format version"):
+        decode_batch(data[:4] + struct.pack("<H", SCHEMA_VERSION + 1) + data[6:])
+    with pytest.raises(WireFormatError, match="truncated batch"):
+        decode_batch(data[:-20])
+
+
+def test_point_index_out_of_range():
+    _, ts, values, _, _ = _batch(2)
+    data = encode_batch(KEYS[:1], [0, 1], ts[:2], values[:2])
+    with pytest.raises(WireFormatError, match="point index out of range"):
+        decode_batch(data)
+
+
+def test_repeated_dictionary_key():
+    _, ts, values, _, _ = _batch(2)
+    data = encode_batch([KEYS[1], KEYS[1]], [0, 1], ts[:2], values[:2])
+    with pytest.raises(WireFormatError, match="repeated"):
+        decode_batch(data)
+
+
+def test_decoder_handles_batches_split_anywhere():
+    payloads = [_batch(n)[-1] for n in (3, 0, 11)]
+    body = b"".join(payloads)
+    for step in (1, 5, 64, len(body)):
+        decoder = ColumnarDecoder()
+        batches = []
+        for i in range(0, len(body), step):
+            batches.extend(decoder.feed(body[i:i + step]))
+        decoder.close()
+        assert [b.n_rows for b in batches] == [3, 0, 11]
+        assert batches[2].values.tolist() == decode_batch(payloads[2]).values.tolist()
+
+
+def test_decoder_rejects_oversized_and_truncated_batches():
+    data = _batch(100)[-1]
+    with pytest.raises(WireFormatError, match="exceeds"):
+        ColumnarDecoder(max_batch_bytes=len(data) - 1).feed(data[:40])
+    decoder = ColumnarDecoder()
+    assert decoder.feed(data[:-1]) == []
+    with pytest.raises(WireFormatError, match="truncated"):
+        decoder.close()
+
+
+def test_to_copy_binary_layout():
+    idx, ts, values, _, data = _batch(4)
+    batch = decode_batch(data)
+    point_ids = [uuid.uuid4() for _ in KEYS]
+    quality = np.array([0, 1, 2, 3], dtype=np.int32)
+    rows = np.array([1, 3])
+    out = to_copy_binary(batch, uuid_matrix(point_ids), quality, rows=rows)
+    assert out.startswith(COPY_SIGNATURE) and out.endswith(COPY_TRAILER)
+
+    tuples = out[len(COPY_SIGNATURE):-len(COPY_TRAILER)]
+    size = len(tuples) // 2
+    for i, row in enumerate(rows.tolist()):
+        t = tuples[i * size:(i + 1) * size]
+        assert struct.unpack_from(">h", t, 0)[0] == 5
+        assert t[6:22] == point_ids[idx[row]].bytes
+        assert struct.unpack_from(">q", t, 26)[0] == ts[row] - PG_EPOCH_OFFSET_US
+        assert struct.unpack_from(">d", t, 38)[0] == values[row]
+        assert struct.unpack_from(">h", t, 50)[0] == STATUS_PRESENT | STATUS_FAULT
+        assert struct.unpack_from(">i", t, 56)[0] == quality[row]